@@ -1,24 +1,46 @@
 from django.contrib import admin
-from .models import Frame, Session, Photo, RenderedPhoto
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.html import format_html
+from .models import Frame, Session, Photo, PrintJob, RenderedPhoto
+from .thumbnails import thumbnail_url
+
+
+def _count_subquery(model, fk_name):
+    """COUNT các bản ghi con theo session (subquery, không JOIN nhân bản dòng)."""
+    counts = (
+        model.objects.filter(**{fk_name: OuterRef("pk")})
+        .order_by()
+        .values(fk_name)
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def _thumbnail_tag(url):
+    if not url:
+        return '-'
+    return format_html('<img src="{}" height="60" loading="lazy" />', url)
+
 
 # Customize Frame admin
 @admin.register(Frame)
 class FrameAdmin(admin.ModelAdmin):
-    list_display = ('name', 'active', 'get_slots_count', 'image_preview')
+    list_display = ('name', 'active', 'retention_days', 'get_slots_count', 'image_preview')
     list_filter = ('active',)
     search_fields = ('name',)
-    list_editable = ('active',)
-    
+    list_editable = ('active', 'retention_days')
+
     def get_slots_count(self, obj):
-        return len(obj.layout_json.get('slots', []))
+        return obj.slot_count
     get_slots_count.short_description = 'Số ô'
-    
+    get_slots_count.admin_order_field = 'slot_count'
+
     def image_preview(self, obj):
-        if obj.image:
-            return f'<img src="{obj.image.url}" width="100" />'
-        return '-'
+        # Tạo lúc lưu frame (core/signals.py); frame cũ: manage.py build_derivatives --frames
+        return _thumbnail_tag(thumbnail_url(obj.image))
     image_preview.short_description = 'Preview'
-    image_preview.allow_tags = True
 
 # Customize Session admin
 @admin.register(Session)
@@ -26,14 +48,24 @@ class SessionAdmin(admin.ModelAdmin):
     list_display = ('phone', 'created_at', 'photo_count', 'render_count')
     search_fields = ('phone',)
     date_hierarchy = 'created_at'
-    
+    # Bảng lớn: không đếm toàn bộ bảng mỗi lần mở changelist
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            photo_total=_count_subquery(Photo, 'session'),
+            render_total=_count_subquery(RenderedPhoto, 'session'),
+        )
+
     def photo_count(self, obj):
-        return obj.photos.count()
+        return obj.photo_total
     photo_count.short_description = 'Số ảnh'
-    
+    photo_count.admin_order_field = 'photo_total'
+
     def render_count(self, obj):
-        return obj.renders.count()
+        return obj.render_total
     render_count.short_description = 'Đã render'
+    render_count.admin_order_field = 'render_total'
 
 # Customize Photo admin
 @admin.register(Photo)
@@ -42,13 +74,13 @@ class PhotoAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('session__phone',)
     date_hierarchy = 'created_at'
-    
+    list_select_related = ('session',)
+    show_full_result_count = False
+
     def image_preview(self, obj):
-        if obj.image:
-            return f'<img src="{obj.image.url}" width="80" />'
-        return '-'
+        # Thumbnail tạo lúc upload (create_photo); ảnh cũ chưa có: manage.py build_derivatives
+        return _thumbnail_tag(obj.thumbnail.url if obj.thumbnail else None)
     image_preview.short_description = 'Preview'
-    image_preview.allow_tags = True
 
 # Customize RenderedPhoto admin
 @admin.register(RenderedPhoto)
@@ -57,11 +89,19 @@ class RenderedPhotoAdmin(admin.ModelAdmin):
     list_filter = ('created_at', 'frame')
     search_fields = ('session__phone',)
     date_hierarchy = 'created_at'
-    
+    list_select_related = ('session', 'frame')
+    show_full_result_count = False
+
     def image_preview(self, obj):
-        if obj.image:
-            return f'<img src="{obj.image.url}" width="100" />'
-        return '-'
+        # Thumbnail tạo cùng lúc với render; render cũ: manage.py build_derivatives --renders
+        return _thumbnail_tag(obj.thumbnail.url if obj.thumbnail else None)
     image_preview.short_description = 'Preview'
-    image_preview.allow_tags = True
 
+# Customize PrintJob admin
+@admin.register(PrintJob)
+class PrintJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'rendered', 'printer', 'status', 'copies', 'requested_at', 'printed_at')
+    list_filter = ('status', 'printer')
+    search_fields = ('rendered__session__phone',)
+    list_select_related = ('rendered',)
+    show_full_result_count = False
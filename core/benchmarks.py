@@ -0,0 +1,309 @@
+"""
+Benchmark pipeline render (chạy bằng manage.py bench_render).
+
+Sinh frame + ảnh giả lập (JPEG/PNG/HEIC, 2–48 MP, dọc/ngang), chạy từng stage
+nhiều lần và đo latency (percentile), throughput, RSS, tracemalloc:
+
+- derivatives: upload ảnh (create_photo: hash + render/preview/thumbnail)
+- render_cold / render: render_frame khi frame cache trống / đã warm
+- finalize: enqueue_render → run_render_job (ghép, lưu, upload, QR)
+- storage: upload một render lên object store (local hoặc memory, không dùng Firebase)
+- qr: tạo file QR cho URL mới (không trúng cache)
+
+Kết quả là dict JSON-serializable để lưu lại và so sánh giữa các bản.
+"""
+import math
+import os
+import platform
+import resource
+import statistics
+import struct
+import time
+import tracemalloc
+import uuid
+import zlib
+from contextlib import contextmanager
+from io import BytesIO
+
+import PIL
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageChops
+from pillow_heif import register_heif_opener
+
+from .derivatives import create_photo
+from .frame_cache import get_frame_cache
+from .jobs import claim_job, enqueue_render, run_render_job
+from .models import Frame, RenderJob, Session
+from .qr import qr_file
+from .rendering import estimate_render_bytes, render_frame
+from .uploads import enqueue_upload, process_upload
+
+register_heif_opener()
+
+DEFAULT_FRAMES = ["1200x1800:png", "1800x1200:png", "2400x3600:png", "1200x1800:jpeg"]
+DEFAULT_MEGAPIXELS = [2, 12, 48]
+DEFAULT_FORMATS = ["jpeg", "png", "heic"]
+DEFAULT_ORIENTATIONS = ["portrait", "landscape"]
+
+PHOTO_FORMATS = {
+    "jpeg": ("JPEG", ".jpg", {"quality": 90}),
+    "png": ("PNG", ".png", {"compress_level": 6}),
+    # x265 preset nhanh: sinh ảnh 48 MP không mất vài phút (chỉ ảnh hưởng lúc tạo data)
+    "heic": ("HEIF", ".heic", {"quality": 85, "enc_params": {"preset": "ultrafast"}}),
+}
+FRAME_FORMATS = {"png": ("PNG", ".png"), "jpeg": ("JPEG", ".jpg")}
+PERCENTILES = (50, 90, 95, 99)
+
+
+# ====== DATA GIẢ LẬP ======
+def photo_dimensions(megapixels, orientation):
+    """Kích thước 4:3 cho số megapixel, dọc hoặc ngang."""
+    long_edge = round(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    short_edge = round(long_edge * 3 / 4)
+    return (short_edge, long_edge) if orientation == "portrait" else (long_edge, short_edge)
+
+
+def synthetic_photo(width, height, seed=0):
+    """Ảnh RGB có gradient + nhiễu mịn (nén/giải nén gần giống ảnh thật hơn màu phẳng)."""
+    red = Image.linear_gradient("L").resize((width, height))
+    green = Image.radial_gradient("L").resize((width, height))
+    noise = Image.effect_noise((max(1, width // 8), max(1, height // 8)), 30 + seed % 20)
+    blue = ImageChops.add(noise.resize((width, height), Image.Resampling.BICUBIC), red.rotate(180), 2.0)
+    return Image.merge("RGB", (red, green, blue))
+
+
+def photo_file(data_dir, fmt, megapixels, orientation):
+    """Đường dẫn ảnh giả lập; sinh một lần rồi dùng lại giữa các lần chạy."""
+    pil_format, ext, save_kwargs = PHOTO_FORMATS[fmt]
+    path = os.path.join(data_dir, f"photo_{megapixels}mp_{orientation}{ext}")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        img = synthetic_photo(*photo_dimensions(megapixels, orientation), seed=megapixels)
+        tmp_path = f"{path}.tmp"
+        img.save(tmp_path, format=pil_format, **save_kwargs)
+        os.replace(tmp_path, path)
+    return path
+
+
+def with_nonce(data, ext, nonce):
+    """
+    Cùng ảnh nhưng bytes khác (metadata chứa nonce): create_photo gộp ảnh trùng
+    nội dung, benchmark cần mỗi upload là một ảnh mới để đo decode/resize thật.
+    """
+    payload = nonce.encode()
+    if ext == ".jpg":
+        # Segment COM ngay sau SOI
+        return data[:2] + b"\xff\xfe" + struct.pack(">H", len(payload) + 2) + payload + data[2:]
+    if ext == ".png":
+        # Chunk tEXt ngay trước IEND (12 byte cuối)
+        body = b"tEXt" + b"nonce\x00" + payload
+        chunk = struct.pack(">I", len(body) - 4) + body + struct.pack(">I", zlib.crc32(body))
+        return data[:-12] + chunk + data[-12:]
+    # HEIF (ISOBMFF): box "free" cuối file, decoder bỏ qua
+    return data + struct.pack(">I", len(payload) + 8) + b"free" + payload
+
+
+def frame_layout(width, height):
+    """Layout 4 slot (lưới 2x2) với lề 5%."""
+    margin_x, margin_y = width // 20, height // 20
+    slot_w = (width - 3 * margin_x) // 2
+    slot_h = (height - 3 * margin_y) // 2
+    slots = [
+        {"x": margin_x + col * (slot_w + margin_x), "y": margin_y + row * (slot_h + margin_y), "w": slot_w, "h": slot_h}
+        for row in range(2) for col in range(2)
+    ]
+    return {"w": width, "h": height, "slots": slots}
+
+
+def synthetic_frame(spec):
+    """Frame từ spec 'WxH:format' (RGBA PNG có lỗ trong suốt ở slot, hoặc JPEG đặc)."""
+    size, _, fmt = spec.partition(":")
+    width, height = (int(v) for v in size.split("x"))
+    layout = frame_layout(width, height)
+
+    img = Image.new("RGBA", (width, height), (180, 40, 60, 255))
+    for slot in layout["slots"]:
+        img.paste((0, 0, 0, 0), (slot["x"], slot["y"], slot["x"] + slot["w"], slot["y"] + slot["h"]))
+    pil_format, ext = FRAME_FORMATS[fmt or "png"]
+    if pil_format == "JPEG":
+        img = img.convert("RGB")
+    buffer = BytesIO()
+    img.save(buffer, format=pil_format)
+
+    frame = Frame(name=f"bench {spec}", layout_json=layout)
+    frame.image.save(f"bench_{width}x{height}{ext}", ContentFile(buffer.getvalue()), save=False)
+    frame.save()
+    return frame
+
+
+# ====== ĐO ======
+def rss_mb():
+    """RSS hiện tại (Linux /proc), None nếu không đọc được."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    """RSS cao nhất của process từ lúc chạy (không giảm)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: KB, macOS: bytes
+    return peak / 1024 / 1024 if platform.system() == "Darwin" else peak / 1024
+
+
+def percentile(sorted_values, pct):
+    """Percentile có nội suy tuyến tính (sorted_values đã sắp xếp)."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+class Recorder:
+    """Gom mẫu latency / tracemalloc / RSS theo (case, stage)."""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.samples = {}
+        self.notes = {}
+
+    def note(self, case, stage, **values):
+        """Giá trị phụ cho (case, stage), ghi kèm vào kết quả."""
+        self.notes.setdefault(case, {}).setdefault(stage, {}).update(values)
+
+    @contextmanager
+    def measure(self, case, stage):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+        traced_peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+        entry = self.samples.setdefault(case, {}).setdefault(stage, {"seconds": [], "traced_peak": [], "rss_peak_mb": 0})
+        entry["seconds"].append(elapsed)
+        if traced_peak is not None:
+            entry["traced_peak"].append(traced_peak)
+        entry["rss_peak_mb"] = max(entry["rss_peak_mb"], peak_rss_mb())
+
+    def summary(self):
+        results = {}
+        for case, stages in self.samples.items():
+            for stage, entry in stages.items():
+                seconds = sorted(entry["seconds"])
+                total = sum(seconds)
+                results.setdefault(case, {})[stage] = {
+                    "n": len(seconds),
+                    "mean_ms": statistics.fmean(seconds) * 1000,
+                    **{f"p{pct}_ms": percentile(seconds, pct) * 1000 for pct in PERCENTILES},
+                    "max_ms": seconds[-1] * 1000,
+                    "throughput_per_s": len(seconds) / total if total else None,
+                    "tracemalloc_peak_mb": max(entry["traced_peak"]) / 1024 / 1024 if entry["traced_peak"] else None,
+                    "rss_peak_mb": entry["rss_peak_mb"],
+                    **self.notes.get(case, {}).get(stage, {}),
+                }
+        return results
+
+
+# ====== CHẠY ======
+def run_case(recorder, case, frame_spec, photo_path, iterations, warmup):
+    frame = synthetic_frame(frame_spec)
+    slot_count = frame.slot_count
+    with open(photo_path, "rb") as f:
+        photo_bytes = f.read()
+    photo_name = os.path.basename(photo_path)
+
+    ext = os.path.splitext(photo_name)[1]
+
+    # Mỗi upload có bytes riêng (nonce), không trúng dedup theo content hash
+    photos = []
+    for i in range(max(iterations, 1)):
+        session = Session.objects.create(phone=f"bench{uuid.uuid4().hex[:12]}")
+        for _ in range(slot_count):
+            data = with_nonce(photo_bytes, ext, uuid.uuid4().hex)
+            with recorder.measure(case, "derivatives"):
+                photo = create_photo(session, SimpleUploadedFile(photo_name, data))
+            if i == 0:
+                photos.append(photo)
+    session = photos[0].session
+
+    get_frame_cache().clear()
+    with recorder.measure(case, "render_cold"):
+        render_frame(photos, frame)
+    for _ in range(warmup):
+        render_frame(photos, frame)
+    for _ in range(iterations):
+        with recorder.measure(case, "render"):
+            render_frame(photos, frame)
+    # So với tracemalloc_peak_mb để kiểm tra ước lượng của ngân sách RAM
+    recorder.note(case, "render", estimated_mb=estimate_render_bytes(photos, frame) / 1024 / 1024)
+
+    rendered = None
+    for _ in range(iterations):
+        # Xóa render cũ để fingerprint không trúng (đo đủ pipeline mỗi lần)
+        session.renders.all().delete()
+        RenderJob.objects.filter(session=session).delete()
+        with recorder.measure(case, "finalize"):
+            job = enqueue_render(session, frame, photos)
+            claim_job(job)
+            run_render_job(job)
+        if job.status != RenderJob.STATUS_DONE:
+            raise RuntimeError(f"Finalize failed for {case}: {job.error}")
+        rendered = job.rendered
+
+    for _ in range(iterations):
+        with recorder.measure(case, "storage"):
+            process_upload(enqueue_upload(rendered).id)
+
+
+def run_benchmark(data_dir, frames=None, megapixels=None, formats=None, orientations=None,
+                  iterations=5, warmup=1, trace_memory=True, log=print):
+    """Chạy toàn bộ ma trận frame × ảnh; trả về dict kết quả."""
+    frames = frames or DEFAULT_FRAMES
+    megapixels = megapixels or DEFAULT_MEGAPIXELS
+    formats = formats or DEFAULT_FORMATS
+    orientations = orientations or DEFAULT_ORIENTATIONS
+
+    recorder = Recorder(trace_memory=trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        for fmt in formats:
+            for mp in megapixels:
+                for orientation in orientations:
+                    log(f"Preparing {fmt} {mp} MP {orientation}...")
+                    path = photo_file(os.path.join(data_dir, fmt), fmt, mp, orientation)
+                    for frame_spec in frames:
+                        case = f"frame={frame_spec} photo={fmt}-{mp}mp-{orientation}"
+                        log(f"Running {case}")
+                        run_case(recorder, case, frame_spec, path, iterations, warmup)
+
+        for _ in range(max(iterations, 1) * 10):
+            with recorder.measure("qr", "qr"):
+                qr_file(f"https://bench.invalid/d/{uuid.uuid4().hex}/")
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "render_slot_threads": settings.RENDER_SLOT_THREADS,
+            "iterations": iterations,
+            "warmup": warmup,
+            "tracemalloc": trace_memory,
+            "duration_s": time.perf_counter() - started,
+            "rss_mb": rss_mb(),
+        },
+        "results": recorder.summary(),
+    }
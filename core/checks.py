@@ -0,0 +1,41 @@
+"""
+System check cho cấu hình URL mà điện thoại khách mở qua QR
+(chạy cùng runserver / migrate / manage.py check).
+"""
+import ipaddress
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+
+def _reachable(url):
+    """URL tuyệt đối, host không phải loopback (điện thoại khách mở được)."""
+    parsed = urlparse(url or "")
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return False
+    if parsed.hostname == "localhost":
+        return False
+    try:
+        return not ipaddress.ip_address(parsed.hostname).is_loopback
+    except ValueError:
+        return True  # tên miền / hostname LAN
+
+
+@register()
+def public_url_check(app_configs, **kwargs):
+    messages = []
+    if settings.UPLOAD_BACKEND == "local" and not _reachable(settings.UPLOAD_LOCAL_URL):
+        messages.append(Error(
+            f"UPLOAD_LOCAL_URL ({settings.UPLOAD_LOCAL_URL or 'chưa đặt'}) không mở được từ điện thoại khách.",
+            hint="Đặt PUBLIC_BASE_URL (vd. http://192.168.1.10:8000) hoặc UPLOAD_LOCAL_URL thành địa chỉ LAN của server.",
+            id="core.E001",
+        ))
+    if not _reachable(settings.PUBLIC_BASE_URL):
+        messages.append(Warning(
+            f"PUBLIC_BASE_URL ({settings.PUBLIC_BASE_URL or 'chưa đặt'}) không mở được từ điện thoại khách; "
+            "QR tạm (trước khi upload xong) sẽ không dùng được.",
+            hint="Đặt PUBLIC_BASE_URL thành địa chỉ LAN của kiosk, vd. http://192.168.1.10:8000.",
+            id="core.W001",
+        ))
+    return messages
@@ -0,0 +1,176 @@
+"""
+Upload ảnh theo chunk, resume được khi Wi-Fi kiosk chập chờn.
+
+1. POST /session/<phone>/uploads/ {filename, size} → upload id
+2. PUT  /session/<phone>/uploads/<id>/ (body = bytes, header
+   Content-Range: bytes <start>-<end>/<size>), chunk phải bắt đầu đúng offset
+   server đang giữ; lệch → 409 kèm offset để client gửi tiếp từ đó
+3. GET  /session/<phone>/uploads/<id>/ → offset hiện tại (resume sau khi rớt mạng)
+
+Chunk được ghi thẳng vào file tạm (đọc body theo từng khối, không buffer cả
+file trong RAM hay qua upload handler của Django). Nhận đủ byte thì file tạm
+được move (rename) vào storage của Photo.image rồi sinh bản phái sinh như
+upload thường (ảnh trùng nội dung thì dùng lại file / Photo đã có, xem
+create_photo).
+"""
+import logging
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .derivatives import create_photo
+from .models import ChunkedUpload
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class ChunkError(Exception):
+    """Chunk bị từ chối; status = HTTP status trả về cho client."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class _AssembledFile(File):
+    """File tạm đã ghép đủ; có temporary_file_path nên FileSystemStorage move thay vì copy."""
+
+    def __init__(self, path, name):
+        super().__init__(open(path, "rb"), name=name)
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def part_path(upload):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{upload.id}.part")
+
+
+def parse_content_range(header):
+    """'bytes 0-1048575/4000000' → (start, end, total); end tính cả byte cuối."""
+    match = CONTENT_RANGE_RE.match((header or "").strip())
+    if not match:
+        raise ChunkError("Thiếu hoặc sai header Content-Range")
+    start, end, total = (int(v) for v in match.groups())
+    if end < start or end >= total:
+        raise ChunkError("Content-Range không hợp lệ")
+    return start, end, total
+
+
+def start_upload(session, filename, size):
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        raise ChunkError("size phải là số nguyên dương")
+    if size > settings.UPLOAD_MAX_FILE_BYTES:
+        raise ChunkError(f"File quá lớn (tối đa {settings.UPLOAD_MAX_FILE_BYTES // (1024 * 1024)} MB)", status=413)
+    filename = get_valid_filename(os.path.basename(str(filename or ""))) or "photo"
+
+    purge_expired_uploads()
+    upload = ChunkedUpload.objects.create(session=session, filename=filename[-255:], size=size)
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(part_path(upload), "wb").close()
+    return upload
+
+
+def _copy_body(stream, f, length):
+    remaining = length
+    while remaining:
+        block = stream.read(min(READ_BLOCK, remaining))
+        if not block:
+            break
+        f.write(block)
+        remaining -= len(block)
+    return length - remaining
+
+
+def write_chunk(upload, content_range, stream):
+    """
+    Ghi một chunk vào file tạm. Ghi theo vị trí nên gửi lại cùng chunk (client
+    retry khi không nhận được response) là vô hại. Trả về upload đã cập nhật;
+    chunk cuối thì ghép luôn thành Photo.
+    """
+    start, end, total = parse_content_range(content_range)
+    if total != upload.size:
+        raise ChunkError("Kích thước file không khớp với lúc bắt đầu upload")
+    if upload.status != ChunkedUpload.STATUS_UPLOADING:
+        raise ChunkError("Upload đã kết thúc", status=409)
+    if start != upload.offset:
+        raise ChunkError(f"Chunk phải bắt đầu ở byte {upload.offset}", status=409)
+    length = end - start + 1
+    if length > settings.UPLOAD_CHUNK_BYTES:
+        raise ChunkError(f"Chunk quá lớn (tối đa {settings.UPLOAD_CHUNK_BYTES} byte)", status=413)
+
+    path = part_path(upload)
+    try:
+        with open(path, "r+b") as f:
+            f.seek(start)
+            received = _copy_body(stream, f, length)
+    except FileNotFoundError:
+        raise ChunkError("Upload đã hết hạn", status=410)
+    if received != length:
+        # Client rớt mạng giữa chừng: offset giữ nguyên, byte thừa sẽ bị ghi đè lần sau
+        raise ChunkError(f"Chunk thiếu dữ liệu ({received}/{length} byte)")
+
+    # Chỉ tăng offset nếu chưa request nào khác (chunk gửi trùng) tăng trước
+    ChunkedUpload.objects.filter(pk=upload.pk, offset=start).update(offset=end + 1, updated_at=timezone.now())
+    upload.refresh_from_db()
+    if upload.offset == upload.size:
+        finish_upload(upload)
+    return upload
+
+
+def finish_upload(upload):
+    """Move file tạm vào storage của Photo.image (chỉ một request được ghép)."""
+    claimed = ChunkedUpload.objects.filter(pk=upload.pk, status=ChunkedUpload.STATUS_UPLOADING).update(
+        status=ChunkedUpload.STATUS_ASSEMBLING, updated_at=timezone.now(),
+    )
+    if not claimed:
+        upload.refresh_from_db()
+        return upload
+
+    path = part_path(upload)
+    try:
+        assembled = _AssembledFile(path, upload.filename)
+        try:
+            photo = create_photo(upload.session, assembled)
+        finally:
+            assembled.close()
+    except Exception as e:
+        logger.exception("Could not assemble upload %s", upload.id)
+        upload.status = ChunkedUpload.STATUS_FAILED
+        upload.error = str(e)
+        upload.save(update_fields=["status", "error", "updated_at"])
+        raise ChunkError("Không lưu được ảnh", status=500)
+
+    if os.path.exists(path):
+        # Storage khác FileSystemStorage copy thay vì move
+        os.remove(path)
+    upload.photo = photo
+    upload.status = ChunkedUpload.STATUS_COMPLETE
+    upload.save(update_fields=["photo", "status", "updated_at"])
+    logger.info("Chunked upload %s assembled into photo %s (%d bytes)", upload.id, photo.id, upload.size)
+    return upload
+
+
+def purge_expired_uploads():
+    """Xóa bản ghi upload cũ hơn CHUNKED_UPLOAD_EXPIRE_HOURS (và file tạm nếu còn dở dang)."""
+    cutoff = timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRE_HOURS)
+    expired = ChunkedUpload.objects.filter(updated_at__lt=cutoff)
+    purged = 0
+    for upload in expired:
+        try:
+            os.remove(part_path(upload))
+        except FileNotFoundError:
+            pass
+        upload.delete()
+        purged += 1
+    return purged
@@ -0,0 +1,167 @@
+"""
+Tạo các bản phái sinh cho Photo ngay lúc upload:
+
+- render_image: JPEG đã xoay theo EXIF, cạnh ngắn bị giới hạn theo slot lớn
+  nhất đang dùng (đủ nét cho mọi slot, không phải decode ảnh 48 MP khi render)
+- preview_image: cho canvas xem thử trên kiosk
+- thumbnail: cho thư viện ảnh / danh sách
+
+File gốc lưu theo content address (photos/<sha256><ext>): cùng nội dung →
+cùng một file và cùng bộ bản phái sinh, dùng chung giữa các Photo. Upload lại
+ảnh đã có trong session (khách chọn lại ảnh, kiosk gửi lại request) trả về
+Photo cũ thay vì tạo bản mới.
+
+build_render_variants: bản web/thumbnail cho RenderedPhoto tạo trước khi có
+các bản này (manage.py build_derivatives --renders).
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from PIL import Image, ImageOps
+from pillow_heif import register_heif_opener
+
+from .fingerprints import upload_sha256
+from .metrics import span
+from .models import Frame, Photo
+from .rendering import web_format, write_variants
+
+register_heif_opener()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RENDER_EDGE = 1800
+
+DERIVATIVE_FIELDS = ["render_image", "render_width", "render_height", "preview_image", "thumbnail"]
+
+
+def max_slot_edge():
+    """Cạnh lớn nhất của mọi slot trong các frame đang active."""
+    edge = 0
+    for layout in Frame.objects.filter(active=True).values_list("layout_json", flat=True):
+        for slot in (layout or {}).get("slots", []):
+            edge = max(edge, int(slot.get("w", 0)), int(slot.get("h", 0)))
+    return edge or DEFAULT_RENDER_EDGE
+
+
+def _fit_short_edge(img, short_edge):
+    """Thu nhỏ (không phóng to) để cạnh ngắn = short_edge."""
+    w, h = img.size
+    scale = short_edge / min(w, h)
+    if scale >= 1:
+        return img
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def _fit_long_edge(img, long_edge):
+    img = img.copy()
+    img.thumbnail((long_edge, long_edge), Image.Resampling.LANCZOS)
+    return img
+
+
+def _jpeg_bytes(img, quality):
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def build_photo_derivatives(photo, render_edge=None):
+    """Tạo render/preview/thumbnail cho photo và lưu vào model."""
+    render_edge = render_edge or max_slot_edge()
+
+    with Image.open(photo.image.path) as src:
+        # JPEG: decode luôn ở scale nhỏ nhất vẫn >= render_edge
+        if src.format == "JPEG":
+            w, h = src.size
+            scale = min(w, h) / render_edge
+            if scale > 1:
+                src.draft("RGB", (int(w / scale), int(h / scale)))
+        img = ImageOps.exif_transpose(src).convert("RGB")
+
+    render_img = _fit_short_edge(img, render_edge)
+    preview_img = _fit_long_edge(render_img, settings.PHOTO_PREVIEW_SIZE)
+    thumb_img = _fit_long_edge(preview_img, settings.PHOTO_THUMBNAIL_SIZE)
+
+    stem = photo.content_hash or os.path.splitext(os.path.basename(photo.image.name))[0]
+    photo.render_image.save(f"{stem}_render.jpg", ContentFile(_jpeg_bytes(render_img, 95)), save=False)
+    photo.preview_image.save(f"{stem}_preview.jpg", ContentFile(_jpeg_bytes(preview_img, 85)), save=False)
+    photo.thumbnail.save(f"{stem}_thumb.jpg", ContentFile(_jpeg_bytes(thumb_img, 80)), save=False)
+    # Ghi kích thước trực tiếp (không để Django mở lại file để đọc)
+    photo.render_width, photo.render_height = render_img.size
+    photo.save(update_fields=DERIVATIVE_FIELDS)
+    if photo.content_hash:
+        # Photo khác cùng nội dung dùng chung bộ phái sinh mới
+        Photo.objects.filter(content_hash=photo.content_hash).exclude(pk=photo.pk).update(
+            **{name: getattr(photo, name) for name in DERIVATIVE_FIELDS}
+        )
+    return photo
+
+
+def build_render_variants(rendered):
+    """Tạo bản web + thumbnail cho render cũ (render mới có sẵn từ lúc ghép)."""
+    with Image.open(rendered.image.path) as src:
+        canvas = src.convert("RGB")
+    web, thumb = BytesIO(), BytesIO()
+    write_variants(canvas, web, thumb)
+
+    stem = os.path.splitext(os.path.basename(rendered.image.name))[0]
+    rendered.web_image.save(f"{stem}_web{web_format()[1]}", ContentFile(web.getvalue()), save=False)
+    rendered.thumbnail.save(f"{stem}_thumb.jpg", ContentFile(thumb.getvalue()), save=False)
+    rendered.save(update_fields=["web_image", "thumbnail"])
+    return rendered
+
+
+def store_photo_file(uploaded_file, content_hash):
+    """
+    Lưu file gốc theo content address, trả về tên file trong storage.
+    Cùng nội dung → cùng một file, không ghi lại nếu đã tồn tại.
+    """
+    ext = os.path.splitext(uploaded_file.name or "")[1].lower() or ".jpg"
+    name = Photo._meta.get_field("image").generate_filename(None, f"{content_hash}{ext}")
+    if not default_storage.exists(name):
+        saved = default_storage.save(name, uploaded_file)
+        if saved != name:
+            # Process khác vừa ghi cùng file (cùng nội dung): bỏ bản trùng
+            default_storage.delete(saved)
+    return name
+
+
+def create_photo(session, uploaded_file):
+    """
+    Tạo Photo từ file upload và sinh bản phái sinh (lỗi decode không chặn upload).
+    Ảnh trùng nội dung: trong session → trả về Photo đã có; session khác → Photo
+    mới dùng lại file gốc + bản phái sinh, không decode lại.
+    """
+    content_hash = upload_sha256(uploaded_file)
+    existing = session.photos.filter(content_hash=content_hash).first()
+    if existing is not None:
+        logger.info("Duplicate upload in session %s, reusing photo %s", session.phone, existing.id)
+        return existing
+
+    source = Photo.objects.filter(content_hash=content_hash).order_by("id").first()
+    if source is not None and default_storage.exists(source.image.name):
+        photo = Photo(
+            session=session, content_hash=content_hash, image=source.image.name,
+            **{name: getattr(source, name) for name in DERIVATIVE_FIELDS},
+        )
+    else:
+        photo = Photo(session=session, content_hash=content_hash, image=store_photo_file(uploaded_file, content_hash))
+    try:
+        with transaction.atomic():
+            photo.save()
+    except IntegrityError:
+        # Request song song vừa tạo Photo cùng nội dung (unique constraint)
+        return session.photos.get(content_hash=content_hash)
+
+    if not photo.thumbnail:
+        try:
+            with span("derivatives"):
+                build_photo_derivatives(photo)
+        except Exception as e:
+            logger.warning("Derivative error for photo %s: %s", photo.id, e)
+    return photo
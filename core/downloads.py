@@ -0,0 +1,151 @@
+"""
+ZIP tải toàn bộ ảnh của session, stream thẳng ra response.
+
+- JPEG đã nén sẵn → ZIP_STORED (không nén lại, không tốn CPU)
+- Ảnh có file local (RenderedPhoto.image) → đọc từ đĩa theo chunk
+- Ảnh chỉ có trên bucket → tải song song qua một requests.Session dùng
+  chung (connection pool), tối đa ZIP_FETCH_WORKERS file cùng lúc
+Bộ nhớ chỉ phụ thuộc số file đang tải song song, không phụ thuộc số ảnh.
+"""
+import logging
+import os
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ZipSink:
+    """File-like chỉ ghi (không seek được): gom bytes để generator yield ra."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+_http = None
+_http_lock = threading.Lock()
+
+
+def get_http_session():
+    """requests.Session dùng chung, pool đủ lớn cho ZIP_FETCH_WORKERS kết nối."""
+    global _http
+    if _http is None:
+        with _http_lock:
+            if _http is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=4, pool_maxsize=settings.ZIP_FETCH_WORKERS,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _http = session
+    return _http
+
+
+def _fetch(url):
+    response = get_http_session().get(url, timeout=10)
+    response.raise_for_status()
+    return response.content
+
+
+def _read_local(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _iter_sources(sources, executor):
+    """
+    Trả về (arcname, iterable chunks) theo đúng thứ tự, trong khi tải trước
+    tối đa ZIP_FETCH_WORKERS file remote ở nền.
+    """
+    window = settings.ZIP_FETCH_WORKERS
+    pending = deque()
+    it = iter(sources)
+
+    def submit_next():
+        source = next(it, None)
+        if source is None:
+            return False
+        future = executor.submit(_fetch, source["url"]) if not source.get("path") else None
+        pending.append((source, future))
+        return True
+
+    while len(pending) < window and submit_next():
+        pass
+
+    while pending:
+        source, future = pending.popleft()
+        submit_next()
+        try:
+            if future is None:
+                yield source["arcname"], _read_local(source["path"])
+            else:
+                yield source["arcname"], (future.result(),)
+        except Exception as e:
+            logger.warning("Error downloading %s: %s", source["arcname"], e)
+
+
+def session_zip_sources(renders):
+    """
+    Nguồn cho ZIP (bản web, giống file trên bucket): render nào còn file local
+    thì đọc thẳng từ đĩa, không thì tải từ bucket.
+    """
+    sources = []
+    for idx, rendered in enumerate(renders, 1):
+        web_file = rendered.web_file
+        path = None
+        if web_file and os.path.exists(web_file.path):
+            path = web_file.path
+        ext = os.path.splitext(rendered.remote_path or web_file.name)[1] or ".jpg"
+        sources.append({"arcname": f"photo_{idx}{ext}", "path": path, "url": rendered.remote_url})
+    return sources
+
+
+def stream_zip(sources):
+    """
+    Generator bytes của file ZIP.
+    sources: list dict {'arcname', 'path' (file local, có thể None), 'url'}
+    """
+    sink = _ZipSink()
+    executor = ThreadPoolExecutor(max_workers=settings.ZIP_FETCH_WORKERS, thread_name_prefix="zipfetch")
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+            for arcname, chunks in _iter_sources(sources, executor):
+                info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                try:
+                    with zf.open(info, "w") as dest:
+                        for chunk in chunks:
+                            dest.write(chunk)
+                            yield from sink.drain()
+                except OSError as e:
+                    # File local bị mất giữa chừng: entry đã mở nên vẫn được đóng lại
+                    logger.warning("Error reading %s: %s", arcname, e)
+                yield from sink.drain()
+                logger.debug("Added to ZIP: %s", arcname)
+        yield from sink.drain()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,65 @@
+"""
+Fingerprint nội dung cho render.
+
+Cùng frame (id + version ảnh + layout) và cùng ảnh theo thứ tự slot (hash nội
+dung) → cùng fingerprint → cùng kết quả render. finalize_render dùng nó để
+trả lại render đã có và gộp các request trùng nhau vào một RenderJob.
+"""
+import hashlib
+import json
+import os
+
+# Tăng khi thay đổi code ghép ảnh làm kết quả khác đi (render cũ coi như hết hạn)
+RENDER_VERSION = 1
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def upload_sha256(uploaded_file):
+    """
+    SHA-256 của file upload: lấy từ upload handler (core/upload_handlers.py)
+    nếu đã tính lúc nhận, không thì đọc file (file tạm: theo path, còn lại: theo chunk).
+    """
+    content_hash = getattr(uploaded_file, "content_hash", None)
+    if content_hash:
+        return content_hash
+    if hasattr(uploaded_file, "temporary_file_path"):
+        return file_sha256(uploaded_file.temporary_file_path())
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def photo_content_hash(photo):
+    """SHA-256 file gốc của photo; ảnh cũ chưa có thì tính một lần rồi lưu lại."""
+    if not photo.content_hash:
+        photo.content_hash = file_sha256(photo.image.path)
+        photo.save(update_fields=["content_hash"])
+    return photo.content_hash
+
+
+def frame_version(frame):
+    """Version ảnh frame: đổi file (upload lại) → mtime đổi."""
+    return os.stat(frame.image.path).st_mtime_ns
+
+
+def render_fingerprint(frame, photos):
+    """Fingerprint của một lần ghép: frame + layout + hash ảnh theo thứ tự slot."""
+    parts = [
+        f"v{RENDER_VERSION}",
+        str(frame.pk),
+        str(frame_version(frame)),
+        json.dumps(frame.layout_json, sort_keys=True),
+        *(photo_content_hash(photo) for photo in photos),
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
@@ -0,0 +1,232 @@
+"""
+Cache khung (frame) đã decode + resize sẵn cho render_frame.
+
+Canvas của frame chỉ phụ thuộc vào file ảnh frame và kích thước đích, nên
+được giữ lại trong RAM (LRU giới hạn theo số byte) và trên đĩa (raw pixel,
+cũng giới hạn theo byte: mtime file được cập nhật mỗi lần đọc, vượt giới hạn
+thì xóa file cũ nhất), key = (frame id, mtime của file ảnh, width, height).
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# File tạm (ghi dở) cũ hơn số giây này là của process đã chết
+TMP_FILE_MAX_AGE = 600
+
+
+class PreparedFrameCache:
+    """
+    LRU cache of prepared frame canvases, bounded by total pixel bytes.
+
+    Entries are shared between callers and must be treated as read-only:
+    copy before drawing on them.
+    """
+
+    def __init__(self, max_bytes, cache_dir=None, disk_max_bytes=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(frame_obj, size):
+        mtime_ns = os.stat(frame_obj.image.path).st_mtime_ns
+        return (frame_obj.pk, mtime_ns, size[0], size[1])
+
+    def get(self, frame_obj, size):
+        """Trả về canvas RGB (frame trên nền trắng) ở kích thước `size`."""
+        key = self.key_for(frame_obj, size)
+
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                return image
+
+        image = self._load_from_disk(key)
+        if image is None:
+            image = self._prepare(frame_obj.image.path, size)
+            self._save_to_disk(key, image)
+
+        self._put(key, image)
+        return image
+
+    def invalidate(self, frame_id):
+        """Xóa mọi entry (RAM + đĩa) của một frame."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == frame_id]:
+                image = self._entries.pop(key)
+                self._bytes -= _image_bytes(image)
+
+        self._remove_disk_files(f"frame_{frame_id}_*.rgb*")
+        self._remove_disk_files("*.tmp*", older_than=TMP_FILE_MAX_AGE)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        self._remove_disk_files("*.tmp*", older_than=TMP_FILE_MAX_AGE)
+
+    def prune(self, live_keys):
+        """Xóa file trên đĩa của frame đã xóa / ảnh frame đã đổi; live_keys = {(frame id, mtime_ns)}."""
+        removed = 0
+        for path in self._disk_files():
+            frame_id, mtime_ns = _parse_disk_name(path.name)
+            if (frame_id, mtime_ns) not in live_keys:
+                removed += self._unlink(path)
+        return removed
+
+    # ---- internals ----
+
+    @staticmethod
+    def _prepare(frame_path, size):
+        # Canvas luôn đục (frame trên nền trắng) nên giữ RGB: bớt 1/4 RAM so với
+        # RGBA, encode JPEG không phải convert thêm một bản
+        with Image.open(frame_path) as src:
+            opaque = "A" not in src.getbands() and "transparency" not in src.info
+            frame_img = src.convert("RGB" if opaque else "RGBA")
+        if frame_img.size != size:
+            frame_img = frame_img.resize(size, Image.Resampling.LANCZOS)
+        if opaque:
+            return frame_img
+
+        # Canvas nền trắng + frame (frame là layer dưới cùng)
+        canvas = Image.new("RGB", size, (255, 255, 255))
+        canvas.paste(frame_img, (0, 0), frame_img)
+        return canvas
+
+    def _put(self, key, image):
+        nbytes = _image_bytes(image)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = image
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _image_bytes(evicted)
+
+    def _disk_path(self, key):
+        frame_id, mtime_ns, w, h = key
+        return self.cache_dir / f"frame_{frame_id}_{mtime_ns}_{w}x{h}.rgb"
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        size = (key[2], key[3])
+        try:
+            data = path.read_bytes()
+            # mtime = lần dùng gần nhất (thứ tự LRU khi dọn đĩa)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        if len(data) != size[0] * size[1] * 3:
+            return None
+        return Image.frombytes("RGB", size, data)
+
+    def _save_to_disk(self, key, image):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}.{threading.get_ident()}")
+            tmp_path.write_bytes(image.tobytes())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write frame cache %s: %s", path, e)
+            return
+        self._enforce_disk_limit()
+
+    def _disk_files(self):
+        if not self.cache_dir or not self.cache_dir.is_dir():
+            return []
+        return list(self.cache_dir.glob("frame_*.rgb"))
+
+    def _enforce_disk_limit(self):
+        """Tổng file trên đĩa vượt disk_max_bytes → xóa file dùng lâu nhất trước."""
+        if not self.disk_max_bytes:
+            return
+        entries = []
+        for path in self._disk_files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            self._unlink(path)
+            total -= size
+
+    def _remove_disk_files(self, pattern, older_than=None):
+        if not self.cache_dir or not self.cache_dir.is_dir():
+            return
+        cutoff = time.time() - older_than if older_than else None
+        for path in self.cache_dir.glob(pattern):
+            try:
+                if cutoff is not None and path.stat().st_mtime > cutoff:
+                    continue  # file tạm của process đang ghi
+            except FileNotFoundError:
+                continue
+            self._unlink(path)
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            path.unlink()
+            return 1
+        except FileNotFoundError:
+            return 0
+
+
+def _parse_disk_name(name):
+    # frame_{id}_{mtime_ns}_{w}x{h}.rgb
+    _, frame_id, mtime_ns, _ = name.split("_", 3)
+    return int(frame_id), int(mtime_ns)
+
+
+def _image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_frame_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PreparedFrameCache(
+                    max_bytes=settings.FRAME_CACHE_MAX_BYTES,
+                    cache_dir=settings.FRAME_CACHE_DIR,
+                    disk_max_bytes=settings.FRAME_CACHE_DISK_MAX_BYTES,
+                )
+    return _cache
+
+
+def get_prepared_frame(frame_obj, size):
+    return get_frame_cache().get(frame_obj, size)
+
+
+def invalidate_frame(frame_id):
+    get_frame_cache().invalidate(frame_id)
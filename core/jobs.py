@@ -0,0 +1,228 @@
+"""
+Render job chạy nền: finalize_render chỉ enqueue RenderJob rồi trả về ngay,
+worker (manage.py renderworker) lấy job ra để ghép ảnh, upload, tạo QR.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .fingerprints import render_fingerprint
+from .metrics import span
+from .printing import prepare_print_job
+from .models import Photo, RenderedPhoto, RenderJob
+from .rendering import render_to_file, web_format
+from .uploads import drain_outbox, local_render_url, publish_render, publish_url
+
+logger = logging.getLogger(__name__)
+
+
+def _reuse_render(session, rendered):
+    """Render trùng đã có: trỏ download_url của session về nó, ghi một job done (cho polling)."""
+    url = rendered.remote_url or local_render_url(rendered)
+    if session.download_url != url:
+        session.download_url = url
+        session.save(update_fields=["download_url"])
+    now = timezone.now()
+    return RenderJob.objects.create(
+        session=session,
+        frame=rendered.frame,
+        photo_ids=[],
+        fingerprint=rendered.fingerprint,
+        status=RenderJob.STATUS_DONE,
+        rendered=rendered,
+        started_at=now,
+        finished_at=now,
+    )
+
+
+def enqueue_render(session, frame, photos):
+    """
+    Tạo RenderJob cho danh sách ảnh (đã theo thứ tự slot).
+    - Đã có render cùng fingerprint → trả job done trỏ về render đó, không render lại
+    - Đang có job cùng fingerprint (bấm 2 lần) → trả lại chính job đó
+    """
+    fingerprint = render_fingerprint(frame, photos)
+
+    rendered = session.renders.filter(fingerprint=fingerprint).order_by("-created_at").first()
+    if rendered is not None:
+        logger.info("Reusing render %s for phone %s", rendered.id, session.phone)
+        return _reuse_render(session, rendered)
+
+    active = session.render_jobs.filter(fingerprint=fingerprint, status__in=RenderJob.ACTIVE_STATUSES)
+    job = active.first()
+    if job is not None:
+        return job
+    try:
+        with transaction.atomic():
+            return RenderJob.objects.create(
+                session=session,
+                frame=frame,
+                photo_ids=[photo.id for photo in photos],
+                fingerprint=fingerprint,
+            )
+    except IntegrityError:
+        # Request song song vừa tạo job cùng fingerprint (unique constraint)
+        job = active.first()
+        if job is None:
+            raise
+        return job
+
+
+def claim_job(job):
+    """UPDATE có điều kiện queued → rendering; False nếu worker/request khác đã nhận."""
+    claimed = RenderJob.objects.filter(pk=job.pk, status=RenderJob.STATUS_QUEUED).update(
+        status=RenderJob.STATUS_RENDERING,
+        started_at=timezone.now(),
+        attempts=F("attempts") + 1,
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def claim_next_job():
+    """Lấy job queued cũ nhất; UPDATE có điều kiện để nhiều worker không tranh nhau."""
+    while True:
+        job = RenderJob.objects.filter(status=RenderJob.STATUS_QUEUED).order_by("created_at").first()
+        if job is None:
+            return None
+        if claim_job(job):
+            return job
+
+
+def requeue_stale_jobs(older_than):
+    """
+    Job quá lâu chưa xong (worker chết giữa chừng): đang rendering → queued lại;
+    đang uploading thì RenderedPhoto đã lưu → chỉ chạy tiếp bước upload/QR,
+    không render lại.
+    """
+    cutoff = timezone.now() - older_than
+    stale = RenderJob.objects.filter(started_at__lt=cutoff)
+    requeued = stale.filter(
+        Q(status=RenderJob.STATUS_RENDERING) | Q(status=RenderJob.STATUS_UPLOADING, rendered=None),
+    ).update(status=RenderJob.STATUS_QUEUED)
+    for job in stale.filter(status=RenderJob.STATUS_UPLOADING).select_related("session", "rendered"):
+        # UPDATE có điều kiện: chỉ một worker nhận chạy tiếp
+        if stale.filter(pk=job.pk, status=RenderJob.STATUS_UPLOADING).update(started_at=timezone.now()):
+            resume_upload(job)
+    return requeued
+
+
+def resume_upload(job):
+    """Chạy tiếp job đã có RenderedPhoto: upload (qua outbox) + QR, rồi done."""
+    rendered = job.rendered
+    try:
+        logger.info("Render job %s: resuming upload of render %s", job.id, rendered.id)
+        if not rendered.uploads.exists():
+            publish_render(rendered)
+        elif not rendered.qr_code:
+            # Outbox đã có entry (worker outbox retry), chỉ còn thiếu QR tạm
+            publish_url(rendered, rendered.remote_url or local_render_url(rendered))
+        _finish_job(job, rendered)
+    except Exception as e:
+        logger.exception("Render job %s failed", job.id)
+        _set_status(job, RenderJob.STATUS_FAILED, error=str(e), finished_at=timezone.now())
+    return job
+
+
+def _finish_job(job, rendered):
+    _set_status(job, RenderJob.STATUS_DONE, finished_at=timezone.now())
+    logger.info("Render job %s completed: render %s", job.id, rendered.id)
+
+    # Rasterize bản in ngay (spooler), khách bấm in là gửi luôn
+    try:
+        prepare_print_job(rendered)
+    except Exception:
+        logger.exception("Could not prepare print job for render %s", rendered.id)
+
+
+def _set_status(job, status, **fields):
+    job.status = status
+    for name, value in fields.items():
+        setattr(job, name, value)
+    with span("db"):
+        job.save(update_fields=["status", *fields])
+
+
+def save_render(session, frame, photos, fingerprint="", slot_threads=None):
+    """Ghép ảnh và lưu thành RenderedPhoto (chưa upload); slot_threads: xem compose_frame."""
+    rendered = RenderedPhoto(session=session, frame=frame, fingerprint=fingerprint)
+    stem = f"render_{session.phone}_{frame.id}_{session.renders.count() + 1}"
+    _, web_ext, web_type = web_format()
+    # Encode thẳng vào file tạm; storage move (rename) file đó vào MEDIA_ROOT,
+    # không có bản JPEG nào nằm trong RAM
+    with TemporaryUploadedFile(f"{stem}.jpg", "image/jpeg", None, None) as master, \
+            TemporaryUploadedFile(f"{stem}_web{web_ext}", web_type, None, None) as web, \
+            TemporaryUploadedFile(f"{stem}_thumb.jpg", "image/jpeg", None, None) as thumb:
+        render_to_file(photos, frame, master, web_fp=web, thumb_fp=thumb, slot_threads=slot_threads)
+        with span("save"):
+            for field, tmp in ((rendered.image, master), (rendered.web_image, web), (rendered.thumbnail, thumb)):
+                tmp.size = tmp.tell()
+                tmp.seek(0)
+                field.save(tmp.name, tmp, save=False)
+            rendered.save()
+    return rendered
+
+
+def run_render_job(job):
+    """Ghép ảnh → lưu RenderedPhoto → upload Firebase → tạo QR."""
+    session = job.session
+    frame = job.frame
+    phone = session.phone
+
+    try:
+        if frame is None:
+            raise ValueError("Frame đã bị xóa")
+
+        photos_by_id = Photo.objects.in_bulk(job.photo_ids)
+        missing = [pid for pid in job.photo_ids if pid not in photos_by_id]
+        if missing:
+            raise ValueError(f"Ảnh đã bị xóa: {missing}")
+        photos_ordered = [photos_by_id[pid] for pid in job.photo_ids]
+
+        if job.status != RenderJob.STATUS_RENDERING:
+            _set_status(job, RenderJob.STATUS_RENDERING, started_at=timezone.now())
+
+        logger.info("Render job %s: phone %s, frame %s", job.id, phone, frame.id)
+        rendered = save_render(session, frame, photos_ordered, job.fingerprint)
+        _set_status(job, RenderJob.STATUS_UPLOADING, rendered=rendered)
+
+        # Upload (qua outbox, tự retry nếu mạng lỗi) + tạo QR
+        publish_render(rendered)
+        _finish_job(job, rendered)
+    except Exception as e:
+        logger.exception("Render job %s failed", job.id)
+        _set_status(job, RenderJob.STATUS_FAILED, error=str(e), finished_at=timezone.now())
+
+    return job
+
+
+def work_forever(poll_interval=1.0, stale_after=timedelta(minutes=10), stop=None):
+    """Vòng lặp worker: claim → run; khi rảnh thì retry outbox upload rồi ngủ poll_interval."""
+    requeue_stale_jobs(stale_after)
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        job = claim_next_job()
+        if job is None:
+            if not drain_outbox():
+                time.sleep(poll_interval)
+            continue
+        run_render_job(job)
+
+
+def job_status_payload(job):
+    """Dữ liệu JSON cho endpoint polling."""
+    rendered = job.rendered
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "image_url": rendered.image.url if rendered and rendered.image else None,
+        "qr_url": rendered.qr_code.url if rendered and rendered.qr_code else None,
+        "download_url": job.session.download_url if job.status == RenderJob.STATUS_DONE else None,
+        "error": job.error or None,
+    }
@@ -0,0 +1,103 @@
+"""
+Layout của frame: validate + compile layout_json thành object hình học.
+
+layout_json = {"w": 1200, "h": 1800, "slots": [{"x", "y", "w", "h"}, ...]}
+
+Frame.save() compile layout một lần (lỗi bị chặn ngay ở admin thay vì lúc
+khách bấm render).
+"""
+from dataclasses import dataclass
+
+MAX_CANVAS_EDGE = 20000
+
+
+class LayoutError(ValueError):
+    """layout_json không hợp lệ."""
+
+
+def center_crop_box(img_w, img_h, slot_w, slot_h):
+    """Vùng crop center theo tỷ lệ slot: (left, top, right, bottom)."""
+    slot_ratio = slot_w / slot_h
+    img_ratio = img_w / img_h
+
+    if img_ratio > slot_ratio:
+        # Ảnh rộng hơn → crop chiều rộng
+        new_w = int(img_h * slot_ratio)
+        left = (img_w - new_w) // 2
+        return (left, 0, left + new_w, img_h)
+
+    # Ảnh cao hơn → crop chiều cao
+    new_h = int(img_w / slot_ratio)
+    top = (img_h - new_h) // 2
+    return (0, top, img_w, top + new_h)
+
+
+@dataclass(frozen=True, slots=True)
+class Slot:
+    index: int
+    x: int
+    y: int
+    w: int
+    h: int
+
+    @property
+    def aspect(self):
+        return self.w / self.h
+
+
+@dataclass(frozen=True, slots=True)
+class Layout:
+    width: int
+    height: int
+    slots: tuple
+
+    @property
+    def slot_count(self):
+        return len(self.slots)
+
+
+def _non_negative_int(value, what):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+        raise LayoutError(f"{what} phải là số nguyên (nhận: {value!r})")
+    value = int(value)
+    if value < 0:
+        raise LayoutError(f"{what} không được âm (nhận: {value})")
+    return value
+
+
+def compile_slot(index, data, canvas_w, canvas_h):
+    if not isinstance(data, dict):
+        raise LayoutError(f"Slot {index + 1}: phải là object {{x, y, w, h}}")
+    missing = [key for key in ("x", "y", "w", "h") if key not in data]
+    if missing:
+        raise LayoutError(f"Slot {index + 1}: thiếu {', '.join(missing)}")
+
+    x = _non_negative_int(data["x"], f"Slot {index + 1}: x")
+    y = _non_negative_int(data["y"], f"Slot {index + 1}: y")
+    w = _non_negative_int(data["w"], f"Slot {index + 1}: w")
+    h = _non_negative_int(data["h"], f"Slot {index + 1}: h")
+    if not w or not h:
+        raise LayoutError(f"Slot {index + 1}: w và h phải > 0")
+    if x + w > canvas_w or y + h > canvas_h:
+        raise LayoutError(f"Slot {index + 1}: nằm ngoài canvas {canvas_w}x{canvas_h}")
+
+    return Slot(index=index, x=x, y=y, w=w, h=h)
+
+
+def compile_layout(data):
+    """Validate layout_json, trả về Layout; raise LayoutError nếu sai."""
+    if not isinstance(data, dict):
+        raise LayoutError("Layout phải là object {w, h, slots}")
+    width = _non_negative_int(data.get("w", 1200), "w")
+    height = _non_negative_int(data.get("h", 1800), "h")
+    if not (0 < width <= MAX_CANVAS_EDGE and 0 < height <= MAX_CANVAS_EDGE):
+        raise LayoutError(f"Kích thước canvas phải trong khoảng 1..{MAX_CANVAS_EDGE}px")
+
+    slots = data.get("slots")
+    if not isinstance(slots, list) or not slots:
+        raise LayoutError("Layout cần ít nhất một slot")
+    return Layout(
+        width=width,
+        height=height,
+        slots=tuple(compile_slot(i, slot, width, height) for i, slot in enumerate(slots)),
+    )
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.benchmarks import (
+    DEFAULT_FORMATS, DEFAULT_FRAMES, DEFAULT_MEGAPIXELS, DEFAULT_ORIENTATIONS, PHOTO_FORMATS, run_benchmark,
+)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark pipeline render với dữ liệu giả lập (DB test + MEDIA_ROOT tạm, object store local/memory). "
+        "In bảng tóm tắt và ghi kết quả JSON để so sánh giữa các bản"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--frames", nargs="+", default=DEFAULT_FRAMES, help="Frame dạng WxH:png|jpeg")
+        parser.add_argument("--megapixels", nargs="+", type=int, default=DEFAULT_MEGAPIXELS)
+        parser.add_argument("--formats", nargs="+", choices=sorted(PHOTO_FORMATS), default=DEFAULT_FORMATS)
+        parser.add_argument("--orientations", nargs="+", choices=DEFAULT_ORIENTATIONS, default=DEFAULT_ORIENTATIONS)
+        parser.add_argument("--iterations", type=int, default=5, help="Số lần đo mỗi stage")
+        parser.add_argument("--warmup", type=int, default=1, help="Số lần render bỏ qua trước khi đo")
+        parser.add_argument(
+            "--data-dir", default=os.path.join(settings.BASE_DIR, "cache", "bench"),
+            help="Thư mục lưu ảnh giả lập (sinh một lần, dùng lại)",
+        )
+        parser.add_argument("--output", default="bench_results.json", help="File JSON kết quả ('-' = stdout)")
+        parser.add_argument("--label", help="Nhãn cho lần chạy (vd. tên bản release)")
+        parser.add_argument("--no-tracemalloc", action="store_true", help="Tắt tracemalloc (latency sát thực tế hơn)")
+        parser.add_argument(
+            "--storage", choices=["local", "memory"], default="local",
+            help="Object store cho stage storage: thư mục tạm hoặc trong RAM",
+        )
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix="photobooth-bench-")
+        media_root = os.path.join(workdir, "media")
+        old_db_name = connection.settings_dict["NAME"]
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                FRAME_CACHE_DIR=os.path.join(workdir, "frames"),
+                UPLOAD_BACKEND=options["storage"],
+                UPLOAD_LOCAL_DIR=os.path.join(media_root, "bucket"),
+                UPLOAD_LOCAL_URL="http://bench.invalid/media/bucket/",
+            ):
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                try:
+                    report = run_benchmark(
+                        data_dir=options["data_dir"],
+                        frames=options["frames"],
+                        megapixels=options["megapixels"],
+                        formats=options["formats"],
+                        orientations=options["orientations"],
+                        iterations=max(1, options["iterations"]),
+                        warmup=max(0, options["warmup"]),
+                        trace_memory=not options["no_tracemalloc"],
+                        log=self.stderr.write,
+                    )
+                finally:
+                    connection.creation.destroy_test_db(old_db_name, verbosity=0)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        report["meta"]["label"] = options["label"]
+        report["meta"]["git_revision"] = _git_revision()
+
+        self.print_summary(report["results"])
+        payload = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"] == "-":
+            self.stdout.write(payload)
+        else:
+            with open(options["output"], "w") as f:
+                f.write(payload)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def print_summary(self, results):
+        self.stdout.write(
+            f"{'case':<52} {'stage':<12} {'n':>3} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} "
+            f"{'ops/s':>7} {'trace MB':>9} {'rss MB':>8}"
+        )
+        for case, stages in results.items():
+            for stage, row in stages.items():
+                traced = row["tracemalloc_peak_mb"]
+                self.stdout.write(
+                    f"{case:<52} {stage:<12} {row['n']:>3} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+                    f"{row['max_ms']:>9.1f} {row['throughput_per_s'] or 0:>7.2f} "
+                    f"{traced if traced is not None else float('nan'):>9.1f} {row['rss_peak_mb']:>8.0f}"
+                )
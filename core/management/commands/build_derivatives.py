@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.derivatives import build_photo_derivatives, build_render_variants, max_slot_edge
+from core.models import Frame, Photo, RenderedPhoto
+from core.thumbnails import build_thumbnail
+
+
+class Command(BaseCommand):
+    help = "Tạo bản render/preview/thumbnail cho các Photo chưa có (hoặc tất cả với --all)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Tạo lại cho mọi ảnh")
+        parser.add_argument("--renders", action="store_true", help="Tạo bản web/thumbnail cho RenderedPhoto")
+        parser.add_argument("--frames", action="store_true", help="Tạo thumbnail admin cho các Frame")
+
+    def handle(self, *args, **options):
+        if options["renders"]:
+            return self.build_renders(options["all"])
+        if options["frames"]:
+            built = sum(1 for frame in Frame.objects.all() if build_thumbnail(frame.image))
+            self.stdout.write(self.style.SUCCESS(f"Built thumbnails for {built} frames"))
+            return
+
+        photos = Photo.objects.order_by("id")
+        if not options["all"]:
+            photos = photos.filter(Q(thumbnail="") | Q(thumbnail__isnull=True))
+
+        render_edge = max_slot_edge()
+        done = failed = 0
+        built_hashes = set()
+        for photo in photos.iterator():
+            # Photo cùng content hash dùng chung bộ phái sinh: chỉ tạo một lần
+            if photo.content_hash in built_hashes:
+                continue
+            try:
+                build_photo_derivatives(photo, render_edge=render_edge)
+                built_hashes.add(photo.content_hash or None)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Photo {photo.id}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Built derivatives for {done} photos ({failed} failed)"))
+
+    def build_renders(self, rebuild_all):
+        renders = RenderedPhoto.objects.order_by("id")
+        if not rebuild_all:
+            renders = renders.filter(Q(web_image="") | Q(web_image__isnull=True))
+
+        done = failed = 0
+        for rendered in renders.iterator():
+            try:
+                build_render_variants(rendered)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Render {rendered.id}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Built variants for {done} renders ({failed} failed)"))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.printing import spool_forever, spool_once
+
+
+class Command(BaseCommand):
+    help = "Rasterize trước các lệnh in và gửi sang máy in khi khách bấm in"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll", type=float, default=1.0, help="Giây chờ khi không có job")
+        parser.add_argument("--once", action="store_true", help="Chỉ xử lý các job đang chờ rồi thoát")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            handled = spool_once()
+            self.stdout.write(self.style.SUCCESS(f"Processed {handled} print job(s)"))
+            return
+
+        self.stdout.write(f"Print spooler started (backend: {settings.PRINT_BACKEND})")
+        try:
+            spool_forever(poll_interval=options["poll"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping print spooler...")
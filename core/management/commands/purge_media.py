@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.retention import disk_usage_percent, purge_forever, purge_once
+
+
+class Command(BaseCommand):
+    help = "Xóa session quá hạn giữ / khi ổ đĩa gần đầy, cùng file local, object trên bucket và file mồ côi"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Chạy một lượt rồi thoát (dùng với cron)")
+        parser.add_argument("--interval", type=float, default=None, help="Phút giữa các lượt (mặc định RETENTION_INTERVAL_MINUTES)")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            stats = purge_once()
+            self.stdout.write(self.style.SUCCESS(
+                f"Purged {stats.sessions} session(s), {stats.files} file(s), "
+                f"{stats.remote_objects} remote object(s), {stats.orphans} orphan(s), "
+                f"{stats.expired_uploads} expired upload(s); disk {disk_usage_percent():.1f}% used"
+            ))
+            for error in stats.errors:
+                self.stderr.write(error)
+            return
+
+        interval = options["interval"] or settings.RETENTION_INTERVAL_MINUTES
+        self.stdout.write(f"Retention purge running every {interval:g} min")
+        try:
+            purge_forever(interval=interval * 60)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping retention purge...")
@@ -0,0 +1,88 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.remote_storage import get_storage
+from core.models import PendingUpload, RenderedPhoto
+from core.uploads import enqueue_upload, legacy_remote_path, remote_path_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Đồng bộ index render trong DB với bucket: điền remote_url còn thiếu, "
+        "upload lại render bị mất trên bucket, báo file trên bucket không có trong DB. "
+        "Cần chạy một lần sau migrate 0007 để index các render upload bởi code cũ"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--phone", help="Chỉ đồng bộ một session")
+        parser.add_argument("--dry-run", action="store_true", help="Chỉ báo cáo, không sửa gì")
+        parser.add_argument("--interval", type=int, default=0, help="Chạy lặp lại mỗi N giây (0 = chạy một lần)")
+
+    def handle(self, *args, **options):
+        while True:
+            self.reconcile(options["phone"], options["dry_run"])
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
+
+    def reconcile(self, phone, dry_run):
+        prefix = f"renders/session_{phone}/" if phone else "renders/"
+        storage = get_storage()
+        blobs = {obj.name: obj for obj in storage.list(prefix=prefix)}
+
+        renders = RenderedPhoto.objects.select_related("session").order_by("id")
+        if phone:
+            renders = renders.filter(session__phone=phone)
+        pending_ids = set(
+            PendingUpload.objects.filter(
+                status__in=[PendingUpload.STATUS_PENDING, PendingUpload.STATUS_UPLOADING],
+            ).values_list("rendered_id", flat=True)
+        )
+
+        repaired = requeued = 0
+        known_paths = set()
+        for rendered in renders.iterator():
+            if rendered.remote_path:
+                candidates = [rendered.remote_path]
+            else:
+                # Render chưa có index: blob có thể mang tên mới (đuôi bản web)
+                # hoặc tên của code cũ (.jpg)
+                candidates = list(dict.fromkeys([remote_path_for(rendered), legacy_remote_path(rendered)]))
+            known_paths.update(candidates)
+            remote_path = next((path for path in candidates if path in blobs), candidates[0])
+            blob = blobs.get(remote_path)
+
+            if blob is not None and not rendered.remote_url:
+                # Đã có trên bucket nhưng DB chưa ghi nhận (vd. upload cũ, trước khi có index)
+                repaired += 1
+                self.stdout.write(f"Repair render {rendered.id}: {remote_path}")
+                if not dry_run:
+                    rendered.remote_path = remote_path
+                    rendered.remote_url = storage.public_url(remote_path)
+                    rendered.uploaded_at = timezone.now()
+                    rendered.save(update_fields=["remote_path", "remote_url", "uploaded_at"])
+            elif blob is None and rendered.id not in pending_ids:
+                # Bucket không có file: upload lại nếu còn bản local
+                if not (rendered.web_file and os.path.exists(rendered.web_file.path)):
+                    continue
+                requeued += 1
+                self.stdout.write(f"Re-upload render {rendered.id}: {remote_path}")
+                if not dry_run:
+                    if rendered.remote_url:
+                        rendered.remote_url = ""
+                        rendered.save(update_fields=["remote_url"])
+                    upload = enqueue_upload(rendered)
+                    upload.next_attempt_at = timezone.now()
+                    upload.save(update_fields=["next_attempt_at"])
+
+        orphans = sorted(name for name in blobs if name not in known_paths)
+        for name in orphans:
+            self.stdout.write(f"Not in DB: {name}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {len(blobs)} remote file(s): {repaired} repaired, "
+            f"{requeued} queued for upload, {len(orphans)} not in DB"
+        ))
@@ -0,0 +1,68 @@
+import multiprocessing
+import signal
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _worker_main(poll_interval, stale_after_seconds):
+    # Tiến trình con (fork hoặc spawn): đảm bảo Django đã setup.
+    # Ctrl+C do tiến trình cha xử lý (terminate các con).
+    import django
+    django.setup()
+    from core.jobs import work_forever
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work_forever(poll_interval=poll_interval, stale_after=timedelta(seconds=stale_after_seconds))
+
+
+class Command(BaseCommand):
+    help = "Chạy worker xử lý RenderJob (ghép ảnh, upload, tạo QR) ở nền"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=settings.RENDER_WORKERS,
+            help="Số tiến trình worker (mặc định: RENDER_WORKERS)",
+        )
+        parser.add_argument("--poll", type=float, default=1.0, help="Giây chờ giữa các lần kiểm tra hàng đợi")
+        parser.add_argument(
+            "--stale-after", type=int, default=600,
+            help="Job rendering/uploading lâu hơn số giây này sẽ được queue lại khi worker khởi động",
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options["workers"])
+        poll = options["poll"]
+        stale_after = options["stale_after"]
+
+        self.stdout.write(f"Starting {workers} render worker(s)")
+
+        if workers == 1:
+            from core.jobs import work_forever
+
+            try:
+                work_forever(poll_interval=poll, stale_after=timedelta(seconds=stale_after))
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping render worker...")
+            return
+
+        # Không chia sẻ kết nối DB giữa các tiến trình con
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=_worker_main, args=(poll, stale_after), name=f"renderworker-{i}")
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping render workers...")
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
@@ -0,0 +1,178 @@
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from core.fingerprints import render_fingerprint
+from core.models import PhotoSlot, RenderedPhoto
+from core.uploads import drain_outbox, enqueue_upload, local_render_url, publish_url
+
+
+def _init_worker():
+    # Tiến trình con: setup Django, Ctrl+C do tiến trình cha xử lý
+    import django
+    django.setup()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _render_one(session_id, frame_id, photo_ids, fingerprint):
+    """Chạy trong process pool: ghép + lưu RenderedPhoto, trả về id."""
+    from core.jobs import save_render
+    from core.models import Frame, Photo, Session
+
+    session = Session.objects.get(pk=session_id)
+    frame = Frame.objects.get(pk=frame_id)
+    photos_by_id = Photo.objects.in_bulk(photo_ids)
+    # Mỗi tiến trình đã chiếm một core: chuẩn bị slot tuần tự, tránh thừa thread
+    rendered = save_render(session, frame, [photos_by_id[pid] for pid in photo_ids], fingerprint, slot_threads=1)
+    return rendered.id
+
+
+class Command(BaseCommand):
+    help = (
+        "Render lại hàng loạt các session đã từng render (vd. sau khi sửa frame). "
+        "Bỏ qua session đã có render mới nhất, chạy lại được sau khi bị ngắt; upload gom lại ở cuối"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--frame", type=int, action="append", help="Chỉ frame id này (lặp lại được)")
+        parser.add_argument("--phone", nargs="+", help="Danh sách số điện thoại")
+        parser.add_argument("--since", type=date.fromisoformat, help="Session tạo từ ngày (YYYY-MM-DD)")
+        parser.add_argument("--until", type=date.fromisoformat, help="Session tạo đến hết ngày (YYYY-MM-DD)")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Số tiến trình render (mặc định: số core)",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Chỉ liệt kê session cần render lại")
+        parser.add_argument("--no-upload", action="store_true", help="Không upload ở cuối (để uploadworker làm)")
+
+    def handle(self, *args, **options):
+        tasks, pending_upload = self.collect(options)
+        self.stdout.write(
+            f"{len(tasks)} session(s) to re-render, {len(pending_upload)} already up to date but not uploaded"
+        )
+        if options["dry_run"]:
+            for session, frame, _, _ in tasks:
+                self.stdout.write(f"  {session.phone} (frame {frame.id})")
+            return
+
+        rendered_ids = list(pending_upload)
+        if tasks:
+            rendered_ids += self.render_all(tasks, max(1, options["workers"]))
+        if rendered_ids and not options["no_upload"]:
+            self.upload_all(rendered_ids)
+
+    def collect(self, options):
+        """Các cặp (session, frame) đã từng render với frame đó và đủ ảnh trong slot."""
+        slots = PhotoSlot.objects.select_related("session", "frame", "photo").order_by("session_id", "slot_index")
+        if options["frame"]:
+            slots = slots.filter(frame_id__in=options["frame"])
+        if options["phone"]:
+            slots = slots.filter(session__phone__in=options["phone"])
+        tz = timezone.get_current_timezone()
+        if options["since"]:
+            slots = slots.filter(session__created_at__gte=datetime.combine(options["since"], dt_time.min, tz))
+        if options["until"]:
+            slots = slots.filter(session__created_at__lte=datetime.combine(options["until"], dt_time.max, tz))
+
+        groups = {}
+        for slot in slots:
+            groups.setdefault((slot.session_id, slot.frame_id), {})[slot.slot_index] = slot
+
+        rendered_pairs = set(
+            RenderedPhoto.objects.filter(session_id__in={key[0] for key in groups})
+            .values_list("session_id", "frame_id")
+        )
+
+        tasks, pending_upload = [], []
+        for key, by_index in groups.items():
+            first = next(iter(by_index.values()))
+            session, frame = first.session, first.frame
+            if key not in rendered_pairs:
+                continue
+            # Theo slot_index (không theo thứ tự query): slot thiếu ở giữa = chưa đủ ảnh
+            if any(index not in by_index for index in range(frame.slot_count)):
+                self.stderr.write(f"Skip {session.phone}: frame {frame.id} chưa đủ ảnh")
+                continue
+            photos = [by_index[index].photo for index in range(frame.slot_count)]
+            try:
+                fingerprint = render_fingerprint(frame, photos)
+            except OSError as e:
+                self.stderr.write(f"Skip {session.phone}: {e}")
+                continue
+
+            existing = session.renders.filter(fingerprint=fingerprint).order_by("-created_at").first()
+            if existing is None:
+                tasks.append((session, frame, [photo.id for photo in photos], fingerprint))
+            elif not existing.remote_url and not existing.uploads.exists():
+                # Lần chạy trước bị ngắt sau khi render, trước khi upload
+                pending_upload.append(existing.id)
+        return tasks, pending_upload
+
+    def render_all(self, tasks, workers):
+        total = len(tasks)
+        done = failed = 0
+        rendered_ids = []
+        started = time.monotonic()
+        self.stdout.write(f"Rendering with {workers} process(es)")
+
+        # Không chia sẻ kết nối DB với các tiến trình con
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(_render_one, session.id, frame.id, photo_ids, fingerprint): session
+                for session, frame, photo_ids, fingerprint in tasks
+            }
+            try:
+                for future in as_completed(futures):
+                    session = futures[future]
+                    try:
+                        rendered_ids.append(future.result())
+                        done += 1
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f"Render {session.phone} failed: {e}")
+                    elapsed = time.monotonic() - started
+                    rate = (done + failed) / elapsed if elapsed else 0.0
+                    eta = (total - done - failed) / rate if rate else 0.0
+                    self.stdout.write(
+                        f"[{done + failed}/{total}] {session.phone}  "
+                        f"{rate:.2f} renders/s, ETA {eta:.0f}s"
+                    )
+            except KeyboardInterrupt:
+                # Render đã xong vẫn được giữ lại; chạy lại lệnh sẽ làm tiếp phần còn thiếu
+                for future in futures:
+                    future.cancel()
+                raise CommandError(f"Interrupted after {done} render(s); run again to resume")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {done} session(s) in {elapsed:.1f}s ({failed} failed, "
+            f"{done / elapsed if elapsed else 0:.2f} renders/s)"
+        ))
+        return rendered_ids
+
+    def upload_all(self, rendered_ids):
+        """Ghi tất cả vào outbox rồi upload song song một lượt; lỗi để uploadworker retry."""
+        renders = list(RenderedPhoto.objects.select_related("session").filter(id__in=rendered_ids).order_by("id"))
+        for rendered in renders:
+            upload = enqueue_upload(rendered)
+            upload.next_attempt_at = timezone.now()
+            upload.save(update_fields=["next_attempt_at"])
+
+        uploaded = drain_outbox()
+
+        # Chưa upload được: QR + download_url tạm trỏ về URL local như publish_render
+        for rendered in renders:
+            rendered.refresh_from_db()
+            if not rendered.remote_url:
+                publish_url(rendered, local_render_url(rendered))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Uploaded {uploaded}/{len(renders)} render(s); the rest stay queued for uploadworker"
+        ))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.uploads import drain_forever, drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Upload các ảnh render đang chờ trong outbox (retry với backoff)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll", type=float, default=2.0, help="Giây chờ khi outbox trống")
+        parser.add_argument("--once", action="store_true", help="Chỉ xử lý các entry đã tới hạn rồi thoát")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            uploaded = drain_outbox()
+            self.stdout.write(self.style.SUCCESS(f"Uploaded {uploaded} file(s)"))
+            return
+
+        self.stdout.write(f"Draining upload outbox with {settings.UPLOAD_WORKERS} thread(s)")
+        try:
+            drain_forever(poll_interval=options["poll"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping upload worker...")
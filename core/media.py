@@ -0,0 +1,136 @@
+"""
+Phục vụ file trong MEDIA_ROOT (ảnh gốc, render, thumbnail, QR...).
+
+File media không bao giờ bị ghi đè (upload/render mới → tên file mới; QR
+content-addressed), nên response có Cache-Control immutable + ETag/
+Last-Modified: trình duyệt và proxy giữ cache, lần sau chỉ hỏi lại (304).
+
+- Range: hỗ trợ một khoảng byte (206 / 416), có If-Range
+- MEDIA_ACCEL = "x-accel": chỉ trả header X-Accel-Redirect, nginx tự gửi file
+  (internal location trỏ vào MEDIA_ROOT, xem MEDIA_ACCEL_PREFIX)
+- MEDIA_ACCEL = "x-sendfile": header X-Sendfile (Apache mod_xsendfile, lighttpd)
+- Không có proxy: FileResponse (wsgi.file_wrapper → sendfile nếu server hỗ trợ)
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_http_methods
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def media_etag(st):
+    """ETag từ mtime + size (đổi khi file đổi, không phải đọc nội dung)."""
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    'bytes=a-b' → (start, end) tính cả byte cuối; None nếu không có/không
+    hỗ trợ (nhiều khoảng) → trả cả file; raise ValueError nếu không thỏa được.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N: N byte cuối
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    modified = parse_http_date_safe(if_range)
+    return modified is not None and int(mtime) <= modified
+
+
+def _file_chunks(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining:
+            block = f.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def _cache_headers(response, etag, st):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(st.st_mtime)
+    patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE, immutable=True)
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        st = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404("File not found")
+    if not stat.S_ISREG(st.st_mode) or os.path.basename(full_path).startswith("."):
+        raise Http404("File not found")
+
+    etag = media_etag(st)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(st.st_mtime))
+    if not_modified is not None:
+        return _cache_headers(not_modified, etag, st)
+
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+
+    if settings.MEDIA_ACCEL:
+        # Proxy tự gửi file (kể cả Range/sendfile), worker Python không đọc byte nào
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_ACCEL == "x-accel":
+            relative = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, "/")
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX.rstrip("/") + "/" + quote(relative)
+        else:
+            response["X-Sendfile"] = full_path
+        return _cache_headers(response, etag, st)
+
+    byte_range = None
+    if _if_range_matches(request, etag, st.st_mtime):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), st.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{st.st_size}"
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(full_path, "rb"), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_file_chunks(full_path, start, length), status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+        response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    return _cache_headers(response, etag, st)
@@ -0,0 +1,127 @@
+"""
+Metrics trong process, xuất dạng text Prometheus tại /metrics.
+
+- photobooth_stage_seconds: histogram thời gian từng stage (decode, resize,
+  composite, encode, save, upload, qr, db...), ghi bằng span("stage")
+- photobooth_renders_in_progress: số render đang chạy trong process này
+- photobooth_render_memory_*: ngân sách RAM render, phần đang giữ, số render đang chờ
+- photobooth_render_jobs / photobooth_uploads: số job/upload theo trạng thái,
+  đọc từ DB nên đúng cho cả worker chạy ở process khác
+- photobooth_media_disk_used_percent: % ổ chứa MEDIA_ROOT đã dùng (xem core/retention.py)
+
+Histogram chỉ gom trong process hiện tại (web hoặc worker).
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Histogram:
+    """Histogram tích luỹ kiểu Prometheus (bucket le, _sum, _count), thread-safe."""
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: dict(series, buckets=list(series["buckets"])) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            for bound, count in zip(self.buckets, series["buckets"]):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("photobooth_stage_seconds", "Thời gian từng stage của pipeline render/upload (giây)")
+
+_in_progress = 0
+_in_progress_lock = threading.Lock()
+
+
+@contextmanager
+def span(stage):
+    """Đo thời gian một stage; lỗi vẫn được ghi lại với outcome="error"."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage, outcome=outcome)
+        logger.debug("%s %s in %.1f ms", stage, outcome, elapsed * 1000)
+
+
+@contextmanager
+def render_in_progress():
+    global _in_progress
+    with _in_progress_lock:
+        _in_progress += 1
+    try:
+        yield
+    finally:
+        with _in_progress_lock:
+            _in_progress -= 1
+
+
+def _gauge(name, help_text, values):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in values]
+    return lines
+
+
+def _status_counts(model):
+    counts = dict(model.objects.values_list("status").annotate(n=Count("id")).order_by())
+    return [((("status", status),), counts.get(status, 0)) for status, _ in model.STATUS_CHOICES]
+
+
+def render_metrics():
+    """Toàn bộ metrics dạng text exposition format."""
+    from .models import PendingUpload, RenderJob
+    from .rendering import get_render_budget
+    from .retention import disk_usage_percent
+
+    lines = STAGE_SECONDS.collect()
+    lines += _gauge("photobooth_renders_in_progress", "Render đang chạy trong process này", [((), _in_progress)])
+    budget = get_render_budget()
+    lines += _gauge("photobooth_render_memory_budget_bytes", "Ngân sách RAM cho render (0 = không giới hạn)", [((), budget.limit_bytes)])
+    lines += _gauge("photobooth_render_memory_reserved_bytes", "RAM ước lượng của các render đang chạy", [((), budget.reserved)])
+    lines += _gauge("photobooth_renders_waiting_memory", "Render đang chờ vì vượt ngân sách RAM", [((), budget.waiting)])
+    lines += _gauge("photobooth_render_jobs", "Số RenderJob theo trạng thái", _status_counts(RenderJob))
+    lines += _gauge("photobooth_uploads", "Số upload trong outbox theo trạng thái", _status_counts(PendingUpload))
+    lines += _gauge("photobooth_media_disk_used_percent", "% ổ chứa MEDIA_ROOT đã dùng", [((), round(disk_usage_percent(), 2))])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_session_selected_frame_photoslot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='preview_image',
+            field=models.ImageField(blank=True, null=True, upload_to='photos/preview/'),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='render_height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='render_image',
+            field=models.ImageField(blank=True, height_field='render_height', null=True, upload_to='photos/render/', width_field='render_width'),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='render_width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='photos/thumbs/'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_photo_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('photo_ids', models.JSONField(default=list)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('rendering', 'Rendering'), ('uploading', 'Uploading'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=16)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('frame', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.frame')),
+                ('rendered', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.renderedphoto')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='render_jobs', to='core.session')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:28
+
+from urllib.parse import unquote, urlsplit
+
+from django.db import migrations, models
+
+
+def backfill_from_outbox(apps, schema_editor):
+    """Render đã upload qua outbox → chép remote path/url sang RenderedPhoto."""
+    PendingUpload = apps.get_model('core', 'PendingUpload')
+    RenderedPhoto = apps.get_model('core', 'RenderedPhoto')
+    for upload in PendingUpload.objects.filter(status='done').exclude(public_url='').order_by('id'):
+        RenderedPhoto.objects.filter(pk=upload.rendered_id).update(
+            remote_path=upload.remote_path,
+            remote_url=upload.public_url,
+            uploaded_at=upload.updated_at,
+        )
+
+
+def backfill_from_download_url(apps, schema_editor):
+    """
+    Render upload bởi code cũ (trước outbox): tên blob là
+    renders/session_{phone}/{phone}_{id}.jpg và URL chỉ còn trong
+    Session.download_url (render mới nhất của session).
+
+    Các render cũ hơn không còn dấu vết trong DB → chạy
+    `manage.py reconcile_renders` sau khi migrate để khớp với bucket.
+    """
+    Session = apps.get_model('core', 'Session')
+    RenderedPhoto = apps.get_model('core', 'RenderedPhoto')
+    sessions = Session.objects.exclude(download_url__isnull=True).exclude(download_url='')
+    for session in sessions.iterator():
+        path = unquote(urlsplit(session.download_url).path)
+        prefix = f"/renders/session_{session.phone}/{session.phone}_"
+        start = path.find(prefix)
+        if start < 0 or not path.endswith('.jpg'):
+            # Fallback URL local (127.0.0.1) → chưa từng lên bucket
+            continue
+        rendered_id = path[start + len(prefix):-len('.jpg')]
+        if not rendered_id.isdigit():
+            continue
+        RenderedPhoto.objects.filter(pk=int(rendered_id), session=session, remote_url='').update(
+            remote_path=path[start + 1:],
+            remote_url=session.download_url,
+            uploaded_at=models.F('created_at'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_pendingupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='renderedphoto',
+            name='remote_path',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='renderedphoto',
+            name='remote_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='renderedphoto',
+            name='uploaded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_from_outbox, migrations.RunPython.noop),
+        migrations.RunPython(backfill_from_download_url, migrations.RunPython.noop),
+    ]
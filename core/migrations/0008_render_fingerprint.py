@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_renderedphoto_remote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='renderedphoto',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='renderjob',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='renderjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'rendering', 'uploading']), models.Q(('fingerprint', ''), _negated=True)), fields=('session', 'fingerprint'), name='unique_active_render_fingerprint'),
+        ),
+    ]
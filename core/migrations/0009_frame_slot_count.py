@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:39
+
+from django.db import migrations, models
+
+
+def fill_slot_count(apps, schema_editor):
+    """Frame cũ: slot_count = số slot trong layout_json (layout lỗi thì để 0)."""
+    Frame = apps.get_model('core', 'Frame')
+    for frame in Frame.objects.all():
+        slots = frame.layout_json.get('slots') if isinstance(frame.layout_json, dict) else None
+        frame.slot_count = len(slots) if isinstance(slots, list) else 0
+        frame.save(update_fields=['slot_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_render_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='frame',
+            name='slot_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_slot_count, migrations.RunPython.noop),
+    ]
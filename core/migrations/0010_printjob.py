@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_frame_slot_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrintJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('printer', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('preparing', 'Preparing'), ('rasterizing', 'Rasterizing'), ('ready', 'Ready'), ('printing', 'Printing'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='preparing', max_length=16)),
+                ('raster', models.FileField(blank=True, upload_to='prints/')),
+                ('copies', models.PositiveSmallIntegerField(default=1)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('requested_at', models.DateTimeField(blank=True, null=True)),
+                ('printed_at', models.DateTimeField(blank=True, null=True)),
+                ('rendered', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='print_jobs', to='core.renderedphoto')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='renderedphoto',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='renders/thumbs/'),
+        ),
+        migrations.AddField(
+            model_name='renderedphoto',
+            name='web_image',
+            field=models.ImageField(blank=True, null=True, upload_to='renders/web/'),
+        ),
+    ]
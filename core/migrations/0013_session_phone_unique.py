@@ -0,0 +1,60 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:54
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_sessions(apps, schema_editor):
+    """
+    Gộp các Session trùng phone vào session cũ nhất (trước khi thêm unique):
+    chuyển mọi bản ghi con sang session giữ lại, slot trùng (frame, slot_index)
+    thì giữ slot của session giữ lại.
+    """
+    Session = apps.get_model('core', 'Session')
+    PhotoSlot = apps.get_model('core', 'PhotoSlot')
+    duplicates = (
+        Session.objects.values('phone')
+        .annotate(n=Count('id'), keep_id=Min('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        keeper = Session.objects.get(pk=row['keep_id'])
+        others = list(Session.objects.filter(phone=row['phone']).exclude(pk=keeper.pk).order_by('id'))
+        taken = set(PhotoSlot.objects.filter(session=keeper).values_list('frame_id', 'slot_index'))
+        for other in others:
+            for slot in PhotoSlot.objects.filter(session=other):
+                if (slot.frame_id, slot.slot_index) in taken:
+                    slot.delete()
+                else:
+                    taken.add((slot.frame_id, slot.slot_index))
+            for rel in Session._meta.related_objects:
+                if rel.one_to_many:
+                    rel.related_model.objects.filter(**{rel.field.name: other}).update(**{rel.field.name: keeper})
+            keeper.selected_frame_id = keeper.selected_frame_id or other.selected_frame_id
+            keeper.download_url = keeper.download_url or other.download_url
+            other.delete()
+        keeper.save(update_fields=['selected_frame', 'download_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_render_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_sessions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='session',
+            name='phone',
+            field=models.CharField(max_length=20, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['session', 'created_at'], name='core_photo_session_bb5f8d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='renderedphoto',
+            index=models.Index(fields=['session', 'created_at'], name='core_render_session_de1655_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_session_phone_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='frame',
+            name='retention_days',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-18 06:00
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_photos(apps, schema_editor):
+    """
+    Photo trùng nội dung trong cùng session → gộp vào Photo cũ nhất (slot /
+    chunked upload trỏ sang Photo giữ lại). File thừa để retention quét.
+    """
+    Photo = apps.get_model('core', 'Photo')
+    duplicates = (
+        Photo.objects.exclude(content_hash='')
+        .values('session_id', 'content_hash')
+        .annotate(n=Count('id'), keep_id=Min('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        others = list(
+            Photo.objects.filter(session_id=row['session_id'], content_hash=row['content_hash'])
+            .exclude(pk=row['keep_id'])
+        )
+        # include_hidden: cả FK related_name="+" (ChunkedUpload.photo)
+        for rel in Photo._meta.get_fields(include_hidden=True):
+            if rel.one_to_many and rel.auto_created:
+                rel.related_model.objects.filter(**{f"{rel.field.name}__in": others}).update(
+                    **{rel.field.name: row['keep_id']}
+                )
+        Photo.objects.filter(pk__in=[other.pk for other in others]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_frame_retention_days'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_photos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='photo',
+            constraint=models.UniqueConstraint(condition=models.Q(('content_hash', ''), _negated=True), fields=('session', 'content_hash'), name='unique_session_photo_content'),
+        ),
+    ]
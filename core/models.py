@@ -1,20 +1,56 @@
 from django.db import models
 
 # Create your models here.
+import copy
+import uuid
+
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
+
+from .layouts import LayoutError, compile_layout
 
 class Frame(models.Model):
     name = models.CharField(max_length=100)
     image = models.ImageField(upload_to="frames/")
-    # JSON describe vị trí các slot ảnh trong frame
+    # JSON describe vị trí các slot ảnh trong frame (validate ở core/layouts.py)
     layout_json = models.JSONField()
+    # Số slot, ghi lúc save (không phải parse layout_json mỗi lần liệt kê frame)
+    slot_count = models.PositiveSmallIntegerField(default=0, editable=False)
     active = models.BooleanField(default=True)
+    # Số ngày giữ session/ảnh của event dùng frame này (trống = RETENTION_DAYS, 0 = giữ mãi)
+    retention_days = models.PositiveIntegerField(null=True, blank=True)
 
     def __str__(self):
         return self.name
 
+    @property
+    def layout(self):
+        """Layout đã compile (core.layouts.Layout), cache theo layout_json hiện tại."""
+        cached = getattr(self, "_layout_cache", None)
+        if cached is None or cached[0] != self.layout_json:
+            cached = (copy.deepcopy(self.layout_json), compile_layout(self.layout_json))
+            self._layout_cache = cached
+        return cached[1]
+
+    def clean(self):
+        super().clean()
+        try:
+            self.layout
+        except LayoutError as e:
+            raise ValidationError({"layout_json": str(e)})
+
+    def save(self, *args, **kwargs):
+        # Layout sai → lỗi ngay khi lưu frame, không phải lúc khách render
+        self.slot_count = self.layout.slot_count
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "layout_json" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "slot_count"}
+        super().save(*args, **kwargs)
+
 class Session(models.Model):
-    phone = models.CharField(max_length=20)
+    # Khóa tra cứu của mọi view (unique → có index, get_or_create không tạo trùng khi chạy song song)
+    phone = models.CharField(max_length=20, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     download_url = models.URLField(max_length=500, blank=True, null=True)
     selected_frame = models.ForeignKey(Frame, on_delete=models.SET_NULL, null=True, blank=True, related_name="sessions")
@@ -24,8 +60,40 @@ class Session(models.Model):
 
 class Photo(models.Model):
     session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="photos")
+    # File gốc theo content address photos/<sha256><ext>, có thể dùng chung giữa các Photo
     image = models.ImageField(upload_to="photos/")
     created_at = models.DateTimeField(auto_now_add=True)
+    # SHA-256 file gốc (xem core/fingerprints.py)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+    # Bản phái sinh tạo lúc upload (xem core/derivatives.py)
+    render_image = models.ImageField(
+        upload_to="photos/render/", blank=True, null=True,
+        width_field="render_width", height_field="render_height",
+    )
+    render_width = models.PositiveIntegerField(blank=True, null=True)
+    render_height = models.PositiveIntegerField(blank=True, null=True)
+    preview_image = models.ImageField(upload_to="photos/preview/", blank=True, null=True)
+    thumbnail = models.ImageField(upload_to="photos/thumbs/", blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["session", "created_at"])]
+        constraints = [
+            # Upload lại cùng một ảnh trong session → dùng lại Photo đã có (core/derivatives.py)
+            models.UniqueConstraint(
+                fields=["session", "content_hash"],
+                condition=~models.Q(content_hash=""),
+                name="unique_session_photo_content",
+            ),
+        ]
+
+    @property
+    def preview_url(self):
+        return (self.preview_image or self.image).url
+
+    @property
+    def thumbnail_url(self):
+        return (self.thumbnail or self.preview_image or self.image).url
 
 class PhotoSlot(models.Model):
     """Quản lý ảnh được gán vào từng slot của frame"""
@@ -46,6 +114,171 @@ class PhotoSlot(models.Model):
 class RenderedPhoto(models.Model):
     session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="renders")
     frame = models.ForeignKey(Frame, on_delete=models.SET_NULL, null=True)
-    image = models.ImageField(upload_to="renders/")
+    image = models.ImageField(upload_to="renders/")  # Bản in (master, 300 DPI)
+    # Bản nhỏ tạo từ cùng canvas (core/rendering.py): web cho khách tải qua QR, thumbnail cho danh sách
+    web_image = models.ImageField(upload_to="renders/web/", blank=True, null=True)
+    thumbnail = models.ImageField(upload_to="renders/thumbs/", blank=True, null=True)
     qr_code = models.ImageField(upload_to="qrcodes/", blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bản trên bucket (ghi lúc upload xong, đồng bộ lại bằng reconcile_renders)
+    remote_path = models.CharField(max_length=500, blank=True)
+    remote_url = models.URLField(max_length=500, blank=True)
+    uploaded_at = models.DateTimeField(null=True, blank=True)
+    # Fingerprint frame + ảnh (core/fingerprints.py) để không render lại bản trùng
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["session", "created_at"])]
+
+    @property
+    def web_file(self):
+        return self.web_image or self.image
+
+    @property
+    def web_url(self):
+        return self.web_file.url
+
+    @property
+    def thumbnail_url(self):
+        return (self.thumbnail or self.web_image or self.image).url
+
+class RenderJob(models.Model):
+    """Job ghép ảnh chạy nền (worker: manage.py renderworker)"""
+    STATUS_QUEUED = "queued"
+    STATUS_RENDERING = "rendering"
+    STATUS_UPLOADING = "uploading"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RENDERING, "Rendering"),
+        (STATUS_UPLOADING, "Uploading"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RENDERING, STATUS_UPLOADING)
+
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="render_jobs")
+    frame = models.ForeignKey(Frame, on_delete=models.SET_NULL, null=True)
+    photo_ids = models.JSONField(default=list)  # Photo id theo thứ tự slot, chốt lúc enqueue
+    fingerprint = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    rendered = models.ForeignKey(RenderedPhoto, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        constraints = [
+            # Mỗi session chỉ có một job đang chạy cho cùng fingerprint (gộp request trùng)
+            models.UniqueConstraint(
+                fields=["session", "fingerprint"],
+                condition=models.Q(status__in=["queued", "rendering", "uploading"]) & ~models.Q(fingerprint=""),
+                name="unique_active_render_fingerprint",
+            ),
+        ]
+
+    def __str__(self):
+        return f"RenderJob {self.id} ({self.status}) - Session {self.session.phone}"
+
+class PendingUpload(models.Model):
+    """Outbox upload lên bucket: ghi trước vào DB, worker upload + retry sau"""
+    STATUS_PENDING = "pending"
+    STATUS_UPLOADING = "uploading"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_UPLOADING, "Uploading"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    rendered = models.ForeignKey(RenderedPhoto, on_delete=models.CASCADE, related_name="uploads")
+    remote_path = models.CharField(max_length=500)
+    content_type = models.CharField(max_length=100, default="image/jpeg")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    public_url = models.URLField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"Upload {self.remote_path} ({self.status})"
+
+class PrintJob(models.Model):
+    """
+    Lệnh in một render (spooler: manage.py printspooler, xem core/printing.py).
+    Raster đúng kích thước/DPI/profile máy in được chuẩn bị trước (preparing →
+    ready) ngay khi render xong; bấm in chỉ còn gửi file sang máy in.
+    """
+    STATUS_PREPARING = "preparing"
+    STATUS_RASTERIZING = "rasterizing"
+    STATUS_READY = "ready"
+    STATUS_PRINTING = "printing"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PREPARING, "Preparing"),
+        (STATUS_RASTERIZING, "Rasterizing"),
+        (STATUS_READY, "Ready"),
+        (STATUS_PRINTING, "Printing"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    rendered = models.ForeignKey(RenderedPhoto, on_delete=models.CASCADE, related_name="print_jobs")
+    printer = models.CharField(max_length=100)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PREPARING, db_index=True)
+    raster = models.FileField(upload_to="prints/", blank=True)
+    copies = models.PositiveSmallIntegerField(default=1)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    requested_at = models.DateTimeField(null=True, blank=True)  # Khách bấm in
+    printed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"PrintJob {self.id} ({self.status}) - render {self.rendered_id}"
+
+
+class ChunkedUpload(models.Model):
+    """
+    Upload ảnh theo từng chunk (Content-Range), resume được khi rớt mạng
+    (xem core/chunked_uploads.py). id là upload id client giữ lại để resume.
+    """
+    STATUS_UPLOADING = "uploading"
+    STATUS_ASSEMBLING = "assembling"
+    STATUS_COMPLETE = "complete"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_UPLOADING, "Uploading"),
+        (STATUS_ASSEMBLING, "Assembling"),
+        (STATUS_COMPLETE, "Complete"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="chunked_uploads")
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)  # Số byte đã nhận liên tục từ đầu file
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_UPLOADING)
+    photo = models.ForeignKey(Photo, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"ChunkedUpload {self.filename} ({self.offset}/{self.size})"
@@ -0,0 +1,78 @@
+"""
+Ảnh xem thử (low-res) do server ghép bằng chính compose_frame, nên khớp
+100% với bản in. Kết quả cache theo version của frame + các PhotoSlot
+đang gán; key đó cũng là ETag để tablet không phải tải lại khi không đổi.
+"""
+import hashlib
+import json
+import math
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .fingerprints import frame_version
+from .metrics import span
+from .rendering import compose_frame
+
+PREVIEW_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+
+def preview_scales():
+    """Các scale được phép (mỗi scale là một bản trong preview cache + frame cache)."""
+    return sorted({settings.PREVIEW_SCALE, min(settings.PREVIEW_SCALE * 2, 1.0)})
+
+
+def quantize_scale(value):
+    """Scale client gửi lên → scale gần nhất trong preview_scales(); ValueError nếu không phải số hữu hạn."""
+    scale = float(value)
+    if not math.isfinite(scale):
+        raise ValueError(f"Invalid scale: {value}")
+    return min(preview_scales(), key=lambda allowed: abs(allowed - scale))
+
+
+def preview_key(frame, slot_photos, scale, fmt):
+    """Hash version frame (ảnh + layout) + ảnh gán vào từng slot + scale + format."""
+    parts = [
+        str(frame.pk),
+        str(frame_version(frame)),
+        json.dumps(frame.layout_json, sort_keys=True),
+        f"{scale:.4f}",
+        fmt,
+    ]
+    for idx, photo in enumerate(slot_photos):
+        # Theo nội dung: Photo trùng (cùng content hash) dùng chung preview đã cache
+        parts.append(f"{idx}:{photo.content_hash or photo.image.name}" if photo else f"{idx}:-")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:40]
+
+
+def slot_photos_for(session, frame):
+    """Danh sách Photo theo slot index (None = slot chưa gán)."""
+    slot_photos = [None] * frame.slot_count
+    for slot in session.slots.filter(frame=frame).select_related("photo"):
+        if 0 <= slot.slot_index < len(slot_photos):
+            slot_photos[slot.slot_index] = slot.photo
+    return slot_photos
+
+
+def render_preview(frame, slot_photos, scale, fmt):
+    pil_format, _ = PREVIEW_FORMATS[fmt]
+    with span("preview"):
+        canvas = compose_frame(slot_photos, frame, scale=scale)
+        buffer = BytesIO()
+        canvas.save(buffer, format=pil_format, quality=settings.PREVIEW_QUALITY)
+    return buffer.getvalue()
+
+
+def get_preview(frame, slot_photos, scale, fmt, key=None):
+    """Trả về bytes ảnh xem thử (từ cache nếu có)."""
+    key = key or preview_key(frame, slot_photos, scale, fmt)
+    cache_key = f"preview:{key}"
+    data = cache.get(cache_key)
+    if data is None:
+        data = render_preview(frame, slot_photos, scale, fmt)
+        cache.set(cache_key, data, settings.PREVIEW_CACHE_SECONDS)
+    return data
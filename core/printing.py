@@ -0,0 +1,235 @@
+"""
+In ảnh: chuẩn bị raster trước, gửi sang máy in qua backend cắm được.
+
+- prepare_print_job(rendered): tạo PrintJob (preparing) ngay khi render xong
+- spooler (manage.py printspooler) rasterize: xoay theo khổ giấy, resize đúng
+  PRINT_WIDTH_PX x PRINT_HEIGHT_PX, DPI, chuyển sang ICC profile của máy in
+- request_print(job): khách bấm in → raster đã sẵn thì gửi luôn, chưa sẵn thì
+  spooler in ngay sau khi rasterize xong
+
+Backend: "directory" (thả file vào hot folder của driver máy in, dùng để test)
+hoặc "cups" (lệnh lp).
+"""
+import logging
+import os
+import shutil
+import subprocess
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.utils import timezone
+from PIL import Image, ImageCms, ImageOps
+
+from .metrics import span
+from .models import PrintJob
+
+logger = logging.getLogger(__name__)
+
+
+class PrinterError(Exception):
+    pass
+
+
+# ====== BACKENDS ======
+class DirectoryPrinter:
+    """Ghi file vào thư mục (hot folder); mỗi bản in là một file."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @property
+    def name(self):
+        return f"directory:{self.directory}"
+
+    def send(self, path, copies=1, title=""):
+        os.makedirs(self.directory, exist_ok=True)
+        stem, ext = os.path.splitext(os.path.basename(path))
+        for copy in range(1, copies + 1):
+            target = os.path.join(self.directory, f"{title or stem}_{copy}{ext}")
+            tmp_path = os.path.join(self.directory, f".{os.path.basename(target)}.tmp")
+            shutil.copyfile(path, tmp_path)
+            # Rename nguyên tử: driver theo dõi thư mục không đọc phải file đang ghi dở
+            os.replace(tmp_path, target)
+
+
+class CupsPrinter:
+    """In qua CUPS (lệnh lp); raster đã đúng kích thước nên in 100% không scale."""
+
+    def __init__(self, printer, options=()):
+        self.printer = printer
+        self.options = list(options)
+
+    @property
+    def name(self):
+        return f"cups:{self.printer or 'default'}"
+
+    def send(self, path, copies=1, title=""):
+        command = ["lp", "-n", str(copies), "-o", "scaling=100"]
+        if self.printer:
+            command += ["-d", self.printer]
+        if title:
+            command += ["-t", title]
+        for option in self.options:
+            command += ["-o", option]
+        command.append(path)
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise PrinterError(f"lp failed: {e}") from e
+        if result.returncode != 0:
+            raise PrinterError(result.stderr.strip() or f"lp exited with {result.returncode}")
+
+
+def get_printer():
+    """Backend máy in theo PRINT_BACKEND = "directory" | "cups"."""
+    if settings.PRINT_BACKEND == "cups":
+        return CupsPrinter(settings.PRINT_CUPS_PRINTER, settings.PRINT_CUPS_OPTIONS)
+    return DirectoryPrinter(settings.PRINT_DIRECTORY)
+
+
+# ====== RASTER ======
+def rasterize_image(img):
+    """Ảnh render → raster in: đúng khổ giấy (xoay nếu lệch hướng), đúng pixel, profile máy in."""
+    width, height = settings.PRINT_WIDTH_PX, settings.PRINT_HEIGHT_PX
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    if (img.width > img.height) != (width > height):
+        img = img.transpose(Image.Transpose.ROTATE_90)
+    # Giữ nguyên toàn bộ ảnh (không crop), phần dư để trắng
+    img = ImageOps.pad(img, (width, height), Image.Resampling.LANCZOS, color=(255, 255, 255))
+
+    icc_profile = None
+    if settings.PRINT_ICC_PROFILE:
+        printer_profile = ImageCms.getOpenProfile(settings.PRINT_ICC_PROFILE)
+        img = ImageCms.profileToProfile(
+            img, ImageCms.createProfile("sRGB"), printer_profile,
+            renderingIntent=ImageCms.Intent.PERCEPTUAL, outputMode="RGB",
+        )
+        icc_profile = printer_profile.tobytes()
+    return img, icc_profile
+
+
+def rasterize(job):
+    """Tạo file raster cho job từ ảnh render."""
+    with span("print_raster"):
+        with Image.open(job.rendered.image.path) as src:
+            img, icc_profile = rasterize_image(src)
+        buffer = BytesIO()
+        dpi = (settings.PRINT_DPI, settings.PRINT_DPI)
+        img.save(buffer, format="JPEG", quality=settings.PRINT_JPEG_QUALITY, dpi=dpi, icc_profile=icc_profile)
+        job.raster.save(f"print_{job.rendered_id}_{job.id}.jpg", ContentFile(buffer.getvalue()), save=False)
+    job.status = PrintJob.STATUS_READY
+    job.error = ""
+    job.save(update_fields=["raster", "status", "error", "updated_at"])
+
+
+# ====== JOB ======
+def prepare_print_job(rendered):
+    """PrintJob chờ rasterize cho render (mỗi render/máy in chỉ một job chưa in)."""
+    printer = get_printer().name
+    job = rendered.print_jobs.filter(
+        printer=printer,
+        status__in=[PrintJob.STATUS_PREPARING, PrintJob.STATUS_RASTERIZING, PrintJob.STATUS_READY],
+    ).first()
+    if job is not None:
+        return job
+    # In lại: dùng lại raster của lần in trước (cùng render, cùng máy in)
+    previous = rendered.print_jobs.filter(printer=printer).exclude(raster="").order_by("-created_at").first()
+    if previous is not None and previous.raster.storage.exists(previous.raster.name):
+        return PrintJob.objects.create(
+            rendered=rendered, printer=printer, raster=previous.raster.name, status=PrintJob.STATUS_READY,
+        )
+    return PrintJob.objects.create(rendered=rendered, printer=printer)
+
+
+def _claim(job, from_status, to_status):
+    claimed = PrintJob.objects.filter(pk=job.pk, status=from_status).update(
+        status=to_status, updated_at=timezone.now(),
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def send_job(job):
+    """Gửi raster sang máy in (job đã được claim sang printing)."""
+    try:
+        with span("print_send"):
+            get_printer().send(job.raster.path, copies=job.copies, title=f"photobooth_{job.rendered_id}_{job.id}")
+    except Exception as e:
+        logger.exception("Print job %s failed", job.id)
+        job.status = PrintJob.STATUS_FAILED
+        job.error = str(e)
+        job.save(update_fields=["status", "error", "updated_at"])
+        return False
+    job.status = PrintJob.STATUS_DONE
+    job.printed_at = timezone.now()
+    job.save(update_fields=["status", "printed_at", "updated_at"])
+    logger.info("Print job %s sent to %s", job.id, job.printer)
+    return True
+
+
+def _rasterize_claimed(job):
+    try:
+        rasterize(job)
+    except Exception as e:
+        logger.exception("Rasterize failed for print job %s", job.id)
+        job.status = PrintJob.STATUS_FAILED
+        job.error = str(e)
+        job.save(update_fields=["status", "error", "updated_at"])
+        return False
+    return True
+
+
+def request_print(job):
+    """
+    Khách bấm in. Raster sẵn → gửi ngay. Chưa có ai rasterize → làm luôn
+    trong request. Spooler đang rasterize → nó sẽ in ngay khi xong.
+    """
+    if job.requested_at is None:
+        job.requested_at = timezone.now()
+        PrintJob.objects.filter(pk=job.pk).update(requested_at=job.requested_at)
+
+    if _claim(job, PrintJob.STATUS_PREPARING, PrintJob.STATUS_RASTERIZING):
+        if not _rasterize_claimed(job):
+            return job
+    if _claim(job, PrintJob.STATUS_READY, PrintJob.STATUS_PRINTING):
+        send_job(job)
+    job.refresh_from_db()
+    return job
+
+
+def spool_once():
+    """Rasterize các job đang chờ; job nào khách đã bấm in thì gửi luôn. Trả về số job đã xử lý."""
+    handled = 0
+    for job in PrintJob.objects.filter(status=PrintJob.STATUS_PREPARING).select_related("rendered"):
+        if not _claim(job, PrintJob.STATUS_PREPARING, PrintJob.STATUS_RASTERIZING):
+            continue
+        handled += 1
+        if not _rasterize_claimed(job):
+            continue
+        # Đọc lại requested_at sau khi đã chuyển sang ready (khách có thể vừa bấm in)
+        job.refresh_from_db()
+        if job.requested_at and _claim(job, PrintJob.STATUS_READY, PrintJob.STATUS_PRINTING):
+            send_job(job)
+    return handled
+
+
+def requeue_stale_rasterizing(older_than=timedelta(minutes=5)):
+    """Job kẹt ở rasterizing (spooler chết giữa chừng) → preparing. Job printing thì không
+    tự in lại để tránh in trùng."""
+    return PrintJob.objects.filter(
+        status=PrintJob.STATUS_RASTERIZING,
+        updated_at__lt=timezone.now() - older_than,
+    ).update(status=PrintJob.STATUS_PREPARING)
+
+
+def spool_forever(poll_interval=1.0, stop=None):
+    requeue_stale_rasterizing()
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        if not spool_once():
+            time.sleep(poll_interval)
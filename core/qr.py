@@ -0,0 +1,77 @@
+"""
+QR code service.
+
+Mã QR chỉ phụ thuộc vào URL + style, nên kết quả được memoize (LRU giới hạn)
+và file PNG lưu theo kiểu content-addressed: cùng URL + style → cùng một file
+qrcodes/<hash>.png, dùng chung giữa các render.
+"""
+import hashlib
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .metrics import span
+
+QR_CACHE_SIZE = 256
+
+ERROR_CORRECTION = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+
+def _build(url, box_size, border, error_correction, image_factory=None):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=ERROR_CORRECTION[error_correction],
+        box_size=box_size,
+        border=border,
+        image_factory=image_factory,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+    return qr
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def qr_png_bytes(url, box_size=10, border=4, error_correction="L", fill_color="black", back_color="white"):
+    """PNG bytes của mã QR (dùng cho in / file QR của render)."""
+    img = _build(url, box_size, border, error_correction).make_image(fill_color=fill_color, back_color=back_color)
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def qr_svg(url, border=4, error_correction="L"):
+    """SVG (chuỗi) của mã QR để nhúng thẳng vào trang HTML."""
+    qr = _build(url, 10, border, error_correction, image_factory=qrcode.image.svg.SvgPathImage)
+    return qr.make_image().to_string(encoding="unicode")
+
+
+# ====== QR CODE GENERATION FUNCTION ======
+def generate_qr_code(url):
+    """Tạo mã QR từ URL và trả về BytesIO object"""
+    return BytesIO(qr_png_bytes(url))
+
+
+def qr_file(url, **style):
+    """
+    Lưu PNG mã QR theo content address, trả về tên file trong storage.
+    Cùng URL + style → cùng một file, không tạo lại nếu đã tồn tại.
+    """
+    key = "\n".join([url, *(f"{k}={v}" for k, v in sorted(style.items()))])
+    name = f"qrcodes/{hashlib.sha256(key.encode()).hexdigest()[:32]}.png"
+    with span("qr"):
+        if not default_storage.exists(name):
+            saved = default_storage.save(name, ContentFile(qr_png_bytes(url, **style)))
+            if saved != name:
+                # Process khác vừa ghi cùng file (cùng nội dung): bỏ bản trùng
+                default_storage.delete(saved)
+    return name
@@ -0,0 +1,319 @@
+"""
+Nơi lưu ảnh render cho khách tải (object store), chọn bằng UPLOAD_BACKEND:
+
+- "firebase": Firebase Storage (app Firebase khởi tạo lúc dùng lần đầu, không
+  còn chạy trong settings.py)
+- "local": thư mục trên đĩa + URL tĩnh; trỏ UPLOAD_LOCAL_DIR vào thư mục share
+  của server LAN ở venue (UPLOAD_LOCAL_URL = địa chỉ web của server đó) để
+  dùng làm object store khi đường internet bị nghẽn
+- "memory": dict trong process, cho test / load test (có thể giả lập độ trễ)
+
+Mọi backend có cùng interface: upload, list, public_url, exists, delete, và
+bản bulk (upload_many, delete_many) / async (upload_async) chạy trên thread
+pool dùng chung.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def render_remote_path(session_phone, file_name):
+    """Path trên bucket: renders/session_{phone}/{file_name}"""
+    return f"renders/session_{session_phone}/{file_name}"
+
+
+class StorageError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredObject:
+    name: str
+    size: int
+    created_at: datetime
+    url: str
+
+
+class RemoteStorage:
+    """Interface chung; lớp con cài đặt upload/list/public_url/exists/delete."""
+
+    name = "base"
+
+    def upload(self, name, path, content_type=None):
+        """Upload file local `path` thành object `name`, trả về URL công khai."""
+        raise NotImplementedError
+
+    def list(self, prefix=""):
+        """Các StoredObject có tên bắt đầu bằng prefix."""
+        raise NotImplementedError
+
+    def public_url(self, name):
+        raise NotImplementedError
+
+    def exists(self, name):
+        raise NotImplementedError
+
+    def delete(self, name):
+        """Xóa object; không lỗi nếu không tồn tại."""
+        raise NotImplementedError
+
+    # ---- bulk / async (mặc định: chạy trên thread pool dùng chung) ----
+
+    def upload_async(self, name, path, content_type=None):
+        """Future trả về URL công khai."""
+        return get_storage_executor().submit(self.upload, name, path, content_type)
+
+    def upload_many(self, items):
+        """
+        items: list (name, path, content_type). Trả về dict name → URL hoặc
+        exception (lỗi một file không chặn các file khác).
+        """
+        futures = {name: self.upload_async(name, path, content_type) for name, path, content_type in items}
+        return {name: _result_or_error(future) for name, future in futures.items()}
+
+    def delete_many(self, names):
+        """Xóa nhiều object; trả về dict name → None hoặc exception."""
+        futures = {name: get_storage_executor().submit(self.delete, name) for name in names}
+        return {name: _result_or_error(future) for name, future in futures.items()}
+
+
+def _result_or_error(future):
+    try:
+        return future.result()
+    except Exception as e:
+        return e
+
+
+# ====== FIREBASE ======
+_firebase_lock = threading.Lock()
+
+# Số request tối đa trong một batch request của Cloud Storage JSON API
+FIREBASE_BATCH_SIZE = 100
+
+
+def _firebase_app():
+    """Khởi tạo app Firebase (một lần mỗi process) từ FIREBASE_CREDENTIALS_PATH."""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _firebase_lock:
+        try:
+            return firebase_admin.get_app()
+        except ValueError:
+            pass
+        key_path = Path(settings.FIREBASE_CREDENTIALS_PATH)
+        if not key_path.exists():
+            raise StorageError(f"Firebase key not found at {key_path}")
+        app = firebase_admin.initialize_app(
+            credentials.Certificate(str(key_path)),
+            {"storageBucket": settings.FIREBASE_STORAGE_BUCKET},
+        )
+        logger.info("Firebase initialized (bucket %s)", settings.FIREBASE_STORAGE_BUCKET)
+        return app
+
+
+class FirebaseStorage(RemoteStorage):
+    name = "firebase"
+
+    def __init__(self):
+        from firebase_admin import storage
+
+        self.bucket = storage.bucket(app=_firebase_app())
+
+    def upload(self, name, path, content_type=None):
+        blob = self.bucket.blob(name)
+        blob.upload_from_filename(path, content_type=content_type)
+        blob.make_public()
+        return blob.public_url
+
+    def list(self, prefix=""):
+        return [
+            StoredObject(name=blob.name, size=blob.size or 0, created_at=blob.time_created, url=blob.public_url)
+            for blob in self.bucket.list_blobs(prefix=prefix)
+        ]
+
+    def public_url(self, name):
+        blob = self.bucket.blob(name)
+        blob.make_public()
+        return blob.public_url
+
+    def exists(self, name):
+        return self.bucket.blob(name).exists()
+
+    def delete(self, name):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.blob(name).delete()
+        except NotFound:
+            pass
+
+    def delete_many(self, names):
+        # Batch request của JSON API: một HTTP request cho mỗi FIREBASE_BATCH_SIZE object.
+        # 404 coi như đã xóa (giống delete); lỗi ghi theo từng object, không dừng cả lượt
+        names = list(names)
+        results = {}
+        for start in range(0, len(names), FIREBASE_BATCH_SIZE):
+            chunk = names[start:start + FIREBASE_BATCH_SIZE]
+            try:
+                with self.bucket.client.batch(raise_exception=False) as batch:
+                    for name in chunk:
+                        self.bucket.blob(name).delete()
+            except Exception as e:
+                results.update((name, e) for name in chunk)
+                continue
+            for name, response in zip(chunk, batch._responses):
+                if 200 <= response.status_code < 300 or response.status_code == 404:
+                    results[name] = None
+                else:
+                    results[name] = StorageError(f"Could not delete {name}: HTTP {response.status_code}")
+        return results
+
+
+# ====== LOCAL (thư mục + URL tĩnh) ======
+class LocalStorage(RemoteStorage):
+    """Lưu file trong thư mục (local hoặc share của server LAN), phục vụ qua base_url."""
+
+    name = "local"
+
+    def __init__(self, root, base_url):
+        self.root = Path(root)
+        self.base_url = base_url
+
+    def _path(self, name):
+        path = (self.root / name).resolve()
+        if not path.is_relative_to(self.root.resolve()):
+            raise StorageError(f"Invalid object name: {name}")
+        return path
+
+    def upload(self, name, path, content_type=None):
+        target = self._path(name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}")
+        shutil.copyfile(path, tmp_path)
+        # Rename nguyên tử: người tải không bao giờ thấy file ghi dở
+        os.replace(tmp_path, target)
+        return self.public_url(name)
+
+    def list(self, prefix=""):
+        base = self.root / prefix
+        directory = base if not prefix or prefix.endswith("/") else base.parent
+        if not directory.is_dir():
+            return []
+        objects = []
+        for path in sorted(directory.rglob("*")):
+            name = path.relative_to(self.root).as_posix()
+            if path.is_file() and name.startswith(prefix) and not path.name.startswith("."):
+                stat = path.stat()
+                objects.append(StoredObject(
+                    name=name,
+                    size=stat.st_size,
+                    created_at=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+                    url=self.public_url(name),
+                ))
+        return objects
+
+    def public_url(self, name):
+        return self.base_url + quote(name)
+
+    def exists(self, name):
+        return self._path(name).is_file()
+
+    def delete(self, name):
+        try:
+            self._path(name).unlink()
+        except FileNotFoundError:
+            pass
+
+
+# ====== MEMORY (test / load test) ======
+class MemoryStorage(RemoteStorage):
+    """Object store trong RAM của process; latency (giây) giả lập thời gian mạng mỗi lần upload."""
+
+    name = "memory"
+
+    def __init__(self, base_url="memory://", latency=0.0):
+        self.base_url = base_url
+        self.latency = latency
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def upload(self, name, path, content_type=None):
+        with open(path, "rb") as f:
+            data = f.read()
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self._objects[name] = (data, content_type, datetime.now(timezone.utc))
+        return self.public_url(name)
+
+    def read(self, name):
+        with self._lock:
+            return self._objects[name][0]
+
+    def list(self, prefix=""):
+        with self._lock:
+            items = sorted((name, obj) for name, obj in self._objects.items() if name.startswith(prefix))
+        return [
+            StoredObject(name=name, size=len(data), created_at=created_at, url=self.public_url(name))
+            for name, (data, _, created_at) in items
+        ]
+
+    def public_url(self, name):
+        return self.base_url + quote(name)
+
+    def exists(self, name):
+        with self._lock:
+            return name in self._objects
+
+    def delete(self, name):
+        with self._lock:
+            self._objects.pop(name, None)
+
+
+# ====== CHỌN BACKEND ======
+_storage = None
+_storage_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def create_storage(backend=None):
+    backend = backend or settings.UPLOAD_BACKEND
+    if backend == "local":
+        return LocalStorage(settings.UPLOAD_LOCAL_DIR, settings.UPLOAD_LOCAL_URL)
+    if backend == "memory":
+        return MemoryStorage(latency=settings.UPLOAD_MEMORY_LATENCY_MS / 1000)
+    if backend == "firebase":
+        return FirebaseStorage()
+    raise StorageError(f"Unknown UPLOAD_BACKEND: {backend}")
+
+
+def get_storage():
+    """Backend dùng chung cho cả process (một client, tái sử dụng kết nối)."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+
+def get_storage_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_WORKERS, thread_name_prefix="storage")
+    return _executor
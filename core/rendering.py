@@ -0,0 +1,307 @@
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageOps
+from pillow_heif import register_heif_opener
+
+from .frame_cache import get_prepared_frame
+from .layouts import center_crop_box
+from .metrics import render_in_progress, span
+
+logger = logging.getLogger(__name__)
+
+# Đăng ký hỗ trợ HEIC/HEIF
+register_heif_opener()
+
+ORIENTATION_TAG = 0x0112
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+# Giống Image.thumbnail(): ảnh trước LANCZOS phải lớn gấp >= 2 lần đích
+REDUCING_GAP = 2.0
+
+# Định dạng bản web: PIL format, đuôi file, content type
+WEB_FORMATS = {
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+}
+
+
+def photo_source_path(photo, slot_w, slot_h):
+    """
+    Dùng bản render-ready (đã xoay EXIF, đã thu nhỏ) nếu nó vẫn đủ lớn để
+    crop ra slot_w x slot_h; nếu không thì quay về ảnh gốc.
+    """
+    if photo.render_image and photo.render_width and photo.render_height:
+        left, top, right, bottom = center_crop_box(photo.render_width, photo.render_height, slot_w, slot_h)
+        if right - left >= slot_w and bottom - top >= slot_h:
+            return photo.render_image.path
+    return photo.image.path
+
+
+def _decode_plan(src, slot_w, slot_h):
+    """
+    Kích thước ảnh sau khi xoay EXIF, vùng crop, và kích thước yêu cầu cho
+    draft mode (JPEG) hoặc None; chỉ đọc header.
+    """
+    raw_w, raw_h = src.size
+    orientation = src.getexif().get(ORIENTATION_TAG, 1)
+    # Kích thước sau khi xoay theo EXIF
+    img_w, img_h = (raw_h, raw_w) if orientation in ROTATED_ORIENTATIONS else (raw_w, raw_h)
+    box = center_crop_box(img_w, img_h, slot_w, slot_h)
+
+    draft_size = None
+    if src.format == "JPEG":
+        left, top, right, bottom = box
+        scale = min((right - left) / (slot_w * REDUCING_GAP), (bottom - top) / (slot_h * REDUCING_GAP))
+        if scale >= 2:
+            draft_size = (math.ceil(raw_w / scale), math.ceil(raw_h / scale))
+    return img_w, img_h, box, draft_size
+
+
+def load_slot_image(img_path, slot_w, slot_h):
+    """
+    Decode ảnh ở scale nhỏ nhất còn đủ nét cho slot, rồi crop center +
+    LANCZOS resize về đúng slot_w x slot_h.
+
+    JPEG: dùng draft mode (decoder scale 1/2, 1/4, 1/8). Định dạng khác:
+    reducing_gap (Image.reduce trước khi LANCZOS). Ảnh decode luôn lớn hơn
+    vùng crop cần thiết ít nhất REDUCING_GAP lần; so với decode đủ + LANCZOS
+    khác biệt nhỏ hơn mắt thấy được (đo được ~54 dB PSNR với JPEG draft,
+    ~56 dB với reduce; core/tests/test_slot_decode.py giữ ngưỡng 52 dB).
+    """
+    with span("decode"), Image.open(img_path) as src:
+        img_w, img_h, (left, top, right, bottom), draft_size = _decode_plan(src, slot_w, slot_h)
+        if draft_size:
+            src.draft("RGB", draft_size)
+        img = ImageOps.exif_transpose(src).convert("RGB")
+
+    # Quy đổi vùng crop sang toạ độ ảnh đã decode (có thể đã bị draft thu nhỏ)
+    sx = img.width / img_w
+    sy = img.height / img_h
+    box = (left * sx, top * sy, right * sx, bottom * sy)
+    with span("resize"):
+        return img.resize((slot_w, slot_h), Image.Resampling.LANCZOS, box=box, reducing_gap=REDUCING_GAP)
+
+
+def _scaled(value, scale):
+    return int(round(value * scale))
+
+
+# ====== THREAD POOL CHUẨN BỊ SLOT ======
+# Pillow nhả GIL khi decode/resample nên các slot chuẩn bị song song được;
+# pool dùng chung cho cả process (render, preview, benchmark)
+_slot_executors = {}
+_slot_executor_lock = threading.Lock()
+
+
+def get_slot_executor(threads=None):
+    """Thread pool chuẩn bị slot (mặc định RENDER_SLOT_THREADS); None nếu threads <= 1 (chạy tuần tự)."""
+    if threads is None:
+        threads = settings.RENDER_SLOT_THREADS
+    if threads <= 1:
+        return None
+    executor = _slot_executors.get(threads)
+    if executor is None:
+        with _slot_executor_lock:
+            executor = _slot_executors.get(threads)
+            if executor is None:
+                executor = _slot_executors[threads] = ThreadPoolExecutor(
+                    max_workers=threads, thread_name_prefix="slot",
+                )
+    return executor
+
+
+def _slot_geometry(slot, scale):
+    """Vị trí/kích thước slot theo scale (giữ mép slot khớp với canvas)."""
+    x = _scaled(slot.x, scale)
+    y = _scaled(slot.y, scale)
+    slot_w = max(1, _scaled(slot.x + slot.w, scale) - x)
+    slot_h = max(1, _scaled(slot.y + slot.h, scale) - y)
+    return x, y, slot_w, slot_h
+
+
+def prepare_slot(photo, slot, scale=1.0):
+    """Decode (scale nhỏ nhất đủ dùng), crop center, resize đúng slot; trả về (x, y, ảnh)."""
+    x, y, slot_w, slot_h = _slot_geometry(slot, scale)
+    img_path = photo_source_path(photo, slot_w, slot_h)
+    return x, y, load_slot_image(img_path, slot_w, slot_h)
+
+
+# ====== NGÂN SÁCH RAM ======
+class MemoryBudget:
+    """
+    Giới hạn tổng RAM ước lượng của các render chạy đồng thời trong process.
+    Render vượt ngân sách chờ tới khi đủ chỗ; render lớn hơn cả ngân sách
+    vẫn chạy được khi không còn render nào khác.
+    """
+
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.reserved = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes):
+        with self._cond:
+            if self.limit_bytes:
+                self.waiting += 1
+                try:
+                    while self.reserved and self.reserved + nbytes > self.limit_bytes:
+                        self._cond.wait()
+                finally:
+                    self.waiting -= 1
+            self.reserved += nbytes
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.reserved -= nbytes
+                self._cond.notify_all()
+
+
+_render_budget = None
+_render_budget_lock = threading.Lock()
+
+
+def get_render_budget():
+    global _render_budget
+    if _render_budget is None:
+        with _render_budget_lock:
+            if _render_budget is None:
+                _render_budget = MemoryBudget(settings.RENDER_MEMORY_BUDGET_BYTES)
+    return _render_budget
+
+
+def _decoded_bytes(img_path, slot_w, slot_h):
+    """RAM đỉnh khi chuẩn bị một slot: ảnh decode (+ bản xoay EXIF/convert) + ảnh đã resize."""
+    with Image.open(img_path) as src:
+        raw_w, raw_h = src.size
+        _, _, _, draft_size = _decode_plan(src, slot_w, slot_h)
+    if draft_size:
+        # Decoder JPEG thu nhỏ theo 1/2, 1/4, 1/8 mà vẫn >= kích thước yêu cầu
+        reduction = 1
+        while reduction < 8 and raw_w // (reduction * 2) >= draft_size[0] and raw_h // (reduction * 2) >= draft_size[1]:
+            reduction *= 2
+        raw_w, raw_h = math.ceil(raw_w / reduction), math.ceil(raw_h / reduction)
+    return 2 * raw_w * raw_h * 3 + slot_w * slot_h * 3
+
+
+def estimate_render_bytes(list_photos, frame_obj, scale=1.0):
+    """
+    Ước lượng RAM đỉnh (byte) của một lần ghép: canvas RGB + mọi slot chuẩn bị
+    song song + buffer encoder. Frame đã cache không tính (dùng chung).
+    """
+    layout = frame_obj.layout
+    canvas_bytes = _scaled(layout.width, scale) * _scaled(layout.height, scale) * 3
+    # + buffer encoder, + bản web/thumbnail (cạnh dài RENDER_WEB_MAX_EDGE)
+    web_edge = settings.RENDER_WEB_MAX_EDGE
+    total = canvas_bytes + canvas_bytes // 4 + min(canvas_bytes, web_edge * web_edge * 3)
+    for slot in layout.slots:
+        if slot.index >= len(list_photos) or list_photos[slot.index] is None:
+            continue
+        _, _, slot_w, slot_h = _slot_geometry(slot, scale)
+        img_path = photo_source_path(list_photos[slot.index], slot_w, slot_h)
+        try:
+            total += _decoded_bytes(img_path, slot_w, slot_h)
+        except OSError:
+            # File lỗi: để load_slot_image báo lỗi thật
+            total += slot_w * slot_h * 3
+    return total
+
+
+# ====== FUNCTION GHÉP FRAME ======
+def compose_frame(list_photos, frame_obj, scale=1.0, slot_threads=None):
+    """
+    Ghép ảnh vào frame, trả về canvas (PIL Image).
+
+    list_photos theo thứ tự slot; phần tử None = slot trống (dùng cho xem
+    thử khi chưa gán đủ ảnh). scale < 1 cho ra bản xem thử nhỏ với đúng
+    cùng bố cục như bản in. slot_threads: số thread chuẩn bị slot
+    (mặc định RENDER_SLOT_THREADS, <= 1: tuần tự).
+    """
+    layout = frame_obj.layout
+
+    # Canvas theo kích thước frame
+    canvas_w = _scaled(layout.width, scale)
+    canvas_h = _scaled(layout.height, scale)
+
+    # Bước 1 + 2: Canvas nền trắng đã paste frame (lấy từ cache, copy để vẽ)
+    with span("frame"):
+        canvas = get_prepared_frame(frame_obj, (canvas_w, canvas_h)).copy()
+
+    # Bước 3: Chuẩn bị các slot (song song nếu có pool), paste theo thứ tự slot
+    slots = [
+        slot for slot in layout.slots
+        if slot.index < len(list_photos) and list_photos[slot.index] is not None
+    ]
+    executor = get_slot_executor(slot_threads) if len(slots) > 1 else None
+    if executor is None:
+        prepared = (prepare_slot(list_photos[slot.index], slot, scale) for slot in slots)
+    else:
+        futures = [executor.submit(prepare_slot, list_photos[slot.index], slot, scale) for slot in slots]
+        prepared = (future.result() for future in futures)
+
+    for x, y, resized in prepared:
+        with span("composite"):
+            canvas.paste(resized, (x, y))
+
+    return canvas
+
+
+def web_format():
+    """(PIL format, đuôi file, content type) của bản web theo RENDER_WEB_FORMAT."""
+    return WEB_FORMATS.get(settings.RENDER_WEB_FORMAT, WEB_FORMATS["jpeg"])
+
+
+def _downscaled(img, max_edge):
+    """Thu nhỏ (không phóng to) để cạnh dài <= max_edge."""
+    ratio = max_edge / max(img.size)
+    if ratio >= 1:
+        return img
+    size = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+
+
+def write_variants(canvas, web_fp=None, thumb_fp=None):
+    """Bản web (RENDER_WEB_FORMAT) và thumbnail JPEG từ canvas đã ghép."""
+    if web_fp is None and thumb_fp is None:
+        return
+    with span("variants"):
+        web = _downscaled(canvas, settings.RENDER_WEB_MAX_EDGE)
+        if web_fp is not None:
+            pil_format = web_format()[0]
+            web.save(web_fp, format=pil_format, quality=settings.RENDER_WEB_QUALITY, optimize=pil_format == "JPEG")
+        if thumb_fp is not None:
+            # Từ bản web (đã nhỏ) thay vì từ canvas gốc
+            _downscaled(web, settings.RENDER_THUMBNAIL_SIZE).save(thumb_fp, format="JPEG", quality=80, optimize=True)
+
+
+def render_to_file(list_photos, frame_obj, fp, web_fp=None, thumb_fp=None, slot_threads=None):
+    """
+    Ghép ảnh và encode JPEG bản in thẳng vào file object fp (không giữ bản
+    JPEG trong RAM); web_fp / thumb_fp: thêm bản web và thumbnail từ cùng
+    canvas. Chờ nếu vượt RENDER_MEMORY_BUDGET_MB.
+    """
+    estimate = estimate_render_bytes(list_photos, frame_obj)
+    budget = get_render_budget()
+    with budget.reserve(estimate), render_in_progress(), span("render"):
+        logger.debug("Render reserved %.1f MB (in use %.1f MB)", estimate / 1e6, budget.reserved / 1e6)
+        canvas = compose_frame(list_photos, frame_obj, slot_threads=slot_threads)
+
+        # Bước 4: Xuất file JPG (canvas đã là RGB, không convert thêm bản nữa)
+        with span("encode"):
+            canvas.save(fp, format="JPEG", quality=95, dpi=(300, 300))
+        write_variants(canvas, web_fp, thumb_fp)
+
+
+def render_frame(list_photos, frame_obj):
+    buffer = BytesIO()
+    render_to_file(list_photos, frame_obj, buffer)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,372 @@
+"""
+Retention: giới hạn dung lượng media trên máy kiosk trong event nhiều ngày.
+
+- Theo tuổi: session không hoạt động quá Frame.retention_days ngày (trống thì
+  RETENTION_DAYS, 0 = giữ mãi) bị xóa cùng ảnh, render, QR, raster in và
+  object trên bucket
+- Theo dung lượng (bật bằng RETENTION_DISK_HIGH_WATER): ổ chứa MEDIA_ROOT dùng
+  quá HIGH_WATER % → xóa session cũ nhất cho tới khi xuống RETENTION_DISK_LOW_WATER %
+  (session của frame retention_days = 0 vẫn giữ)
+- Quét file mồ côi: file trong photos/ renders/ qrcodes/ prints/ thumbs/ không
+  còn bản ghi nào trỏ tới (xóa từ admin, delete_photo...) và cũ hơn thời gian
+  ân hạn; canvas trong frame cache trên đĩa của frame đã xóa / đã đổi ảnh
+
+Xóa theo batch, mỗi batch một transaction; file local + object trên bucket chỉ
+bị xóa sau khi commit (transaction.on_commit). File dùng chung (QR theo content
+address, raster in lại) chỉ bị xóa khi không còn bản ghi nào khác trỏ tới.
+
+Chạy bằng manage.py purge_media (--once) hoặc thread nền (RETENTION_THREAD).
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .chunked_uploads import part_path, purge_expired_uploads
+from .fingerprints import frame_version
+from .frame_cache import get_frame_cache
+from .models import ChunkedUpload, Frame, PendingUpload, Photo, PrintJob, RenderedPhoto, RenderJob, Session
+from .remote_storage import get_storage
+from .thumbnails import ADMIN_THUMB_SIZE, thumbnail_name
+
+logger = logging.getLogger(__name__)
+
+# Mọi FileField trỏ vào MEDIA_ROOT: dùng để biết file nào còn được tham chiếu
+MEDIA_FILE_FIELDS = {
+    Photo: ("image", "render_image", "preview_image", "thumbnail"),
+    RenderedPhoto: ("image", "web_image", "thumbnail", "qr_code"),
+    PrintJob: ("raster",),
+    Frame: ("image",),
+}
+
+# Thư mục trong MEDIA_ROOT được quét file mồ côi (frames/ và bucket/ thì không)
+SWEEP_DIRS = ("photos", "renders", "qrcodes", "prints", "thumbs")
+
+QUERY_CHUNK = 500
+
+
+@dataclass
+class PurgeStats:
+    sessions: int = 0
+    files: int = 0
+    remote_objects: int = 0
+    orphans: int = 0
+    expired_uploads: int = 0
+    errors: list = field(default_factory=list)
+
+    def add(self, other):
+        self.sessions += other.sessions
+        self.files += other.files
+        self.remote_objects += other.remote_objects
+        self.orphans += other.orphans
+        self.expired_uploads += other.expired_uploads
+        self.errors += other.errors
+
+
+def _chunks(items, size=QUERY_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _latest_created(model):
+    # Dùng index (session, created_at)
+    return Subquery(model.objects.filter(session=OuterRef("pk")).order_by("-created_at").values("created_at")[:1])
+
+
+def purgeable_sessions():
+    """
+    Session có thể xóa, annotate last_activity (lần cuối upload/render). Bỏ qua
+    session còn render/upload/in đang chạy.
+    """
+    busy_render = RenderJob.objects.filter(
+        session=OuterRef("pk"),
+        status__in=[RenderJob.STATUS_QUEUED, RenderJob.STATUS_RENDERING, RenderJob.STATUS_UPLOADING],
+    )
+    busy_upload = PendingUpload.objects.filter(rendered__session=OuterRef("pk"), status=PendingUpload.STATUS_UPLOADING)
+    busy_print = PrintJob.objects.filter(
+        rendered__session=OuterRef("pk"),
+        status__in=[PrintJob.STATUS_RASTERIZING, PrintJob.STATUS_PRINTING],
+    )
+    return (
+        Session.objects
+        .annotate(last_activity=Greatest(
+            "created_at",
+            Coalesce(_latest_created(Photo), "created_at"),
+            Coalesce(_latest_created(RenderedPhoto), "created_at"),
+        ))
+        .exclude(Exists(busy_render))
+        .exclude(Exists(busy_upload))
+        .exclude(Exists(busy_print))
+    )
+
+
+def expired_sessions(now=None):
+    """Session quá hạn giữ theo Frame.retention_days / RETENTION_DAYS, cũ nhất trước."""
+    now = now or timezone.now()
+    expired = Q(pk__in=[])
+    for days in Frame.objects.filter(retention_days__gt=0).values_list("retention_days", flat=True).distinct():
+        expired |= Q(selected_frame__retention_days=days, last_activity__lt=now - timedelta(days=days))
+    if settings.RETENTION_DAYS:
+        expired |= Q(selected_frame__retention_days__isnull=True, last_activity__lt=now - timedelta(days=settings.RETENTION_DAYS))
+    return purgeable_sessions().filter(expired).order_by("last_activity")
+
+
+def _media_files(session_ids):
+    names = set()
+    querysets = [
+        Photo.objects.filter(session_id__in=session_ids),
+        RenderedPhoto.objects.filter(session_id__in=session_ids),
+        PrintJob.objects.filter(rendered__session_id__in=session_ids),
+    ]
+    for queryset in querysets:
+        for row in queryset.values_list(*MEDIA_FILE_FIELDS[queryset.model]):
+            names.update(name for name in row if name)
+    return names
+
+
+def referenced_files(names):
+    """Trong `names`, các file vẫn còn bản ghi trỏ tới."""
+    referenced = set()
+    for chunk in _chunks(names):
+        for model, fields in MEDIA_FILE_FIELDS.items():
+            for field_name in fields:
+                referenced.update(
+                    model.objects.filter(**{f"{field_name}__in": chunk}).values_list(field_name, flat=True)
+                )
+    return referenced
+
+
+def _delete_media(names):
+    deleted = 0
+    for name in names:
+        try:
+            default_storage.delete(name)
+            deleted += 1
+        except OSError as e:
+            logger.warning("Could not delete media file %s: %s", name, e)
+    return deleted
+
+
+def _delete_remote(remote_paths, stats):
+    if not remote_paths:
+        return
+    try:
+        results = get_storage().delete_many(remote_paths)
+    except Exception as e:
+        logger.warning("Could not delete %d remote object(s): %s", len(remote_paths), e)
+        stats.errors.append(str(e))
+        return
+    for name, error in results.items():
+        if error is None:
+            stats.remote_objects += 1
+        else:
+            logger.warning("Could not delete remote object %s: %s", name, error)
+            stats.errors.append(f"{name}: {error}")
+
+
+def purge_sessions(session_ids):
+    """
+    Xóa các session (cascade photo/slot/render/job) trong một transaction; sau
+    khi commit mới xóa file local, file chunk dở dang và object trên bucket.
+    """
+    stats = PurgeStats()
+    session_ids = list(session_ids)
+    if not session_ids:
+        return stats
+
+    def remove_files(names, parts, remote_paths):
+        stats.files += _delete_media(names)
+        for path in parts:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        _delete_remote(remote_paths, stats)
+
+    with transaction.atomic():
+        names = _media_files(session_ids)
+        remote_paths = list(
+            RenderedPhoto.objects.filter(session_id__in=session_ids).exclude(remote_path="")
+            .values_list("remote_path", flat=True)
+        )
+        parts = [
+            part_path(upload) for upload in
+            ChunkedUpload.objects.filter(
+                session_id__in=session_ids,
+                status__in=[ChunkedUpload.STATUS_UPLOADING, ChunkedUpload.STATUS_ASSEMBLING],
+            ).only("id")
+        ]
+        Session.objects.filter(pk__in=session_ids).delete()
+        stats.sessions = len(session_ids)
+        # QR / raster dùng chung với session khác thì giữ lại
+        names -= referenced_files(names)
+        transaction.on_commit(lambda: remove_files(names, parts, remote_paths))
+    logger.info(
+        "Purged %d session(s): %d file(s), %d remote object(s)",
+        stats.sessions, stats.files, stats.remote_objects,
+    )
+    return stats
+
+
+def delete_photo(photo):
+    """Xóa một Photo; file gốc/phái sinh dùng chung (cùng content hash) thì giữ lại."""
+    names = {getattr(photo, name).name for name in MEDIA_FILE_FIELDS[Photo]} - {"", None}
+    with transaction.atomic():
+        photo.delete()
+        names -= referenced_files(names)
+        transaction.on_commit(lambda: _delete_media(names))
+
+
+def purge_expired(batch_size=None, now=None):
+    """Xóa session quá hạn theo từng batch."""
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    stats = PurgeStats()
+    while True:
+        ids = list(expired_sessions(now).values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            break
+        stats.add(purge_sessions(ids))
+        if len(ids) < batch_size:
+            break
+    return stats
+
+
+def disk_usage_percent(path=None):
+    path = str(path or settings.MEDIA_ROOT)
+    while not os.path.exists(path):
+        # MEDIA_ROOT chưa được tạo: đo ổ của thư mục cha
+        path = os.path.dirname(path)
+    usage = shutil.disk_usage(path)
+    return usage.used * 100 / usage.total
+
+
+def enforce_disk_high_water(batch_size=None, now=None):
+    """
+    Ổ đĩa quá RETENTION_DISK_HIGH_WATER % → xóa session cũ nhất (không hoạt
+    động ít nhất RETENTION_MIN_AGE_HOURS giờ) tới khi xuống RETENTION_DISK_LOW_WATER %.
+    Session của frame retention_days = 0 (giữ mãi) không bị xóa, chỉ log cảnh báo.
+    """
+    stats = PurgeStats()
+    high = settings.RETENTION_DISK_HIGH_WATER
+    if not high:
+        return stats
+    used = disk_usage_percent()
+    if used < high:
+        return stats
+
+    logger.warning("Media disk %.1f%% used (high-water %s%%), purging oldest sessions", used, high)
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    cutoff = (now or timezone.now()) - timedelta(hours=settings.RETENTION_MIN_AGE_HOURS)
+    while used > settings.RETENTION_DISK_LOW_WATER:
+        ids = list(
+            purgeable_sessions().filter(last_activity__lt=cutoff)
+            .exclude(selected_frame__retention_days=0)
+            .order_by("last_activity").values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            logger.warning(
+                "Media disk still %.1f%% used, no more sessions that may be purged "
+                "(recent or kept forever by retention_days = 0)", used,
+            )
+            break
+        stats.add(purge_sessions(ids))
+        used = disk_usage_percent()
+    return stats
+
+
+def sweep_orphans(grace=None):
+    """Xóa file trong SWEEP_DIRS không còn bản ghi nào trỏ tới (file mới hơn `grace` thì bỏ qua)."""
+    grace = grace if grace is not None else timedelta(hours=settings.RETENTION_ORPHAN_GRACE_HOURS)
+    # File vừa ghi có thể chưa có bản ghi (render lưu file trước rồi mới save model)
+    cutoff = time.time() - grace.total_seconds()
+    referenced = set()
+    for model, fields in MEDIA_FILE_FIELDS.items():
+        for row in model.objects.values_list(*fields).iterator(chunk_size=2000):
+            referenced.update(name for name in row if name)
+    # Thumbnail admin của frame (thumbs/admin/, core/thumbnails.py)
+    referenced.update(
+        thumbnail_name(name, ADMIN_THUMB_SIZE) for name in Frame.objects.values_list("image", flat=True) if name
+    )
+
+    orphans = []
+    for directory in SWEEP_DIRS:
+        root = os.path.join(settings.MEDIA_ROOT, directory)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, "/")
+                try:
+                    if name not in referenced and os.stat(path).st_mtime < cutoff:
+                        orphans.append(name)
+                except FileNotFoundError:
+                    pass
+    # Đọc lại DB ngay trước khi xóa: bỏ file vừa được gán trong lúc quét
+    orphans = set(orphans) - referenced_files(orphans)
+    deleted = _delete_media(orphans)
+    if deleted:
+        logger.info("Swept %d orphaned media file(s)", deleted)
+    return deleted + sweep_frame_cache()
+
+
+def sweep_frame_cache():
+    """Xóa canvas trên đĩa của frame đã xóa hoặc đã đổi file ảnh."""
+    live = set()
+    for frame in Frame.objects.only("id", "image"):
+        try:
+            live.add((frame.pk, frame_version(frame)))
+        except (OSError, ValueError):
+            pass
+    removed = get_frame_cache().prune(live)
+    if removed:
+        logger.info("Removed %d stale frame cache file(s)", removed)
+    return removed
+
+
+def purge_once(now=None):
+    """Một lượt retention đầy đủ: quá hạn → high-water → upload dở dang → file mồ côi."""
+    stats = PurgeStats()
+    stats.add(purge_expired(now=now))
+    stats.add(enforce_disk_high_water(now=now))
+    stats.expired_uploads = purge_expired_uploads()
+    stats.orphans = sweep_orphans()
+    return stats
+
+
+def purge_forever(interval=None, stop=None):
+    interval = interval or settings.RETENTION_INTERVAL_MINUTES * 60
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            purge_once()
+        except Exception:
+            logger.exception("Retention purge failed")
+        stop.wait(interval)
+
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def start_retention_thread():
+    """Thread nền chạy purge_once mỗi RETENTION_INTERVAL_MINUTES (một thread mỗi process)."""
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=purge_forever, name="retention", daemon=True)
+            _thread.start()
+            logger.info("Retention thread started (every %s min)", settings.RETENTION_INTERVAL_MINUTES)
+    return _thread
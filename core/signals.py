@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .frame_cache import invalidate_frame
+from .models import Frame
+from .thumbnails import build_thumbnail, delete_thumbnail
+
+
+@receiver(post_save, sender=Frame)
+@receiver(post_delete, sender=Frame)
+def drop_prepared_frame(sender, instance, **kwargs):
+    """Frame được sửa/xóa (vd. trong admin) → bỏ canvas đã cache."""
+    invalidate_frame(instance.pk)
+
+
+@receiver(post_save, sender=Frame)
+def build_frame_thumbnail(sender, instance, **kwargs):
+    """Thumbnail cho admin tạo lúc lưu frame, changelist chỉ đọc URL."""
+    build_thumbnail(instance.image)
+
+
+@receiver(post_delete, sender=Frame)
+def drop_frame_thumbnail(sender, instance, **kwargs):
+    delete_thumbnail(instance.image.name)
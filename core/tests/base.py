@@ -0,0 +1,116 @@
+"""Helper dùng chung cho test của app core."""
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from core import frame_cache, remote_storage
+from core.frame_cache import PreparedFrameCache
+from core.models import Frame, RenderedPhoto
+from core.remote_storage import MemoryStorage
+
+SLOTS = [{"x": 10, "y": 10, "w": 80, "h": 60}, {"x": 10, "y": 100, "w": 60, "h": 80}]
+
+
+def jpeg_bytes(seed=0, size=(160, 120)):
+    """JPEG nhỏ, nội dung khác nhau theo seed."""
+    buf = BytesIO()
+    Image.new("RGB", size, (seed * 37 % 256, seed * 91 % 256, 128)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def upload_file(seed=0, name="photo.jpg"):
+    return ContentFile(jpeg_bytes(seed), name=name)
+
+
+class FlakyStorage(MemoryStorage):
+    """MemoryStorage lỗi `failures` lần upload đầu tiên."""
+
+    def __init__(self, failures=0):
+        super().__init__(base_url="https://bucket.test/")
+        self.failures = failures
+
+    def upload(self, name, path, content_type=None):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("network down")
+        return super().upload(name, path, content_type)
+
+
+class MediaTestCase(TestCase):
+    """MEDIA_ROOT, cache frame, file chunk tạm và bucket riêng cho mỗi test."""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        self.media_root = os.path.join(tmp, "media")
+        overrides = override_settings(
+            MEDIA_ROOT=self.media_root,
+            FRAME_CACHE_DIR=os.path.join(tmp, "frames"),
+            CHUNKED_UPLOAD_DIR=os.path.join(tmp, "uploads"),
+            PRINT_DIRECTORY=os.path.join(tmp, "printer"),
+            PUBLIC_BASE_URL="http://kiosk.test",
+            UPLOAD_BACKEND="memory",
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.storage = FlakyStorage()
+        cache = PreparedFrameCache(max_bytes=1024 * 1024, cache_dir=os.path.join(tmp, "frames"), disk_max_bytes=1024 * 1024)
+        patches = [
+            mock.patch.object(remote_storage, "_storage", self.storage),
+            mock.patch.object(frame_cache, "_cache", cache),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.frame_cache = cache
+
+    def make_frame(self, **fields):
+        buf = BytesIO()
+        Image.new("RGBA", (100, 200), (200, 30, 30, 255)).save(buf, "PNG")
+        frame = Frame(name="Frame", layout_json={"w": 100, "h": 200, "slots": [dict(slot) for slot in SLOTS]}, **fields)
+        frame.image.save("frame.png", ContentFile(buf.getvalue()), save=False)
+        frame.save()
+        return frame
+
+    def make_render(self, session, name="render.jpg", **fields):
+        rendered = RenderedPhoto(session=session, **fields)
+        rendered.image.save(name, ContentFile(jpeg_bytes(9)), save=False)
+        rendered.save()
+        return rendered
+
+    def media_path(self, name):
+        return os.path.join(self.media_root, name)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migrate về `migrate_from`, tạo dữ liệu bằng model lịch sử rồi chạy `migrate_to`."""
+
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        super().setUp()
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes("core")
+        executor.migrate([("core", self.migrate_from)])
+        self.old_apps = executor.loader.project_state([("core", self.migrate_from)]).apps
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(self.latest)
+        super().tearDown()
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([("core", self.migrate_to)])
+        return executor.loader.project_state([("core", self.migrate_to)]).apps
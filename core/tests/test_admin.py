@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+
+from core.derivatives import create_photo
+from core.models import Frame, PrintJob, Session
+from core.tests.base import MediaTestCase, upload_file
+from core.thumbnails import thumbnail_name
+
+
+class AdminChangelistTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        self.frame = self.make_frame()
+        self.seed = 0
+
+    def add_rows(self, count):
+        for _ in range(count):
+            self.seed += 1
+            session = Session.objects.create(phone=f"09{self.seed:04d}")
+            create_photo(session, upload_file(self.seed))
+            rendered = self.make_render(session, frame=self.frame, thumbnail=f"renders/thumbs/{self.seed}.jpg")
+            PrintJob.objects.create(rendered=rendered, printer="directory:test")
+        self.make_frame()
+
+    def assertConstantQueries(self, url):
+        """Số query không tăng theo số dòng trên changelist."""
+        self.add_rows(1)
+        with CaptureQueriesContext(connection) as baseline:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_rows(4)
+        with self.assertNumQueries(len(baseline)):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_session_changelist(self):
+        self.assertConstantQueries("/admin/core/session/")
+        session = Session.objects.get(phone="090001")
+        response = self.client.get("/admin/core/session/", {"q": session.phone})
+        self.assertContains(response, '<td class="field-photo_count">1</td>', html=True)
+        self.assertContains(response, '<td class="field-render_count">1</td>', html=True)
+
+    def test_photo_changelist(self):
+        self.assertConstantQueries("/admin/core/photo/")
+
+    def test_rendered_changelist(self):
+        self.assertConstantQueries("/admin/core/renderedphoto/")
+
+    def test_printjob_changelist(self):
+        self.assertConstantQueries("/admin/core/printjob/")
+
+    def test_frame_changelist_uses_prebuilt_thumbnails(self):
+        self.add_rows(2)
+        with mock.patch("core.thumbnails._make_thumbnail") as make_thumbnail:
+            response = self.client.get("/admin/core/frame/")
+        make_thumbnail.assert_not_called()
+        for frame in Frame.objects.all():
+            self.assertContains(response, thumbnail_name(frame.image.name, 120))
@@ -0,0 +1,51 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from core.benchmarks import percentile, photo_file, run_benchmark, synthetic_photo, with_nonce
+from core.models import RenderedPhoto, Session
+from core.tests.base import MediaTestCase
+
+
+class BenchmarkHelperTests(SimpleTestCase):
+    def test_percentile(self):
+        values = [1.0, 2.0, 3.0, 4.0]
+        self.assertEqual(percentile(values, 50), 2.5)
+        self.assertEqual(percentile(values, 99), 3.97)
+        self.assertEqual(percentile([7.0], 95), 7.0)
+
+    def test_with_nonce_keeps_image_decodable(self):
+        img = synthetic_photo(64, 48)
+        for fmt, ext in (("JPEG", ".jpg"), ("PNG", ".png")):
+            buf = BytesIO()
+            img.save(buf, fmt)
+            first, second = with_nonce(buf.getvalue(), ext, "a"), with_nonce(buf.getvalue(), ext, "b")
+            self.assertNotEqual(hashlib.sha256(first).digest(), hashlib.sha256(second).digest())
+            decoded = Image.open(BytesIO(first))
+            decoded.load()
+            self.assertEqual(decoded.size, (64, 48))
+
+
+class RunBenchmarkTests(MediaTestCase):
+    def test_small_matrix(self):
+        data_dir = os.path.join(self.media_root, "bench")
+        report = run_benchmark(
+            data_dir=data_dir, frames=["300x450:png"], megapixels=[1], formats=["jpeg"],
+            orientations=["landscape"], iterations=2, warmup=0, trace_memory=False, log=lambda message: None,
+        )
+
+        case = "frame=300x450:png photo=jpeg-1mp-landscape"
+        self.assertEqual(
+            set(report["results"][case]), {"derivatives", "render_cold", "render", "finalize", "storage"},
+        )
+        # 2 lần đo × 4 slot, mỗi upload là ảnh mới (không trúng dedup)
+        self.assertEqual(report["results"][case]["derivatives"]["n"], 8)
+        self.assertEqual(report["results"][case]["render"]["n"], 2)
+        self.assertIn("estimated_mb", report["results"][case]["render"])
+        self.assertEqual(report["meta"]["iterations"], 2)
+        self.assertTrue(os.path.exists(photo_file(os.path.join(data_dir, "jpeg"), "jpeg", 1, "landscape")))
+        self.assertEqual(len(set(RenderedPhoto.objects.values_list("fingerprint", flat=True))), 1)
+        self.assertEqual(Session.objects.count(), 2)
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from django.test import override_settings
+from django.utils import timezone
+
+from core.chunked_uploads import ChunkError, part_path, purge_expired_uploads, start_upload, write_chunk
+from core.models import ChunkedUpload, Session
+from core.tests.base import MediaTestCase, jpeg_bytes
+
+
+@override_settings(UPLOAD_CHUNK_BYTES=1024 * 1024)
+class ChunkedUploadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = Session.objects.create(phone="0901")
+        self.data = jpeg_bytes(1)
+        self.size = len(self.data)
+        self.upload = start_upload(self.session, "photo.jpg", self.size)
+
+    def send(self, upload, start, end):
+        return write_chunk(upload, f"bytes {start}-{end}/{self.size}", BytesIO(self.data[start:end + 1]))
+
+    def test_offset_mismatch(self):
+        self.send(self.upload, 0, 99)
+        with self.assertRaises(ChunkError) as ctx:
+            self.send(self.upload, 200, 299)
+        self.assertEqual(ctx.exception.status, 409)
+        self.assertEqual(ChunkedUpload.objects.get(pk=self.upload.pk).offset, 100)
+
+    def test_duplicate_chunk(self):
+        stale = ChunkedUpload.objects.get(pk=self.upload.pk)
+        self.send(self.upload, 0, 99)
+        # Retry đã được xử lý rồi: offset đã qua → 409 kèm offset để gửi tiếp
+        with self.assertRaises(ChunkError) as ctx:
+            self.send(self.upload, 0, 99)
+        self.assertEqual(ctx.exception.status, 409)
+        # Hai request cùng chunk chạy song song: cả hai ghi, offset chỉ tăng một lần
+        upload = self.send(stale, 0, 99)
+        self.assertEqual(upload.offset, 100)
+        with open(part_path(upload), "rb") as f:
+            self.assertEqual(f.read(), self.data[:100])
+
+    def test_short_body_keeps_offset(self):
+        with self.assertRaises(ChunkError) as ctx:
+            write_chunk(self.upload, f"bytes 0-99/{self.size}", BytesIO(self.data[:50]))
+        self.assertEqual(ctx.exception.status, 400)
+        self.assertEqual(ChunkedUpload.objects.get(pk=self.upload.pk).offset, 0)
+
+    def test_expired(self):
+        self.send(self.upload, 0, 99)
+        ChunkedUpload.objects.filter(pk=self.upload.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(purge_expired_uploads(), 1)
+        self.assertFalse(os.path.exists(part_path(self.upload)))
+        with self.assertRaises(ChunkError) as ctx:
+            self.send(self.upload, 100, 199)
+        self.assertEqual(ctx.exception.status, 410)
+
+    def test_finish(self):
+        middle = self.size // 2
+        self.send(self.upload, 0, middle - 1)
+        upload = self.send(self.upload, middle, self.size - 1)
+
+        self.assertEqual(upload.status, ChunkedUpload.STATUS_COMPLETE)
+        self.assertFalse(os.path.exists(part_path(upload)))
+        photo = upload.photo
+        self.assertEqual(photo.session, self.session)
+        self.assertEqual(photo.content_hash, hashlib.sha256(self.data).hexdigest())
+        with photo.image.open("rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertTrue(photo.thumbnail)
+        # Upload đã kết thúc không nhận thêm chunk
+        with self.assertRaises(ChunkError) as ctx:
+            self.send(upload, 0, 99)
+        self.assertEqual(ctx.exception.status, 409)
+
+
+
+@override_settings(UPLOAD_CHUNK_BYTES=1024 * 1024, UPLOAD_MAX_FILE_BYTES=10 * 1024 * 1024)
+class ChunkedUploadViewTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        Session.objects.create(phone="0911")
+        self.data = jpeg_bytes(2)
+        self.size = len(self.data)
+
+    def start(self, **payload):
+        return self.client.post("/session/0911/uploads/", json.dumps(payload), content_type="application/json")
+
+    def put(self, upload_id, start, end):
+        return self.client.put(
+            f"/session/0911/uploads/{upload_id}/", self.data[start:end + 1],
+            content_type="application/octet-stream", headers={"Content-Range": f"bytes {start}-{end}/{self.size}"},
+        )
+
+    def test_resume_after_mismatch(self):
+        response = self.start(filename="a.jpg", size=self.size)
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.json()["upload_id"]
+
+        self.assertEqual(self.put(upload_id, 0, 99).json()["offset"], 100)
+        # Client tưởng chunk 100-199 đã gửi → 409 kèm offset server giữ
+        conflict = self.put(upload_id, 200, self.size - 1)
+        self.assertEqual(conflict.status_code, 409)
+        self.assertEqual(conflict.json()["offset"], 100)
+        self.assertEqual(self.client.get(f"/session/0911/uploads/{upload_id}/").json()["offset"], 100)
+
+        done = self.put(upload_id, 100, self.size - 1).json()
+        self.assertEqual(done["status"], ChunkedUpload.STATUS_COMPLETE)
+        self.assertIn("photo", done)
+
+    def test_rejects_bad_start(self):
+        self.assertEqual(self.start(filename="a.jpg", size=0).status_code, 400)
+        self.assertEqual(self.start(filename="a.jpg", size=11 * 1024 * 1024).status_code, 413)
+        bad_json = self.client.post("/session/0911/uploads/", "nope", content_type="application/json")
+        self.assertEqual(bad_json.status_code, 400)
+
+    def test_rejects_bad_content_range(self):
+        upload_id = self.start(filename="a.jpg", size=self.size).json()["upload_id"]
+        response = self.client.put(
+            f"/session/0911/uploads/{upload_id}/", b"x", content_type="application/octet-stream",
+            headers={"Content-Range": "bytes 0-0/5"},
+        )
+        self.assertEqual(response.status_code, 400)
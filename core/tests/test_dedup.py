@@ -0,0 +1,87 @@
+import hashlib
+import os
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+
+from core.derivatives import create_photo
+from core.models import Photo, Session
+from core.tests.base import SLOTS, MediaTestCase, MigrationTestCase, jpeg_bytes, upload_file
+
+
+class CreatePhotoTests(MediaTestCase):
+    def test_duplicate_in_session(self):
+        session = Session.objects.create(phone="0902")
+        first = create_photo(session, upload_file(1, "a.jpg"))
+        second = create_photo(session, upload_file(1, "b.jpg"))
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(session.photos.count(), 1)
+        self.assertNotEqual(create_photo(session, upload_file(2)).pk, first.pk)
+
+    def test_duplicate_across_sessions(self):
+        first = create_photo(Session.objects.create(phone="0903"), upload_file(1))
+        other = Session.objects.create(phone="0904")
+        with mock.patch("core.derivatives.build_photo_derivatives") as build:
+            second = create_photo(other, upload_file(1))
+        # Photo mới của session kia, dùng lại file gốc + bản phái sinh, không decode lại
+        build.assert_not_called()
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(second.session, other)
+        for name in ("image", "render_image", "preview_image", "thumbnail"):
+            self.assertEqual(getattr(second, name).name, getattr(first, name).name)
+        originals = [entry for entry in os.scandir(os.path.dirname(first.image.path)) if entry.is_file()]
+        self.assertEqual(len(originals), 1)
+
+
+    def test_hash_from_upload_handler(self):
+        for handlers, size in (
+            (["core.upload_handlers.HashingMemoryFileUploadHandler"], (160, 120)),
+            # File lớn hơn ngưỡng memory → file tạm
+            (["core.upload_handlers.HashingTemporaryFileUploadHandler"], (800, 600)),
+        ):
+            with self.subTest(handlers=handlers), override_settings(FILE_UPLOAD_HANDLERS=handlers):
+                Session.objects.get_or_create(phone="0920")
+                data = jpeg_bytes(len(handlers[0]), size)
+                # Hash phải có sẵn từ handler, create_photo không đọc lại file
+                with mock.patch("core.derivatives.upload_sha256", side_effect=lambda f: f.content_hash):
+                    response = self.client.post(
+                        "/session/0920/upload/", {"photos": [SimpleUploadedFile("a.jpg", data), SimpleUploadedFile("b.jpg", data)]},
+                        headers={"X-Requested-With": "XMLHttpRequest"},
+                    )
+                ids = [photo["id"] for photo in response.json()["photos"]]
+                self.assertEqual(ids[0], ids[1])
+                self.assertEqual(Photo.objects.get(pk=ids[0]).content_hash, hashlib.sha256(data).hexdigest())
+
+
+class MergeDuplicatePhotosMigrationTests(MigrationTestCase):
+    migrate_from = "0014_frame_retention_days"
+    migrate_to = "0015_photo_content_dedup"
+
+    def test_merges_into_oldest(self):
+        Session = self.old_apps.get_model("core", "Session")
+        Photo = self.old_apps.get_model("core", "Photo")
+        Frame = self.old_apps.get_model("core", "Frame")
+        PhotoSlot = self.old_apps.get_model("core", "PhotoSlot")
+        ChunkedUpload = self.old_apps.get_model("core", "ChunkedUpload")
+
+        frame = Frame.objects.create(name="f", image="frames/f.png", layout_json={"slots": SLOTS}, slot_count=2)
+        session = Session.objects.create(phone="0909")
+        other_session = Session.objects.create(phone="0910")
+        keeper = Photo.objects.create(session=session, image="photos/a.jpg", content_hash="a" * 64)
+        dup = Photo.objects.create(session=session, image="photos/a_dup.jpg", content_hash="a" * 64)
+        elsewhere = Photo.objects.create(session=other_session, image="photos/a.jpg", content_hash="a" * 64)
+        legacy = [Photo.objects.create(session=session, image=f"photos/old{i}.jpg") for i in range(2)]
+        PhotoSlot.objects.create(session=session, frame=frame, slot_index=0, photo=dup)
+        upload = ChunkedUpload.objects.create(session=session, filename="a.jpg", size=1, photo=dup)
+
+        apps = self.migrate()
+
+        Photo = apps.get_model("core", "Photo")
+        self.assertEqual(
+            set(Photo.objects.values_list("id", flat=True)),
+            {keeper.pk, elsewhere.pk, *(photo.pk for photo in legacy)},
+        )
+        self.assertEqual(apps.get_model("core", "PhotoSlot").objects.get().photo_id, keeper.pk)
+        self.assertEqual(apps.get_model("core", "ChunkedUpload").objects.get(pk=upload.pk).photo_id, keeper.pk)
+
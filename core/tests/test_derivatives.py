@@ -0,0 +1,60 @@
+from io import BytesIO, StringIO
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import override_settings
+from PIL import Image
+
+from core.derivatives import create_photo, max_slot_edge
+from core.models import Photo, Session
+from core.rendering import photo_source_path
+from core.tests.base import MediaTestCase, upload_file
+
+
+@override_settings(PHOTO_PREVIEW_SIZE=100, PHOTO_THUMBNAIL_SIZE=40)
+class PhotoDerivativeTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_frame()
+        self.session = Session.objects.create(phone="0915")
+
+    def test_sizes_follow_largest_slot(self):
+        self.assertEqual(max_slot_edge(), 80)
+        photo = create_photo(self.session, upload_file(1))
+
+        self.assertEqual((photo.render_width, photo.render_height), (107, 80))
+        for field, size in ((photo.render_image, (107, 80)), (photo.preview_image, (100, 75)), (photo.thumbnail, (40, 30))):
+            with Image.open(field.path) as img:
+                self.assertEqual((img.format, img.size), ("JPEG", size))
+
+    def test_exif_rotation_applied(self):
+        buf = BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # xoay 90° khi hiển thị
+        Image.new("RGB", (160, 120), (10, 200, 10)).save(buf, "JPEG", exif=exif)
+        photo = create_photo(self.session, ContentFile(buf.getvalue(), name="rotated.jpg"))
+        self.assertEqual((photo.render_width, photo.render_height), (80, 107))
+
+    def test_render_image_used_when_large_enough(self):
+        photo = create_photo(self.session, upload_file(2))
+        self.assertEqual(photo_source_path(photo, 80, 60), photo.render_image.path)
+        # Slot lớn hơn bản render-ready → quay về ảnh gốc
+        self.assertEqual(photo_source_path(photo, 150, 110), photo.image.path)
+
+    def test_broken_image_still_uploads(self):
+        with self.assertLogs("core.derivatives", "WARNING"):
+            photo = create_photo(self.session, ContentFile(b"not an image", name="broken.jpg"))
+        self.assertTrue(photo.pk)
+        self.assertFalse(photo.thumbnail)
+        self.assertEqual(photo_source_path(photo, 80, 60), photo.image.path)
+
+    def test_build_derivatives_command(self):
+        photo = create_photo(self.session, upload_file(3))
+        Photo.objects.filter(pk=photo.pk).update(render_image=None, preview_image=None, thumbnail=None)
+
+        out = StringIO()
+        call_command("build_derivatives", stdout=out)
+
+        photo.refresh_from_db()
+        self.assertTrue(photo.thumbnail)
+        self.assertIn("Built derivatives for 1 photos (0 failed)", out.getvalue())
@@ -0,0 +1,63 @@
+import os
+import zipfile
+from io import BytesIO
+from unittest import mock
+
+from django.test import override_settings
+
+from core.downloads import session_zip_sources, stream_zip
+from core.models import Session
+from core.tests.base import MediaTestCase, jpeg_bytes
+
+
+def fake_fetch(url):
+    if "missing" in url:
+        raise ConnectionError("404")
+    return url.encode()
+
+
+@override_settings(ZIP_FETCH_WORKERS=2)
+@mock.patch("core.downloads._fetch", side_effect=fake_fetch)
+class StreamZipTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = Session.objects.create(phone="0916")
+
+    def test_local_and_remote_in_order(self, fetch):
+        local = self.make_render(self.session, remote_url="https://bucket.test/a.jpg")
+        remote_only = self.make_render(self.session, remote_url="https://bucket.test/b.jpg")
+        os.remove(remote_only.image.path)
+
+        sources = session_zip_sources([local, remote_only])
+        self.assertEqual(sources[0]["path"], local.image.path)
+        self.assertIsNone(sources[1]["path"])
+
+        chunks = list(stream_zip(sources))
+        self.assertGreater(len(chunks), 1)
+        with zipfile.ZipFile(BytesIO(b"".join(chunks))) as zf:
+            self.assertEqual(zf.namelist(), ["photo_1.jpg", "photo_2.jpg"])
+            self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist()))
+            self.assertEqual(zf.read("photo_1.jpg"), jpeg_bytes(9))
+            self.assertEqual(zf.read("photo_2.jpg"), b"https://bucket.test/b.jpg")
+        fetch.assert_called_once_with("https://bucket.test/b.jpg")
+
+    def test_failed_fetch_skipped(self, fetch):
+        sources = [
+            {"arcname": f"photo_{i}.jpg", "path": None, "url": f"https://bucket.test/{name}.jpg"}
+            for i, name in enumerate(["a", "missing", "c"], 1)
+        ]
+        with self.assertLogs("core.downloads", "WARNING"):
+            data = b"".join(stream_zip(sources))
+        with zipfile.ZipFile(BytesIO(data)) as zf:
+            self.assertEqual(zf.namelist(), ["photo_1.jpg", "photo_3.jpg"])
+
+    def test_download_view_streams_uploaded_renders(self, fetch):
+        self.make_render(self.session, remote_url="https://bucket.test/a.jpg")
+        self.make_render(self.session)  # chưa upload → không có trong ZIP
+
+        response = self.client.get("/d/0916/?download=zip")
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="session_0916_photos.zip"')
+        with zipfile.ZipFile(BytesIO(b"".join(response.streaming_content))) as zf:
+            self.assertEqual(zf.namelist(), ["photo_1.jpg"])
@@ -0,0 +1,57 @@
+import os
+
+from django.db import IntegrityError, transaction
+
+from core.derivatives import create_photo
+from core.fingerprints import render_fingerprint
+from core.jobs import enqueue_render
+from core.models import RenderJob, Session
+from core.tests.base import MediaTestCase, upload_file
+
+
+class RenderFingerprintTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.frame = self.make_frame()
+        self.session = Session.objects.create(phone="0905")
+        self.photos = [create_photo(self.session, upload_file(seed)) for seed in (1, 2)]
+
+    def test_same_request_reuses_active_job(self):
+        job = enqueue_render(self.session, self.frame, self.photos)
+        self.assertEqual(job.status, RenderJob.STATUS_QUEUED)
+        self.assertEqual(job.photo_ids, [photo.id for photo in self.photos])
+        self.assertEqual(enqueue_render(self.session, self.frame, self.photos).pk, job.pk)
+        # Đổi thứ tự slot → fingerprint khác → job mới
+        self.assertNotEqual(enqueue_render(self.session, self.frame, self.photos[::-1]).pk, job.pk)
+
+    def test_reuses_finished_render(self):
+        job = enqueue_render(self.session, self.frame, self.photos)
+        rendered = self.make_render(self.session, frame=self.frame, fingerprint=job.fingerprint)
+        RenderJob.objects.filter(pk=job.pk).update(status=RenderJob.STATUS_DONE, rendered=rendered)
+
+        reused = enqueue_render(self.session, self.frame, self.photos)
+        self.assertNotEqual(reused.pk, job.pk)
+        self.assertEqual(reused.status, RenderJob.STATUS_DONE)
+        self.assertEqual(reused.rendered, rendered)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.download_url, f"http://kiosk.test{rendered.web_url}")
+
+    def test_frame_change_invalidates_fingerprint(self):
+        job = enqueue_render(self.session, self.frame, self.photos)
+        self.make_render(self.session, frame=self.frame, fingerprint=job.fingerprint)
+        RenderJob.objects.filter(pk=job.pk).update(status=RenderJob.STATUS_DONE)
+        stat = os.stat(self.frame.image.path)
+        os.utime(self.frame.image.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(enqueue_render(self.session, self.frame, self.photos).status, RenderJob.STATUS_QUEUED)
+
+    def test_fingerprint_inputs(self):
+        base = render_fingerprint(self.frame, self.photos)
+        self.assertEqual(render_fingerprint(self.frame, list(self.photos)), base)
+        self.assertNotEqual(render_fingerprint(self.frame, self.photos[:1]), base)
+        self.frame.layout_json = {**self.frame.layout_json, "slots": self.frame.layout_json["slots"][::-1]}
+        self.assertNotEqual(render_fingerprint(self.frame, self.photos), base)
+
+    def test_one_active_job_per_fingerprint(self):
+        job = enqueue_render(self.session, self.frame, self.photos)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            RenderJob.objects.create(session=self.session, frame=self.frame, fingerprint=job.fingerprint)
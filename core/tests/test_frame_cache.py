@@ -0,0 +1,80 @@
+import os
+import time
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from core.frame_cache import TMP_FILE_MAX_AGE, PreparedFrameCache, get_prepared_frame
+from core.tests.base import MediaTestCase
+
+
+class PreparedFrameCacheTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.frame = self.make_frame()
+
+    def disk_files(self, cache=None):
+        cache = cache or self.frame_cache
+        return sorted(path.name for path in cache.cache_dir.glob("*"))
+
+    def test_cached_canvas_is_shared_and_opaque(self):
+        canvas = get_prepared_frame(self.frame, (50, 100))
+        self.assertEqual((canvas.mode, canvas.size), ("RGB", (50, 100)))
+        self.assertIs(get_prepared_frame(self.frame, (50, 100)), canvas)
+        self.assertEqual(len(self.disk_files()), 1)
+
+    def test_reload_from_disk(self):
+        canvas = get_prepared_frame(self.frame, (50, 100))
+        fresh = PreparedFrameCache(max_bytes=1024 * 1024, cache_dir=self.frame_cache.cache_dir)
+        self.assertEqual(fresh.get(self.frame, (50, 100)).tobytes(), canvas.tobytes())
+
+    def test_saving_frame_invalidates(self):
+        old = get_prepared_frame(self.frame, (50, 100))
+        stale_tmp = self.frame_cache.cache_dir / "frame_1.rgb.tmp99.1"
+        fresh_tmp = self.frame_cache.cache_dir / "frame_2.rgb.tmp99.2"
+        for path in (stale_tmp, fresh_tmp):
+            path.write_bytes(b"x")
+        past = time.time() - TMP_FILE_MAX_AGE - 1
+        os.utime(stale_tmp, (past, past))
+
+        buf = BytesIO()
+        Image.new("RGB", (100, 200), (0, 0, 255)).save(buf, "PNG")
+        self.frame.image.save("blue.png", ContentFile(buf.getvalue()), save=True)
+
+        # post_save → bỏ cả RAM lẫn file trên đĩa; file tạm còn mới thì giữ
+        self.assertEqual(self.disk_files(), [fresh_tmp.name])
+        canvas = get_prepared_frame(self.frame, (50, 100))
+        self.assertIsNot(canvas, old)
+        self.assertEqual(canvas.getpixel((25, 50)), (0, 0, 255))
+
+    def test_ram_lru_eviction(self):
+        one_canvas = 50 * 100 * 3
+        cache = PreparedFrameCache(max_bytes=one_canvas * 2)
+        first = cache.get(self.frame, (50, 100))
+        cache.get(self.frame, (50, 99))
+        cache.get(self.frame, (50, 100))  # dùng lại → (50, 99) là cũ nhất
+        cache.get(self.frame, (50, 98))
+        self.assertIs(cache.get(self.frame, (50, 100)), first)
+        self.assertEqual(len(cache._entries), 2)
+        self.assertLessEqual(cache._bytes, cache.max_bytes)
+
+    def test_disk_limit_removes_least_recently_used(self):
+        cache_dir = self.frame_cache.cache_dir / "small"
+        cache = PreparedFrameCache(max_bytes=0, cache_dir=cache_dir, disk_max_bytes=50 * 100 * 3 * 2)
+        cache.get(self.frame, (50, 100))
+        cache.get(self.frame, (50, 99))
+        past = time.time() - 60
+        os.utime(cache._disk_path(cache.key_for(self.frame, (50, 99))), (past, past))
+        cache.get(self.frame, (50, 98))
+
+        names = self.disk_files(cache)
+        self.assertEqual(len(names), 2)
+        self.assertFalse(any(name.endswith("_50x99.rgb") for name in names))
+
+    def test_prune_drops_dead_keys(self):
+        get_prepared_frame(self.frame, (50, 100))
+        key = self.frame_cache.key_for(self.frame, (50, 100))
+        self.assertEqual(self.frame_cache.prune({(key[0], key[1])}), 0)
+        self.assertEqual(self.frame_cache.prune(set()), 1)
+        self.assertEqual(self.disk_files(), [])
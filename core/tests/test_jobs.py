@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.derivatives import create_photo
+from core.jobs import claim_job, claim_next_job, enqueue_render, requeue_stale_jobs, run_render_job
+from core.models import PendingUpload, PhotoSlot, RenderedPhoto, RenderJob, Session
+from core.tests.base import MediaTestCase, upload_file
+
+
+class RenderJobTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.frame = self.make_frame()
+        self.session = Session.objects.create(phone="0905", selected_frame=self.frame)
+        self.photos = [create_photo(self.session, upload_file(seed)) for seed in (1, 2)]
+
+    def test_claim_once(self):
+        job = enqueue_render(self.session, self.frame, self.photos)
+        stale = RenderJob.objects.get(pk=job.pk)
+        self.assertTrue(claim_job(job))
+        self.assertEqual(job.status, RenderJob.STATUS_RENDERING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.started_at)
+        self.assertFalse(claim_job(stale))
+
+    def test_claim_next_oldest_first(self):
+        first = enqueue_render(self.session, self.frame, self.photos)
+        second = enqueue_render(self.session, self.frame, self.photos[::-1])
+        self.assertEqual(claim_next_job().pk, first.pk)
+        self.assertEqual(claim_next_job().pk, second.pk)
+        self.assertIsNone(claim_next_job())
+
+    def test_run_render_job(self):
+        job = enqueue_render(self.session, self.frame, self.photos)
+        claim_job(job)
+        run_render_job(job)
+
+        self.assertEqual(job.status, RenderJob.STATUS_DONE)
+        rendered = RenderedPhoto.objects.get(pk=job.rendered_id)
+        self.assertEqual(rendered.fingerprint, job.fingerprint)
+        self.assertTrue(rendered.remote_url)
+        self.assertTrue(rendered.qr_code)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.download_url, rendered.remote_url)
+        self.assertEqual(rendered.print_jobs.count(), 1)
+
+    def test_missing_photo_fails_job(self):
+        job = enqueue_render(self.session, self.frame, self.photos)
+        self.photos[1].delete()
+        claim_job(job)
+        run_render_job(job)
+        self.assertEqual(job.status, RenderJob.STATUS_FAILED)
+        self.assertIn("Ảnh đã bị xóa", job.error)
+
+    def make_stale(self, job, status, **fields):
+        RenderJob.objects.filter(pk=job.pk).update(
+            status=status, started_at=timezone.now() - timedelta(hours=1), **fields,
+        )
+
+    def test_requeue_stale_rendering(self):
+        job = enqueue_render(self.session, self.frame, self.photos)
+        fresh = enqueue_render(self.session, self.frame, self.photos[::-1])
+        claim_job(job)
+        claim_job(fresh)
+        self.make_stale(job, RenderJob.STATUS_RENDERING)
+
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=10)), 1)
+        job.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(job.status, RenderJob.STATUS_QUEUED)
+        self.assertEqual(fresh.status, RenderJob.STATUS_RENDERING)
+
+    def test_stale_uploading_resumes_without_rerender(self):
+        job = enqueue_render(self.session, self.frame, self.photos)
+        rendered = self.make_render(self.session, frame=self.frame, fingerprint=job.fingerprint)
+        self.make_stale(job, RenderJob.STATUS_UPLOADING, rendered=rendered)
+
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=10)), 0)
+
+        job.refresh_from_db()
+        rendered.refresh_from_db()
+        self.assertEqual(job.status, RenderJob.STATUS_DONE)
+        self.assertEqual(RenderedPhoto.objects.count(), 1)
+        self.assertEqual(PendingUpload.objects.get().status, PendingUpload.STATUS_DONE)
+        self.assertTrue(rendered.remote_url)
+        self.assertTrue(rendered.qr_code)
+
+    def test_stale_uploading_with_outbox_entry_only_publishes_qr(self):
+        self.storage.failures = 1
+        job = enqueue_render(self.session, self.frame, self.photos)
+        rendered = self.make_render(self.session, frame=self.frame, fingerprint=job.fingerprint)
+        # Worker chết ngay sau khi ghi outbox
+        upload = PendingUpload.objects.create(rendered=rendered, remote_path="renders/x.jpg")
+        self.make_stale(job, RenderJob.STATUS_UPLOADING, rendered=rendered)
+
+        requeue_stale_jobs(timedelta(minutes=10))
+
+        job.refresh_from_db()
+        rendered.refresh_from_db()
+        self.assertEqual(job.status, RenderJob.STATUS_DONE)
+        self.assertEqual(PendingUpload.objects.get(), upload)  # worker outbox lo phần upload
+        self.assertTrue(rendered.qr_code)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.download_url, f"http://kiosk.test{rendered.web_url}")
+
+
+class RenderJobViewTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.frame = self.make_frame()
+        self.session = Session.objects.create(phone="0906", selected_frame=self.frame)
+        for index, seed in enumerate((1, 2)):
+            photo = create_photo(self.session, upload_file(seed))
+            PhotoSlot.objects.create(session=self.session, frame=self.frame, slot_index=index, photo=photo)
+
+    def finalize(self):
+        return self.client.post("/session/0906/finalize-render/", headers={"X-Requested-With": "XMLHttpRequest"})
+
+    def test_finalize_enqueues_and_reports_status(self):
+        response = self.finalize()
+        self.assertEqual(response.status_code, 202)
+        payload = response.json()
+        self.assertEqual(payload["status"], RenderJob.STATUS_QUEUED)
+        # Bấm lần nữa khi job chưa xong → cùng job
+        self.assertEqual(self.finalize().json()["job_id"], payload["job_id"])
+
+        status = self.client.get(payload["status_url"]).json()
+        self.assertEqual((status["status"], status["download_url"]), (RenderJob.STATUS_QUEUED, None))
+
+        job = claim_next_job()
+        run_render_job(job)
+        status = self.client.get(payload["status_url"]).json()
+        self.assertEqual(status["status"], RenderJob.STATUS_DONE)
+        self.assertEqual(status["download_url"], RenderedPhoto.objects.get(pk=job.rendered_id).remote_url)
+        self.assertTrue(status["qr_url"])
+
+    def test_finalize_requires_all_slots(self):
+        PhotoSlot.objects.filter(slot_index=1).delete()
+        self.assertEqual(self.finalize().status_code, 400)
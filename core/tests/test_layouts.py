@@ -0,0 +1,67 @@
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+
+from core.layouts import LayoutError, center_crop_box, compile_layout
+from core.models import Frame
+from core.tests.base import SLOTS, MediaTestCase
+
+
+class CompileLayoutTests(SimpleTestCase):
+    def test_compiles_slots(self):
+        layout = compile_layout({"w": 100, "h": 200, "slots": SLOTS})
+        self.assertEqual((layout.width, layout.height, layout.slot_count), (100, 200, 2))
+        slot = layout.slots[1]
+        self.assertEqual((slot.index, slot.x, slot.y, slot.w, slot.h), (1, 10, 100, 60, 80))
+        # Số thực nguyên (2.0) chấp nhận được, mặc định canvas 1200x1800
+        layout = compile_layout({"slots": [{"x": 0, "y": 0, "w": 2.0, "h": 3}]})
+        self.assertEqual((layout.width, layout.height, layout.slots[0].w), (1200, 1800, 2))
+
+    def test_rejects_invalid(self):
+        cases = {
+            "không phải object": [],
+            "không có slot": {"w": 100, "h": 100, "slots": []},
+            "slot không phải object": {"slots": [[0, 0, 1, 1]]},
+            "thiếu h": {"slots": [{"x": 0, "y": 0, "w": 1}]},
+            "số lẻ": {"slots": [{"x": 0.5, "y": 0, "w": 1, "h": 1}]},
+            "bool": {"slots": [{"x": True, "y": 0, "w": 1, "h": 1}]},
+            "chuỗi": {"slots": [{"x": "0", "y": 0, "w": 1, "h": 1}]},
+            "âm": {"slots": [{"x": -1, "y": 0, "w": 1, "h": 1}]},
+            "rỗng": {"slots": [{"x": 0, "y": 0, "w": 0, "h": 1}]},
+            "ngoài canvas": {"w": 100, "h": 100, "slots": [{"x": 50, "y": 0, "w": 60, "h": 10}]},
+            "canvas quá lớn": {"w": 20001, "h": 100, "slots": [{"x": 0, "y": 0, "w": 1, "h": 1}]},
+        }
+        for name, data in cases.items():
+            with self.subTest(name), self.assertRaises(LayoutError):
+                compile_layout(data)
+
+    def test_center_crop_box(self):
+        # Ảnh rộng hơn slot → cắt hai bên; cao hơn → cắt trên dưới
+        self.assertEqual(center_crop_box(4000, 3000, 500, 600), (750, 0, 3250, 3000))
+        self.assertEqual(center_crop_box(3000, 4000, 600, 500), (0, 750, 3000, 3250))
+        self.assertEqual(center_crop_box(1000, 1000, 300, 300), (0, 0, 1000, 1000))
+        for box in (center_crop_box(4001, 2999, 333, 517), center_crop_box(1919, 1081, 1600, 900)):
+            self.assertTrue(all(isinstance(value, int) for value in box))
+
+
+class FrameLayoutTests(MediaTestCase):
+    def test_save_stores_slot_count(self):
+        frame = self.make_frame()
+        self.assertEqual(Frame.objects.values_list("slot_count", flat=True).get(pk=frame.pk), 2)
+        frame.layout_json = {"w": 100, "h": 200, "slots": SLOTS[:1]}
+        frame.save(update_fields=["layout_json"])
+        self.assertEqual(Frame.objects.values_list("slot_count", flat=True).get(pk=frame.pk), 1)
+
+    def test_layout_cached_until_changed(self):
+        frame = self.make_frame()
+        self.assertIs(frame.layout, frame.layout)
+        frame.layout_json["slots"].pop()
+        self.assertEqual(frame.layout.slot_count, 1)
+
+    def test_invalid_layout_rejected(self):
+        frame = self.make_frame()
+        frame.layout_json = {"w": 10, "h": 10, "slots": SLOTS}
+        with self.assertRaises(ValidationError) as ctx:
+            frame.full_clean()
+        self.assertIn("layout_json", ctx.exception.message_dict)
+        with self.assertRaises(LayoutError):
+            frame.save()
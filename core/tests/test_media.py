@@ -0,0 +1,97 @@
+import os
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.http import http_date
+
+from core import media
+from core.tests.base import MediaTestCase
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        self.assertEqual(media.parse_range("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(media.parse_range("bytes=900-", 1000), (900, 999))
+        self.assertEqual(media.parse_range("bytes=-100", 1000), (900, 999))
+        self.assertEqual(media.parse_range("bytes=-5000", 1000), (0, 999))
+        # End vượt cuối file → cắt về byte cuối
+        self.assertEqual(media.parse_range("bytes=990-2000", 1000), (990, 999))
+
+    def test_ignored(self):
+        # Không có header / nhiều khoảng / sai cú pháp → trả cả file
+        for header in (None, "", "bytes=0-1,5-9", "items=0-9", "bytes=-"):
+            self.assertIsNone(media.parse_range(header, 1000), header)
+
+    def test_unsatisfiable(self):
+        for header in ("bytes=1000-", "bytes=5000-6000", "bytes=-0", "bytes=20-10"):
+            with self.assertRaises(ValueError, msg=header):
+                media.parse_range(header, 1000)
+
+
+@override_settings(MEDIA_ACCEL="")
+class MediaServeTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = bytes(range(256)) * 4
+        os.makedirs(self.media_path("renders"))
+        with open(self.media_path("renders/file.bin"), "wb") as f:
+            f.write(self.data)
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        return media.serve(self.factory.get("/media/renders/file.bin", headers=headers), "renders/file.bin")
+
+    def test_full(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("immutable", response["Cache-Control"])
+
+    def test_partial(self):
+        response = self.get(Range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.data[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.data)}")
+        self.assertEqual(response["Content-Length"], "10")
+
+    def test_unsatisfiable(self):
+        response = self.get(Range=f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.data)}")
+
+    def test_not_modified(self):
+        etag = self.get()["ETag"]
+        response = self.get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        last_modified = http_date(os.stat(self.media_path("renders/file.bin")).st_mtime)
+        self.assertEqual(self.get(If_Modified_Since=last_modified).status_code, 304)
+
+    def test_if_range(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(Range="bytes=0-9", If_Range=etag).status_code, 206)
+        # File đã đổi (ETag khác) → trả cả file
+        self.assertEqual(self.get(Range="bytes=0-9", If_Range='"stale"').status_code, 200)
+
+    def test_missing_and_outside_media_root(self):
+        for path in ("renders/missing.bin", "renders"):
+            with self.assertRaises(Http404, msg=path):
+                media.serve(self.factory.get("/media/x"), path)
+        # Django trả 400 cho SuspiciousOperation
+        with self.assertRaises(SuspiciousFileOperation):
+            media.serve(self.factory.get("/media/x"), "../etc/passwd")
+
+
+    @override_settings(MEDIA_ACCEL="x-accel", MEDIA_ACCEL_PREFIX="/protected-media/")
+    def test_x_accel(self):
+        response = self.get()
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/renders/file.bin")
+        self.assertEqual(response.content, b"")
+        self.assertIn("ETag", response)
+
+    @override_settings(MEDIA_ACCEL="x-sendfile")
+    def test_x_sendfile(self):
+        self.assertEqual(self.get()["X-Sendfile"], self.media_path("renders/file.bin"))
@@ -0,0 +1,43 @@
+from django.test import SimpleTestCase
+
+from core.metrics import STAGE_SECONDS, Histogram, span
+from core.models import RenderJob, Session
+from core.tests.base import MediaTestCase
+
+
+class HistogramTests(SimpleTestCase):
+    def test_cumulative_buckets(self):
+        histogram = Histogram("test_seconds", "help", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, stage="x")
+
+        lines = histogram.collect()
+        self.assertEqual(lines[:2], ["# HELP test_seconds help", "# TYPE test_seconds histogram"])
+        self.assertIn('test_seconds_bucket{stage="x",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="x",le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="x",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_sum{stage="x"} 5.550000', lines)
+        self.assertIn('test_seconds_count{stage="x"} 3', lines)
+
+    def test_span_records_errors(self):
+        with self.assertRaises(RuntimeError), span("test_stage"):
+            raise RuntimeError("boom")
+        lines = STAGE_SECONDS.collect()
+        self.assertIn('photobooth_stage_seconds_count{outcome="error",stage="test_stage"} 1', lines)
+
+
+class MetricsViewTests(MediaTestCase):
+    def test_exposition(self):
+        frame = self.make_frame()
+        RenderJob.objects.create(session=Session.objects.create(phone="0919"), frame=frame, photo_ids=[])
+
+        response = self.client.get("/metrics/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn('photobooth_render_jobs{status="queued"} 1', body)
+        self.assertIn('photobooth_render_jobs{status="done"} 0', body)
+        self.assertIn("# TYPE photobooth_uploads gauge", body)
+        self.assertIn("photobooth_media_disk_used_percent ", body)
+        self.assertEqual(self.client.post("/metrics/").status_code, 405)
@@ -0,0 +1,69 @@
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from core.derivatives import create_photo
+from core.models import PhotoSlot, Session
+from core.previews import quantize_scale
+from core.tests.base import MediaTestCase, upload_file
+
+
+@override_settings(PREVIEW_SCALE=0.25)
+class QuantizeScaleTests(SimpleTestCase):
+    def test_snaps_to_allowed_scales(self):
+        self.assertEqual(quantize_scale("0.3"), 0.25)
+        self.assertEqual(quantize_scale("0.45"), 0.5)
+        self.assertEqual(quantize_scale("7"), 0.5)
+
+    def test_rejects_non_finite(self):
+        for value in ("nan", "inf", "-inf", "abc"):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                quantize_scale(value)
+
+
+@override_settings(PREVIEW_SCALE=0.25)
+class PreviewImageViewTests(MediaTestCase):
+    url = "/session/0918/preview-image/"
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.frame = self.make_frame()
+        self.session = Session.objects.create(phone="0918", selected_frame=self.frame)
+        self.photo = create_photo(self.session, upload_file(1))
+        PhotoSlot.objects.create(session=self.session, frame=self.frame, slot_index=0, photo=self.photo)
+
+    def test_image_and_etag(self):
+        response = self.client.get(self.url, {"scale": "0.5"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertIn("no-cache", response["Cache-Control"])
+        with Image.open(BytesIO(response.content)) as img:
+            self.assertEqual(img.size, (50, 100))
+
+        etag = response["ETag"]
+        with mock.patch("core.previews.render_preview") as render_preview:
+            self.assertEqual(self.client.get(self.url, {"scale": "0.5"}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            # Không gửi ETag → lấy từ cache, không ghép lại
+            self.assertEqual(self.client.get(self.url, {"scale": "0.5"}).content, response.content)
+        render_preview.assert_not_called()
+
+    def test_etag_changes_with_slots(self):
+        etag = self.client.get(self.url)["ETag"]
+        other = create_photo(self.session, upload_file(2))
+        PhotoSlot.objects.create(session=self.session, frame=self.frame, slot_index=1, photo=other)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_format_and_scale_validation(self):
+        self.assertEqual(self.client.get(self.url, {"format": "webp"})["Content-Type"], "image/webp")
+        self.assertEqual(self.client.get(self.url, {"format": "gif"})["Content-Type"], "image/jpeg")
+        for value in ("nan", "inf", "abc"):
+            with self.subTest(scale=value):
+                self.assertEqual(self.client.get(self.url, {"scale": value}).status_code, 400)
@@ -0,0 +1,98 @@
+import os
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+from PIL import Image
+
+from core.jobs import enqueue_render
+from core.models import PrintJob, Session
+from core.printing import PrinterError, prepare_print_job, request_print, requeue_stale_rasterizing, spool_once
+from core.tests.base import MediaTestCase
+
+
+@override_settings(PRINT_WIDTH_PX=120, PRINT_HEIGHT_PX=180, PRINT_DPI=300)
+class PrintQueueTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = Session.objects.create(phone="0913")
+        self.rendered = self.make_render(self.session)
+
+    def printed_files(self):
+        directory = self.media_path("../printer")
+        return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+    def test_prepare_is_idempotent(self):
+        job = prepare_print_job(self.rendered)
+        self.assertEqual(job.status, PrintJob.STATUS_PREPARING)
+        self.assertEqual(prepare_print_job(self.rendered), job)
+
+    def test_spooler_rasterizes_to_paper_size(self):
+        job = prepare_print_job(self.rendered)
+        self.assertEqual(spool_once(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, PrintJob.STATUS_READY)
+        with Image.open(job.raster.path) as raster:
+            # Render ngang → xoay cho khớp khổ giấy dọc
+            self.assertEqual(raster.size, (120, 180))
+            self.assertEqual(raster.info["dpi"], (300, 300))
+        self.assertEqual(self.printed_files(), [])  # chưa ai bấm in
+
+        job = request_print(job)
+        self.assertEqual(job.status, PrintJob.STATUS_DONE)
+        self.assertEqual(len(self.printed_files()), 1)
+
+    def test_request_before_spooler_rasterizes_inline(self):
+        job = request_print(prepare_print_job(self.rendered))
+        self.assertEqual(job.status, PrintJob.STATUS_DONE)
+        self.assertIsNotNone(job.requested_at)
+        self.assertEqual(spool_once(), 0)
+
+    def test_reprint_reuses_raster(self):
+        first = request_print(prepare_print_job(self.rendered))
+        second = prepare_print_job(self.rendered)
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertEqual((second.status, second.raster.name), (PrintJob.STATUS_READY, first.raster.name))
+
+    def test_printer_error_marks_failed(self):
+        printer = mock.Mock(send=mock.Mock(side_effect=PrinterError("paper jam")))
+        printer.name = "directory:test"
+        with mock.patch("core.printing.get_printer", return_value=printer), self.assertLogs("core.printing", "ERROR"):
+            job = request_print(prepare_print_job(self.rendered))
+        self.assertEqual((job.status, job.error), (PrintJob.STATUS_FAILED, "paper jam"))
+
+    def test_requeue_stale_rasterizing(self):
+        job = prepare_print_job(self.rendered)
+        PrintJob.objects.filter(pk=job.pk).update(
+            status=PrintJob.STATUS_RASTERIZING, updated_at=timezone.now() - timedelta(minutes=10),
+        )
+        self.assertEqual(requeue_stale_rasterizing(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, PrintJob.STATUS_PREPARING)
+
+
+@override_settings(PRINT_WIDTH_PX=120, PRINT_HEIGHT_PX=180)
+class PrintViewTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = Session.objects.create(phone="0914")
+        self.rendered = self.make_render(self.session)
+
+    def test_preview_get_does_not_create_print_job(self):
+        self.assertEqual(self.client.get("/session/0914/preview/").status_code, 200)
+        self.assertFalse(PrintJob.objects.exists())
+
+    def test_post_prints_latest_render(self):
+        response = self.client.post("/session/0914/print/")
+        self.assertRedirects(response, "/session/0914/print/", fetch_redirect_response=False)
+        job = PrintJob.objects.get()
+        self.assertEqual((job.rendered, job.status), (self.rendered, PrintJob.STATUS_DONE))
+
+    def test_post_refused_while_render_pending(self):
+        frame = self.make_frame()
+        enqueue_render(self.session, frame, [])
+        response = self.client.post("/session/0914/print/")
+        self.assertRedirects(response, "/session/0914/preview/", fetch_redirect_response=False)
+        self.assertFalse(PrintJob.objects.exists())
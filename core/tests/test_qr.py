@@ -0,0 +1,43 @@
+import os
+
+from PIL import Image
+
+from core.models import Session
+from core.qr import generate_qr_code, qr_file, qr_png_bytes, qr_svg
+from core.tests.base import MediaTestCase
+from core.uploads import publish_url
+
+
+class QrServiceTests(MediaTestCase):
+    def test_png_memoized(self):
+        qr_png_bytes.cache_clear()
+        first = qr_png_bytes("https://bucket.test/a.jpg")
+        self.assertIs(qr_png_bytes("https://bucket.test/a.jpg"), first)
+        self.assertEqual(qr_png_bytes.cache_info().hits, 1)
+        with Image.open(generate_qr_code("https://bucket.test/a.jpg")) as img:
+            self.assertEqual(img.format, "PNG")
+        self.assertNotEqual(qr_png_bytes("https://bucket.test/a.jpg", box_size=4), first)
+
+    def test_svg(self):
+        svg = qr_svg("https://bucket.test/a.jpg")
+        self.assertTrue(svg.startswith("<svg"))
+        self.assertIs(qr_svg("https://bucket.test/a.jpg"), svg)
+
+    def test_file_content_addressed(self):
+        name = qr_file("https://bucket.test/a.jpg")
+        self.assertRegex(name, r"^qrcodes/[0-9a-f]{32}\.png$")
+        self.assertEqual(qr_file("https://bucket.test/a.jpg"), name)
+        self.assertNotEqual(qr_file("https://bucket.test/a.jpg", box_size=4), name)
+        self.assertNotEqual(qr_file("https://bucket.test/b.jpg"), name)
+        self.assertEqual(len(os.listdir(self.media_path("qrcodes"))), 3)
+        with open(self.media_path(name), "rb") as f:
+            self.assertEqual(f.read(), qr_png_bytes("https://bucket.test/a.jpg"))
+
+    def test_renders_with_same_url_share_file(self):
+        session = Session.objects.create(phone="0917")
+        first, second = self.make_render(session), self.make_render(session)
+        publish_url(first, "https://bucket.test/shared.jpg")
+        publish_url(second, "https://bucket.test/shared.jpg")
+        self.assertEqual(first.qr_code.name, second.qr_code.name)
+        with Image.open(first.qr_code.path) as img:
+            self.assertEqual(img.format, "PNG")
@@ -0,0 +1,79 @@
+import os
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+
+from core.models import PendingUpload, Session
+from core.tests.base import MediaTestCase, MigrationTestCase, jpeg_bytes
+
+
+class ReconcileRendersTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = Session.objects.create(phone="0907")
+
+    def put_blob(self, name):
+        path = self.media_path("blob.jpg")
+        os.makedirs(self.media_root, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(jpeg_bytes(3))
+        self.storage.upload(name, path, "image/jpeg")
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command("reconcile_renders", *args, stdout=out)
+        return out.getvalue()
+
+    def test_matches_legacy_jpg_blob_for_webp_variant(self):
+        rendered = self.make_render(self.session)
+        rendered.web_image.save("web.webp", ContentFile(b"webp"), save=True)
+        legacy = f"renders/session_0907/0907_{rendered.id}.jpg"
+        self.put_blob(legacy)
+
+        self.reconcile()
+
+        rendered.refresh_from_db()
+        self.assertEqual(rendered.remote_path, legacy)
+        self.assertEqual(rendered.remote_url, f"https://bucket.test/{legacy}")
+        self.assertFalse(PendingUpload.objects.exists())
+
+    def test_missing_blob_uploads_web_variant(self):
+        rendered = self.make_render(self.session)
+        rendered.web_image.save("web.webp", ContentFile(b"webp"), save=True)
+
+        self.reconcile()
+
+        upload = PendingUpload.objects.get(rendered=rendered)
+        self.assertEqual(upload.remote_path, f"renders/session_0907/0907_{rendered.id}.webp")
+
+    def test_reports_orphans(self):
+        self.put_blob("renders/session_0907/unknown.jpg")
+        self.assertIn("Not in DB: renders/session_0907/unknown.jpg", self.reconcile("--dry-run"))
+
+
+class BackfillRemoteMigrationTests(MigrationTestCase):
+    migrate_from = "0006_pendingupload"
+    migrate_to = "0007_renderedphoto_remote"
+
+    def test_backfills_from_legacy_download_url(self):
+        Session = self.old_apps.get_model("core", "Session")
+        RenderedPhoto = self.old_apps.get_model("core", "RenderedPhoto")
+        session = Session.objects.create(phone="0908")
+        older = RenderedPhoto.objects.create(session=session, image="renders/a.jpg")
+        latest = RenderedPhoto.objects.create(session=session, image="renders/b.jpg")
+        session.download_url = f"https://storage.googleapis.com/kiosk/renders/session_0908/0908_{latest.id}.jpg"
+        session.save()
+        local = Session.objects.create(phone="0909", download_url="http://127.0.0.1:8000/media/renders/c.jpg")
+        local_render = RenderedPhoto.objects.create(session=local, image="renders/c.jpg")
+
+        apps = self.migrate()
+
+        RenderedPhoto = apps.get_model("core", "RenderedPhoto")
+        latest = RenderedPhoto.objects.get(pk=latest.pk)
+        self.assertEqual(latest.remote_path, f"renders/session_0908/0908_{latest.id}.jpg")
+        self.assertEqual(latest.remote_url, session.download_url)
+        self.assertEqual(latest.uploaded_at, latest.created_at)
+        # Render cũ hơn và fallback local: để reconcile_renders xử lý
+        self.assertEqual(RenderedPhoto.objects.get(pk=older.pk).remote_url, "")
+        self.assertEqual(RenderedPhoto.objects.get(pk=local_render.pk).remote_url, "")
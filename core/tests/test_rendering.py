@@ -0,0 +1,142 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from core.derivatives import build_render_variants, create_photo
+from core.jobs import save_render
+from core.models import Session
+from core.rendering import MemoryBudget, compose_frame, estimate_render_bytes, get_render_budget, render_to_file
+from core.tests.base import MediaTestCase, upload_file
+
+
+def assertColorClose(testcase, actual, expected, tolerance=6):
+    testcase.assertTrue(
+        all(abs(a - e) <= tolerance for a, e in zip(actual, expected)), f"{actual} != {expected}",
+    )
+
+
+class ParallelSlotTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.frame = self.make_frame()
+        self.session = Session.objects.create(phone="0920")
+        self.photos = [create_photo(self.session, upload_file(seed)) for seed in (1, 2)]
+
+    def test_parallel_matches_sequential(self):
+        sequential = compose_frame(self.photos, self.frame, slot_threads=1)
+        parallel = compose_frame(self.photos, self.frame, slot_threads=4)
+        self.assertEqual(parallel.tobytes(), sequential.tobytes())
+
+        # Ảnh seed 1 ở slot 0, seed 2 ở slot 1; ngoài slot là frame
+        assertColorClose(self, parallel.getpixel((50, 40)), (37, 91, 128))
+        assertColorClose(self, parallel.getpixel((40, 140)), (74, 182, 128))
+        assertColorClose(self, parallel.getpixel((95, 195)), (200, 30, 30))
+
+    def test_empty_slot_and_single_slot_skip_pool(self):
+        with mock.patch("core.rendering.get_slot_executor") as get_executor:
+            canvas = compose_frame([None, self.photos[1]], self.frame, scale=0.5, slot_threads=4)
+        get_executor.assert_not_called()
+        self.assertEqual(canvas.size, (50, 100))
+        assertColorClose(self, canvas.getpixel((25, 20)), (200, 30, 30))
+        assertColorClose(self, canvas.getpixel((20, 70)), (74, 182, 128))
+
+    def test_slot_error_propagates(self):
+        broken = create_photo(self.session, upload_file(3))
+        with open(broken.image.path, "wb") as f:
+            f.write(b"truncated")
+        broken.render_image = None
+        with self.assertRaises(OSError):
+            compose_frame([self.photos[0], broken], self.frame, slot_threads=4)
+
+
+class MemoryBudgetTests(SimpleTestCase):
+    def test_waits_for_room(self):
+        budget = MemoryBudget(100)
+        entered = threading.Event()
+
+        def second():
+            with budget.reserve(60):
+                entered.set()
+
+        with budget.reserve(60):
+            thread = threading.Thread(target=second)
+            thread.start()
+            self.assertFalse(entered.wait(0.1))
+            self.assertEqual((budget.reserved, budget.waiting), (60, 1))
+        self.assertTrue(entered.wait(5))
+        thread.join()
+        self.assertEqual((budget.reserved, budget.waiting), (0, 0))
+
+    def test_oversized_runs_alone_and_zero_is_unlimited(self):
+        with MemoryBudget(100).reserve(500):
+            pass
+        unlimited = MemoryBudget(0)
+        with unlimited.reserve(500), unlimited.reserve(500):
+            self.assertEqual(unlimited.reserved, 1000)
+
+
+class RenderToFileTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.frame = self.make_frame()
+        self.session = Session.objects.create(phone="0921")
+        self.photos = [create_photo(self.session, upload_file(seed)) for seed in (1, 2)]
+
+    def test_reserves_estimate_and_writes_to_fp(self):
+        estimate = estimate_render_bytes(self.photos, self.frame)
+        # Canvas 100x200 RGB + hai slot đã decode
+        self.assertGreater(estimate, 100 * 200 * 3)
+
+        budget = get_render_budget()
+        with mock.patch.object(budget, "reserve", wraps=budget.reserve) as reserve:
+            with open(self.media_path("out.jpg"), "wb") as fp:
+                render_to_file(self.photos, self.frame, fp)
+        reserve.assert_called_once_with(estimate)
+        self.assertEqual(budget.reserved, 0)
+        with Image.open(self.media_path("out.jpg")) as img:
+            self.assertEqual((img.format, img.size, img.info["dpi"]), ("JPEG", (100, 200), (300, 300)))
+
+    def test_save_render_stores_master(self):
+        rendered = save_render(self.session, self.frame, self.photos)
+        self.assertTrue(rendered.image.name.startswith("renders/render_0921_"))
+        with Image.open(rendered.image.path) as img:
+            self.assertEqual((img.size, img.info["dpi"]), ((100, 200), (300, 300)))
+
+
+@override_settings(RENDER_WEB_MAX_EDGE=50, RENDER_THUMBNAIL_SIZE=20)
+class RenderVariantTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.frame = self.make_frame()
+        self.session = Session.objects.create(phone="0922")
+        self.photos = [create_photo(self.session, upload_file(seed)) for seed in (1, 2)]
+
+    def assertImage(self, field, fmt, size):
+        with Image.open(field.path) as img:
+            self.assertEqual((img.format, img.size), (fmt, size))
+
+    def test_variants_from_one_canvas(self):
+        rendered = save_render(self.session, self.frame, self.photos)
+        self.assertImage(rendered.image, "JPEG", (100, 200))
+        self.assertImage(rendered.web_image, "JPEG", (25, 50))
+        self.assertImage(rendered.thumbnail, "JPEG", (10, 20))
+        self.assertEqual(rendered.web_file, rendered.web_image)
+
+    @override_settings(RENDER_WEB_FORMAT="webp")
+    def test_webp_web_variant(self):
+        rendered = save_render(self.session, self.frame, self.photos)
+        self.assertTrue(rendered.web_image.name.endswith(".webp"))
+        self.assertImage(rendered.web_image, "WEBP", (25, 50))
+        self.assertImage(rendered.thumbnail, "JPEG", (10, 20))
+
+    def test_variants_for_legacy_render(self):
+        rendered = self.make_render(self.session)
+        self.assertEqual(rendered.web_file, rendered.image)
+
+        build_render_variants(rendered)
+
+        rendered.refresh_from_db()
+        self.assertImage(rendered.web_image, "JPEG", (50, 38))
+        self.assertImage(rendered.thumbnail, "JPEG", (20, 15))
@@ -0,0 +1,76 @@
+from io import StringIO
+from unittest import mock
+
+from django.test import override_settings
+
+from core.derivatives import create_photo
+from core.fingerprints import render_fingerprint
+from core.jobs import save_render
+from core.management.commands.rerender import Command
+from core.models import PhotoSlot, Session
+from core.rendering import get_slot_executor
+from core.tests.base import MediaTestCase, upload_file
+
+
+class RerenderCollectTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.frame = self.make_frame()
+        self.session = Session.objects.create(phone="0911")
+        self.photos = [create_photo(self.session, upload_file(seed)) for seed in (1, 2, 3)]
+        self.command = Command(stdout=StringIO(), stderr=StringIO())
+
+    def collect(self):
+        options = {"frame": None, "phone": None, "since": None, "until": None}
+        return self.command.collect(options)
+
+    def assign(self, index, photo):
+        PhotoSlot.objects.create(session=self.session, frame=self.frame, slot_index=index, photo=photo)
+
+    def test_photos_keyed_by_slot_index(self):
+        self.assign(0, self.photos[0])
+        self.assign(1, self.photos[1])
+        save_render(self.session, self.frame, [self.photos[1], self.photos[0]])
+
+        tasks, pending_upload = self.collect()
+
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(tasks[0][2], [self.photos[0].id, self.photos[1].id])
+        self.assertEqual(pending_upload, [])
+
+    def test_gap_in_slot_indices_is_skipped(self):
+        # Slot 1 trống, slot 2 là bản gán cũ ngoài layout (frame chỉ có 2 slot)
+        self.assign(0, self.photos[0])
+        self.assign(2, self.photos[2])
+        save_render(self.session, self.frame, self.photos[:2])
+
+        tasks, _ = self.collect()
+
+        self.assertEqual(tasks, [])
+        self.assertIn("chưa đủ ảnh", self.command.stderr.getvalue())
+
+    def test_up_to_date_render_only_needs_upload(self):
+        self.assign(0, self.photos[0])
+        self.assign(1, self.photos[1])
+        rendered = save_render(
+            self.session, self.frame, self.photos[:2], render_fingerprint(self.frame, self.photos[:2]),
+        )
+
+        tasks, pending_upload = self.collect()
+
+        self.assertEqual((tasks, pending_upload), ([], [rendered.id]))
+
+
+class SlotThreadsTests(MediaTestCase):
+    @override_settings(RENDER_SLOT_THREADS=4)
+    def test_slot_threads_parameter_overrides_setting(self):
+        self.assertIsNone(get_slot_executor(1))
+        self.assertIs(get_slot_executor(), get_slot_executor(4))
+
+        frame = self.make_frame()
+        session = Session.objects.create(phone="0912")
+        photos = [create_photo(session, upload_file(seed)) for seed in (1, 2)]
+        with mock.patch("core.rendering.ThreadPoolExecutor") as pool:
+            rendered = save_render(session, frame, photos, slot_threads=1)
+        pool.assert_not_called()
+        self.assertTrue(rendered.image)
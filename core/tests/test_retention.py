@@ -0,0 +1,139 @@
+import os
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django.utils import timezone
+
+from core.derivatives import create_photo
+from core.models import Photo, RenderedPhoto, RenderJob, Session
+from core.retention import enforce_disk_high_water, purge_expired, sweep_orphans
+from core.tests.base import MediaTestCase, upload_file
+
+
+@override_settings(RETENTION_DAYS=30, RETENTION_ORPHAN_GRACE_HOURS=1)
+class RetentionTests(MediaTestCase):
+    def make_session(self, phone, age_days, frame=None, render=False):
+        session = Session.objects.create(phone=phone, selected_frame=frame)
+        photo = create_photo(session, upload_file(int(phone)))
+        rendered = self.make_render(session, name=f"render{phone}.jpg") if render else None
+        # Lần hoạt động cuối = created_at mới nhất của session / ảnh / render
+        created = timezone.now() - timedelta(days=age_days)
+        Session.objects.filter(pk=session.pk).update(created_at=created)
+        Photo.objects.filter(session=session).update(created_at=created)
+        RenderedPhoto.objects.filter(session=session).update(created_at=created)
+        return session, photo, rendered
+
+    def purge(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return purge_expired()
+
+    def test_purge_expired(self):
+        old, old_photo, rendered = self.make_session("1", 40, render=True)
+        recent, recent_photo, _ = self.make_session("2", 5)
+        self.make_session("3", 400, frame=self.make_frame(retention_days=0))
+        self.make_session("4", 10, frame=self.make_frame(retention_days=7))
+        # Đã upload lên bucket
+        rendered.remote_path = "renders/1/1_1.jpg"
+        rendered.save(update_fields=["remote_path"])
+        self.storage._objects[rendered.remote_path] = (b"x", "image/jpeg", timezone.now())
+
+        self.assertEqual(self.purge().sessions, 2)
+
+        self.assertEqual(set(Session.objects.values_list("phone", flat=True)), {"2", "3"})
+        self.assertFalse(os.path.exists(old_photo.image.path))
+        self.assertFalse(os.path.exists(rendered.image.path))
+        self.assertFalse(self.storage.exists(rendered.remote_path))
+        self.assertTrue(os.path.exists(recent_photo.image.path))
+
+    def test_keeps_shared_files(self):
+        old, _, old_render = self.make_session("1", 40, render=True)
+        old_render.qr_code.save("qr.png", ContentFile(b"qr"), save=False)
+        RenderedPhoto.objects.filter(pk=old_render.pk).update(qr_code=old_render.qr_code.name)
+        recent = Session.objects.create(phone="2")
+        # Cùng nội dung ảnh, cùng QR (content-addressed) với session còn hạn
+        shared = create_photo(recent, upload_file(1))
+        new_render = self.make_render(recent, name="render2.jpg", qr_code=old_render.qr_code.name)
+
+        self.purge()
+
+        self.assertFalse(Session.objects.filter(pk=old.pk).exists())
+        self.assertTrue(os.path.exists(shared.image.path))
+        self.assertTrue(os.path.exists(shared.thumbnail.path))
+        self.assertTrue(os.path.exists(new_render.qr_code.path))
+        self.assertFalse(os.path.exists(old_render.image.path))
+
+    def test_skips_busy_session(self):
+        old, _, _ = self.make_session("1", 40)
+        RenderJob.objects.create(session=old, status=RenderJob.STATUS_RENDERING)
+        self.assertEqual(self.purge().sessions, 0)
+
+    def write_media(self, name, age_hours):
+        path = self.media_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x")
+        mtime = (timezone.now() - timedelta(hours=age_hours)).timestamp()
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_sweep_orphans(self):
+        frame = self.make_frame()
+        photo = create_photo(Session.objects.create(phone="1"), upload_file(1))
+        old_orphan = self.write_media("photos/orphan.jpg", 5)
+        fresh_orphan = self.write_media("renders/fresh.jpg", 0)
+        stale_thumb = self.write_media("thumbs/admin/frames/deleted.jpg", 5)
+        for name in (photo.image.name, photo.thumbnail.name):
+            mtime = (timezone.now() - timedelta(hours=5)).timestamp()
+            os.utime(self.media_path(name), (mtime, mtime))
+        # Canvas của frame còn sống và của frame đã xóa trong cache trên đĩa
+        self.frame_cache.get(frame, (100, 200))
+        os.makedirs(self.frame_cache.cache_dir, exist_ok=True)
+        stale_canvas = os.path.join(self.frame_cache.cache_dir, "frame_999_1_10x10.rgb")
+        with open(stale_canvas, "wb") as f:
+            f.write(b"\0" * 300)
+
+        self.assertEqual(sweep_orphans(), 3)
+
+        self.assertFalse(os.path.exists(old_orphan))
+        self.assertFalse(os.path.exists(stale_thumb))
+        self.assertFalse(os.path.exists(stale_canvas))
+        self.assertTrue(os.path.exists(fresh_orphan))
+        self.assertTrue(os.path.exists(photo.image.path))
+        self.assertTrue(os.path.exists(photo.thumbnail.path))
+        self.assertEqual(len(os.listdir(self.frame_cache.cache_dir)), 1)
+
+
+    def high_water(self, usage):
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch("core.retention.disk_usage_percent", side_effect=usage):
+            return enforce_disk_high_water()
+
+    @override_settings(RETENTION_DISK_HIGH_WATER=0)
+    def test_high_water_off_by_default(self):
+        self.make_session("1", 10)
+        usage = mock.Mock(return_value=99.0)
+        self.assertEqual(self.high_water(usage).sessions, 0)
+        usage.assert_not_called()
+
+    @override_settings(RETENTION_DISK_HIGH_WATER=90, RETENTION_DISK_LOW_WATER=80, RETENTION_MIN_AGE_HOURS=2)
+    def test_high_water_purges_oldest_first(self):
+        self.make_session("1", 10)
+        self.make_session("2", 5)
+        self.make_session("3", 20, frame=self.make_frame(retention_days=0))
+        Session.objects.create(phone="4")  # mới tạo: chưa đủ RETENTION_MIN_AGE_HOURS
+
+        # Sau mỗi batch dung lượng giảm: 95 → 85 → 75
+        with override_settings(RETENTION_BATCH_SIZE=1):
+            stats = self.high_water([95.0, 85.0, 75.0])
+        self.assertEqual(stats.sessions, 2)
+        self.assertEqual(set(Session.objects.values_list("phone", flat=True)), {"3", "4"})
+
+    @override_settings(RETENTION_DISK_HIGH_WATER=90, RETENTION_DISK_LOW_WATER=80, RETENTION_BATCH_SIZE=10)
+    def test_high_water_keeps_retention_zero(self):
+        self.make_session("1", 400, frame=self.make_frame(retention_days=0))
+        with self.assertLogs("core.retention", "WARNING"):
+            stats = self.high_water([95.0, 95.0])
+        self.assertEqual(stats.sessions, 0)
+        self.assertTrue(Session.objects.filter(phone="1").exists())
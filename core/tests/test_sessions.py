@@ -0,0 +1,65 @@
+from django.db import IntegrityError, connection
+from django.test import TestCase
+
+from core.models import Session
+from core.tests.base import SLOTS, MigrationTestCase
+
+
+class SessionLookupTests(TestCase):
+    def test_phone_is_unique(self):
+        Session.objects.create(phone="0912")
+        with self.assertRaises(IntegrityError):
+            Session.objects.create(phone="0912")
+
+    def test_sqlite_tuning(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], int(connection.settings_dict["OPTIONS"]["timeout"] * 1000))
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_session_indexes(self):
+        with connection.cursor() as cursor:
+            for table in ("core_photo", "core_renderedphoto"):
+                indexes = connection.introspection.get_constraints(cursor, table)
+                self.assertTrue(
+                    any(info["index"] and info["columns"] == ["session_id", "created_at"] for info in indexes.values()),
+                    table,
+                )
+
+
+class MergeDuplicateSessionsMigrationTests(MigrationTestCase):
+    migrate_from = "0012_render_variants"
+    migrate_to = "0013_session_phone_unique"
+
+    def test_merges_into_oldest(self):
+        Session = self.old_apps.get_model("core", "Session")
+        Photo = self.old_apps.get_model("core", "Photo")
+        Frame = self.old_apps.get_model("core", "Frame")
+        PhotoSlot = self.old_apps.get_model("core", "PhotoSlot")
+        RenderedPhoto = self.old_apps.get_model("core", "RenderedPhoto")
+
+        frame = Frame.objects.create(name="f", image="frames/f.png", layout_json={"slots": SLOTS}, slot_count=2)
+        keeper = Session.objects.create(phone="0907")
+        dup = Session.objects.create(phone="0907", selected_frame=frame, download_url="https://x.test/1")
+        other = Session.objects.create(phone="0908")
+        keeper_photo = Photo.objects.create(session=keeper, image="photos/a.jpg")
+        dup_photo = Photo.objects.create(session=dup, image="photos/b.jpg")
+        PhotoSlot.objects.create(session=keeper, frame=frame, slot_index=0, photo=keeper_photo)
+        PhotoSlot.objects.create(session=dup, frame=frame, slot_index=0, photo=dup_photo)
+        PhotoSlot.objects.create(session=dup, frame=frame, slot_index=1, photo=dup_photo)
+        RenderedPhoto.objects.create(session=dup, image="renders/r.jpg")
+
+        apps = self.migrate()
+
+        Session = apps.get_model("core", "Session")
+        self.assertEqual(list(Session.objects.order_by("id").values_list("id", flat=True)), [keeper.pk, other.pk])
+        merged = Session.objects.get(phone="0907")
+        self.assertEqual(merged.selected_frame_id, frame.pk)
+        self.assertEqual(merged.download_url, "https://x.test/1")
+        self.assertEqual(apps.get_model("core", "Photo").objects.filter(session=merged).count(), 2)
+        self.assertEqual(apps.get_model("core", "RenderedPhoto").objects.filter(session=merged).count(), 1)
+        # Slot 0 trùng → giữ slot của session cũ nhất; slot 1 chuyển sang
+        slots = dict(apps.get_model("core", "PhotoSlot").objects.filter(session=merged).values_list("slot_index", "photo_id"))
+        self.assertEqual(slots, {0: keeper_photo.pk, 1: dup_photo.pk})
+
@@ -0,0 +1,74 @@
+import math
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+from PIL import Image, ImageChops, ImageStat
+
+from core.benchmarks import synthetic_photo
+from core.layouts import center_crop_box
+from core.rendering import _decode_plan, load_slot_image
+
+# Đo được 53.5–54 dB (JPEG draft) và ~56.5 dB (Image.reduce) trên ảnh giả lập 3000x2250
+PSNR_FLOOR_DB = 52
+SLOT_SIZES = [(300, 450), (600, 500), (700, 400)]
+
+
+def psnr(a, b):
+    mse = sum(rms * rms for rms in ImageStat.Stat(ImageChops.difference(a, b)).rms) / len(a.getbands())
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def full_decode(path, slot_w, slot_h):
+    """Cách render cũ: decode đủ độ phân giải, crop rồi LANCZOS."""
+    with Image.open(path) as src:
+        img = src.convert("RGB")
+    return img.crop(center_crop_box(img.width, img.height, slot_w, slot_h)).resize(
+        (slot_w, slot_h), Image.Resampling.LANCZOS,
+    )
+
+
+class ReducedScaleDecodeTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.mkdtemp()
+        photo = synthetic_photo(3000, 2250, seed=3)
+        cls.jpeg = os.path.join(cls.tmp, "photo.jpg")
+        cls.png = os.path.join(cls.tmp, "photo.png")
+        photo.save(cls.jpeg, "JPEG", quality=92)
+        photo.save(cls.png, "PNG", compress_level=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_jpeg_uses_draft(self):
+        with Image.open(self.jpeg) as src:
+            _, _, _, draft_size = _decode_plan(src, 300, 450)
+        self.assertIsNotNone(draft_size)
+        # Vẫn còn ít nhất REDUCING_GAP lần so với slot
+        self.assertGreaterEqual(draft_size[1], 2 * 450)
+        with Image.open(self.jpeg) as src:
+            self.assertIsNone(_decode_plan(src, 1000, 1500)[3])
+
+    def test_quality_against_full_decode(self):
+        for path in (self.jpeg, self.png):
+            for slot_w, slot_h in SLOT_SIZES:
+                with self.subTest(path=os.path.basename(path), slot=(slot_w, slot_h)):
+                    out = load_slot_image(path, slot_w, slot_h)
+                    self.assertEqual(out.size, (slot_w, slot_h))
+                    self.assertGreaterEqual(psnr(out, full_decode(path, slot_w, slot_h)), PSNR_FLOOR_DB)
+
+    def test_exif_orientation(self):
+        path = os.path.join(self.tmp, "rotated.jpg")
+        exif = Image.Exif()
+        exif[0x0112] = 6  # xoay 90° khi hiển thị
+        Image.new("RGB", (400, 300), (10, 200, 10)).save(path, "JPEG", exif=exif)
+        # Ảnh hiển thị là 300x400 (dọc): slot dọc không phải crop
+        with Image.open(path) as src:
+            img_w, img_h, box, _ = _decode_plan(src, 30, 40)
+        self.assertEqual((img_w, img_h, box), (300, 400, (0, 0, 300, 400)))
+        self.assertEqual(load_slot_image(path, 30, 40).size, (30, 40))
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from core.remote_storage import (
+    FIREBASE_BATCH_SIZE, FirebaseStorage, LocalStorage, StorageError, create_storage,
+)
+from core.tests.base import FlakyStorage
+
+
+class StorageTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.source = os.path.join(self.tmp, "source.jpg")
+        with open(self.source, "wb") as f:
+            f.write(b"jpeg")
+
+
+class LocalStorageTests(StorageTestMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = LocalStorage(os.path.join(self.tmp, "bucket"), "http://lan.test/")
+
+    def test_roundtrip(self):
+        url = self.storage.upload("renders/session_0923/a b.jpg", self.source, "image/jpeg")
+        self.assertEqual(url, "http://lan.test/renders/session_0923/a%20b.jpg")
+        self.storage.upload("renders/session_0924/c.jpg", self.source)
+        self.assertTrue(self.storage.exists("renders/session_0923/a b.jpg"))
+
+        objects = self.storage.list(prefix="renders/session_0923/")
+        self.assertEqual([(obj.name, obj.size, obj.url) for obj in objects], [("renders/session_0923/a b.jpg", 4, url)])
+        self.assertEqual(len(self.storage.list(prefix="renders/")), 2)
+
+        self.storage.delete("renders/session_0923/a b.jpg")
+        self.storage.delete("renders/session_0923/a b.jpg")  # không lỗi nếu đã xóa
+        self.assertFalse(self.storage.exists("renders/session_0923/a b.jpg"))
+
+    def test_rejects_names_outside_root(self):
+        with self.assertRaises(StorageError):
+            self.storage.upload("../escape.jpg", self.source)
+
+    def test_hidden_temp_files_not_listed(self):
+        os.makedirs(os.path.join(self.tmp, "bucket", "renders"))
+        open(os.path.join(self.tmp, "bucket", "renders", ".a.jpg.123.456"), "wb").close()
+        self.assertEqual(self.storage.list(prefix="renders/"), [])
+
+
+class BulkUploadTests(StorageTestMixin, SimpleTestCase):
+    def test_upload_many_reports_per_file(self):
+        storage = FlakyStorage(failures=1)
+        results = storage.upload_many([(name, self.source, "image/jpeg") for name in ("a.jpg", "b.jpg")])
+        errors = [name for name, result in results.items() if isinstance(result, Exception)]
+        self.assertEqual(len(errors), 1)
+        ok = ({"a.jpg", "b.jpg"} - set(errors)).pop()
+        self.assertEqual(results[ok], f"https://bucket.test/{ok}")
+        self.assertEqual(storage.delete_many(["a.jpg", "b.jpg"]), {"a.jpg": None, "b.jpg": None})
+        self.assertEqual(storage.list(), [])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(StorageError):
+            create_storage("ftp")
+
+
+class FakeBucket:
+    """Bucket giả: mỗi batch ghi lại số object, trả status theo `statuses`."""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.batches = []
+        self.client = SimpleNamespace(batch=self.batch)
+
+    @contextmanager
+    def batch(self, raise_exception=True):
+        batch = SimpleNamespace(names=[], _responses=[])
+        self.batches.append(batch)
+        yield batch
+        batch._responses = [SimpleNamespace(status_code=self.statuses.get(name, 204)) for name in batch.names]
+
+    def blob(self, name):
+        return SimpleNamespace(delete=lambda: self.batches[-1].names.append(name))
+
+
+class FirebaseDeleteManyTests(SimpleTestCase):
+    def test_batches_and_statuses(self):
+        names = [f"renders/{i}.jpg" for i in range(FIREBASE_BATCH_SIZE + 1)]
+        storage = FirebaseStorage.__new__(FirebaseStorage)
+        storage.bucket = FakeBucket({names[0]: 404, names[1]: 500})
+
+        results = storage.delete_many(names)
+
+        self.assertEqual([len(batch.names) for batch in storage.bucket.batches], [FIREBASE_BATCH_SIZE, 1])
+        self.assertIsNone(results[names[0]])  # 404 = đã xóa
+        self.assertIsInstance(results[names[1]], StorageError)
+        self.assertTrue(all(results[name] is None for name in names[2:]))
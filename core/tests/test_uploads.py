@@ -0,0 +1,118 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.checks import Error, Warning
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from core.checks import public_url_check
+from core.models import PendingUpload, Session
+from core.tests.base import MediaTestCase
+from core.uploads import due_upload_ids, enqueue_upload, process_upload, publish_render, requeue_stale_uploads, retry_delay
+
+
+@override_settings(UPLOAD_RETRY_BASE_SECONDS=5, UPLOAD_RETRY_MAX_SECONDS=60, UPLOAD_MAX_ATTEMPTS=3)
+class UploadOutboxTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = Session.objects.create(phone="0906")
+        self.rendered = self.make_render(self.session)
+
+    def test_retry_delay(self):
+        for attempts, base in ((1, 5), (2, 10), (3, 20), (4, 40), (10, 60)):
+            delay = retry_delay(attempts)
+            self.assertGreaterEqual(delay, base * 0.8)
+            self.assertLessEqual(delay, base * 1.2)
+
+    def test_retry_until_uploaded(self):
+        self.storage.failures = 1
+        upload = enqueue_upload(self.rendered)
+        before = timezone.now()
+        self.assertIsNone(process_upload(upload.id))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, PendingUpload.STATUS_PENDING)
+        self.assertEqual(upload.attempts, 1)
+        self.assertIn("network down", upload.last_error)
+        self.assertGreaterEqual(upload.next_attempt_at, before + timedelta(seconds=4))
+        # Chưa tới hạn retry → worker chưa lấy
+        self.assertNotIn(upload.id, due_upload_ids())
+        with mock.patch("core.uploads.timezone.now", return_value=upload.next_attempt_at):
+            self.assertIn(upload.id, due_upload_ids())
+
+        url = process_upload(upload.id)
+        self.assertEqual(url, f"https://bucket.test/{upload.remote_path}")
+        self.assertTrue(self.storage.exists(upload.remote_path))
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.attempts, upload.last_error), (PendingUpload.STATUS_DONE, 2, ""))
+        self.rendered.refresh_from_db()
+        self.session.refresh_from_db()
+        self.assertEqual(self.rendered.remote_url, url)
+        self.assertEqual(self.rendered.remote_path, upload.remote_path)
+        self.assertTrue(self.rendered.qr_code)
+        self.assertEqual(self.session.download_url, url)
+        # Đã xong: không upload lại
+        self.assertIsNone(process_upload(upload.id))
+
+    def test_gives_up(self):
+        self.storage.failures = 10
+        upload = enqueue_upload(self.rendered)
+        for _ in range(3):
+            PendingUpload.objects.filter(pk=upload.pk).update(next_attempt_at=timezone.now())
+            self.assertIsNone(process_upload(upload.id))
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.attempts), (PendingUpload.STATUS_FAILED, 3))
+        self.assertIsNone(process_upload(upload.id))
+
+
+    def test_publish_render_falls_back_to_local_url(self):
+        self.storage.failures = 1
+        url = publish_render(self.rendered)
+        self.assertEqual(url, f"http://kiosk.test{self.rendered.web_url}")
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.download_url, url)
+        self.assertTrue(self.rendered.qr_code)
+        self.assertEqual(PendingUpload.objects.get().status, PendingUpload.STATUS_PENDING)
+
+    def test_requeue_only_stale_uploads(self):
+        # Entry chờ trong outbox lâu hơn ngưỡng stale rồi mới được nhận
+        upload = enqueue_upload(self.rendered)
+        PendingUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        def upload_while_requeueing(name, path, content_type=None):
+            self.assertEqual(requeue_stale_uploads(older_than=timedelta(minutes=10)), 0)
+            return self.storage.public_url(name)
+
+        with mock.patch.object(self.storage, "upload", side_effect=upload_while_requeueing):
+            self.assertIsNotNone(process_upload(upload.id))
+
+        # Worker chết giữa chừng → quá ngưỡng thì trả về pending
+        PendingUpload.objects.filter(pk=upload.pk).update(
+            status=PendingUpload.STATUS_UPLOADING, updated_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(requeue_stale_uploads(older_than=timedelta(minutes=10)), 1)
+
+
+class PublicUrlCheckTests(SimpleTestCase):
+    def check(self, **overrides):
+        with override_settings(**overrides):
+            return [(type(message), message.id) for message in public_url_check(None)]
+
+    def test_lan_address(self):
+        self.assertEqual(self.check(
+            UPLOAD_BACKEND="local", PUBLIC_BASE_URL="http://192.168.1.10:8000",
+            UPLOAD_LOCAL_URL="http://192.168.1.10:8000/media/bucket/",
+        ), [])
+
+    def test_local_backend_requires_reachable_url(self):
+        for url in ("", "http://127.0.0.1:8000/media/bucket/", "http://localhost/media/bucket/", "/media/bucket/"):
+            with self.subTest(url=url):
+                messages = self.check(UPLOAD_BACKEND="local", PUBLIC_BASE_URL="", UPLOAD_LOCAL_URL=url)
+                self.assertIn((Error, "core.E001"), messages)
+                self.assertIn((Warning, "core.W001"), messages)
+
+    def test_remote_backend_only_warns(self):
+        self.assertEqual(
+            self.check(UPLOAD_BACKEND="firebase", PUBLIC_BASE_URL="http://127.0.0.1:8000", UPLOAD_LOCAL_URL=""),
+            [(Warning, "core.W001")],
+        )
@@ -0,0 +1,76 @@
+"""
+Thumbnail nhỏ cho admin của Frame, tạo lúc lưu frame (signal) chứ không phải
+lúc mở changelist. Photo / RenderedPhoto đã có field thumbnail tạo cùng bản
+phái sinh (core/derivatives.py, core/rendering.py), admin đọc thẳng field đó.
+
+File media không bao giờ bị ghi đè (upload lại → tên file mới), nên key
+= tên file + kích thước; thumbnail lưu trong storage ở thumbs/admin/.
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from pillow_heif import register_heif_opener
+
+logger = logging.getLogger(__name__)
+
+register_heif_opener()
+
+ADMIN_THUMB_SIZE = 120
+THUMB_QUALITY = 75
+
+
+def thumbnail_name(source_name, size):
+    digest = hashlib.sha1(f"{source_name}:{size}".encode()).hexdigest()[:24]
+    return f"thumbs/admin/{digest}_{size}.jpg"
+
+
+def _make_thumbnail(field_file, size):
+    with field_file.open("rb") as f, Image.open(f) as src:
+        if src.format == "JPEG":
+            src.draft("RGB", (size, size))
+        img = ImageOps.exif_transpose(src)
+        if img.mode in ("RGBA", "LA", "P"):
+            # Frame PNG trong suốt: đặt lên nền trắng giống bản in
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        img = img.convert("RGB")
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=THUMB_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def build_thumbnail(field_file, size=ADMIN_THUMB_SIZE):
+    """Tạo thumbnail cho một ImageField file nếu chưa có; trả về tên file, None nếu không đọc được."""
+    if not field_file:
+        return None
+    name = thumbnail_name(field_file.name, size)
+    if not default_storage.exists(name):
+        try:
+            data = _make_thumbnail(field_file, size)
+        except Exception as e:
+            logger.warning("Could not build thumbnail for %s: %s", field_file.name, e)
+            return None
+        saved = default_storage.save(name, ContentFile(data))
+        if saved != name:
+            # Process khác vừa tạo cùng thumbnail
+            default_storage.delete(saved)
+    return name
+
+
+def delete_thumbnail(source_name, size=ADMIN_THUMB_SIZE):
+    if source_name:
+        default_storage.delete(thumbnail_name(source_name, size))
+
+
+def thumbnail_url(field_file, size=ADMIN_THUMB_SIZE):
+    """URL thumbnail đã tạo sẵn (không kiểm tra / tạo file trong request)."""
+    if not field_file:
+        return None
+    return default_storage.url(thumbnail_name(field_file.name, size))
@@ -0,0 +1,194 @@
+"""
+Outbox upload ảnh render lên object store (core/remote_storage.py: Firebase,
+thư mục local / server LAN, hoặc bộ nhớ khi test).
+
+Mỗi RenderedPhoto cần upload được ghi thành một PendingUpload trước. Worker
+(thread pool, dùng chung một bucket/client) upload, retry với backoff khi
+lỗi mạng, và khi có URL thật thì cập nhật Session.download_url + mã QR.
+Trong lúc chờ, QR trỏ về URL local (PUBLIC_BASE_URL) của kiosk.
+"""
+import logging
+import mimetypes
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .remote_storage import get_storage, render_remote_path
+from .metrics import span
+from .models import PendingUpload
+from .qr import qr_file
+
+logger = logging.getLogger(__name__)
+
+
+def local_render_url(rendered):
+    """URL tải ảnh qua mạng LAN của kiosk (dùng khi chưa upload được)."""
+    return f"{settings.PUBLIC_BASE_URL.rstrip('/')}{rendered.web_url}"
+
+
+def remote_path_for(rendered):
+    """Path trên bucket của bản web (render cũ chưa có bản web: bản in)."""
+    ext = os.path.splitext(rendered.web_file.name)[1] or ".jpg"
+    return render_remote_path(rendered.session.phone, f"{rendered.session.phone}_{rendered.id}{ext}")
+
+
+def legacy_remote_path(rendered):
+    """Path của code cũ (trước bản web): luôn là .jpg, bất kể RENDER_WEB_FORMAT."""
+    return render_remote_path(rendered.session.phone, f"{rendered.session.phone}_{rendered.id}.jpg")
+
+
+def enqueue_upload(rendered):
+    # Khách mở link trên điện thoại: upload bản web, không phải bản in 300 DPI.
+    # next_attempt_at lùi lại một chút: publish_render tự thử lần đầu,
+    # worker outbox chỉ nhận các lần retry
+    return PendingUpload.objects.create(
+        rendered=rendered,
+        remote_path=remote_path_for(rendered),
+        content_type=mimetypes.guess_type(rendered.web_file.name)[0] or "image/jpeg",
+        next_attempt_at=timezone.now() + timedelta(seconds=settings.UPLOAD_RETRY_BASE_SECONDS),
+    )
+
+
+def publish_url(rendered, url):
+    """Gắn URL tải ảnh cho render: QR mới + download_url của session (nếu là render mới nhất)."""
+    session = rendered.session
+    with span("db"):
+        is_latest = not session.renders.filter(created_at__gt=rendered.created_at).exists()
+        if is_latest:
+            session.download_url = url
+            session.save(update_fields=["download_url"])
+
+    # File QR content-addressed: cùng URL dùng chung một file, không xóa bản cũ
+    rendered.qr_code.name = qr_file(url)
+    with span("db"):
+        rendered.save(update_fields=["qr_code"])
+
+
+def retry_delay(attempts):
+    """Exponential backoff có jitter, giới hạn bởi UPLOAD_RETRY_MAX_SECONDS."""
+    delay = min(settings.UPLOAD_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), settings.UPLOAD_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def process_upload(upload_id):
+    """Upload một entry của outbox. Trả về public URL hoặc None nếu lỗi/đã bị worker khác nhận."""
+    claimed = PendingUpload.objects.filter(
+        pk=upload_id, status=PendingUpload.STATUS_PENDING,
+    ).update(
+        # updated_at = lúc nhận: requeue_stale_uploads dựa vào nó, .update() không tự ghi auto_now
+        status=PendingUpload.STATUS_UPLOADING, attempts=F("attempts") + 1, updated_at=timezone.now(),
+    )
+    if not claimed:
+        return None
+
+    upload = PendingUpload.objects.select_related("rendered__session").get(pk=upload_id)
+    rendered = upload.rendered
+    try:
+        logger.info("Uploading to: %s", upload.remote_path)
+        with span("upload"):
+            url = get_storage().upload(upload.remote_path, rendered.web_file.path, content_type=upload.content_type)
+    except Exception as e:
+        logger.warning("Upload error (%s, attempt %s): %s", upload.remote_path, upload.attempts, e)
+        gave_up = upload.attempts >= settings.UPLOAD_MAX_ATTEMPTS
+        upload.status = PendingUpload.STATUS_FAILED if gave_up else PendingUpload.STATUS_PENDING
+        upload.last_error = str(e)
+        upload.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(upload.attempts))
+        upload.save(update_fields=["status", "last_error", "next_attempt_at", "updated_at"])
+        return None
+
+    with span("db"):
+        upload.status = PendingUpload.STATUS_DONE
+        upload.public_url = url
+        upload.last_error = ""
+        upload.save(update_fields=["status", "public_url", "last_error", "updated_at"])
+
+        # Ghi vào index trong DB: trang download đọc từ đây, không list bucket
+        rendered.remote_path = upload.remote_path
+        rendered.remote_url = url
+        rendered.uploaded_at = timezone.now()
+        rendered.save(update_fields=["remote_path", "remote_url", "uploaded_at"])
+
+    try:
+        publish_url(rendered, url)
+    except Exception:
+        logger.exception("Could not publish URL for render %s", rendered.id)
+
+    logger.info("Upload successful: %s", url)
+    return url
+
+
+def publish_render(rendered):
+    """
+    Ghi render vào outbox và thử upload ngay một lần. Lỗi thì QR tạm trỏ
+    về URL local; worker outbox sẽ retry và cập nhật QR sau.
+    """
+    upload = enqueue_upload(rendered)
+    url = process_upload(upload.id)
+    if url:
+        return url
+
+    url = local_render_url(rendered)
+    logger.warning("Upload pending, using local URL for now: %s", url)
+    publish_url(rendered, url)
+    return url
+
+
+def due_upload_ids(limit=None):
+    qs = PendingUpload.objects.filter(
+        status=PendingUpload.STATUS_PENDING,
+        next_attempt_at__lte=timezone.now(),
+    ).order_by("next_attempt_at").values_list("id", flat=True)
+    return list(qs[:limit] if limit else qs)
+
+
+def requeue_stale_uploads(older_than=timedelta(minutes=10)):
+    """Entry kẹt ở trạng thái uploading (worker chết giữa chừng) → pending."""
+    return PendingUpload.objects.filter(
+        status=PendingUpload.STATUS_UPLOADING,
+        updated_at__lt=timezone.now() - older_than,
+    ).update(status=PendingUpload.STATUS_PENDING)
+
+
+def _process_in_thread(upload_id):
+    try:
+        return process_upload(upload_id)
+    except Exception:
+        logger.exception("Upload %s crashed", upload_id)
+        return None
+    finally:
+        # Mỗi thread có connection riêng, đóng lại sau khi xong
+        connection.close()
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_WORKERS, thread_name_prefix="upload")
+    return _executor
+
+
+def drain_outbox(limit=None):
+    """Upload song song mọi entry đã tới hạn; trả về số entry upload thành công."""
+    ids = due_upload_ids(limit)
+    if not ids:
+        return 0
+    results = list(get_executor().map(_process_in_thread, ids))
+    return sum(1 for url in results if url)
+
+
+def drain_forever(poll_interval=2.0, stop=None):
+    requeue_stale_uploads()
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        if not drain_outbox():
+            time.sleep(poll_interval)
@@ -17,11 +17,18 @@ urlpatterns = [
     path("session/<str:phone>/frame-selection/", views.frame_selection, name="frame_selection"),
     path("session/<str:phone>/slot-manager/", views.slot_manager, name="slot_manager"),
     path("session/<str:phone>/upload/", views.upload_photo, name="upload_photo"),
+    path("session/<str:phone>/uploads/", views.chunked_upload_start, name="chunked_upload_start"),
+    path("session/<str:phone>/uploads/<uuid:upload_id>/", views.chunked_upload, name="chunked_upload"),
     path("session/<str:phone>/assign-slot/", views.assign_photo_to_slot, name="assign_slot"),
     path("session/<str:phone>/remove-slot/", views.remove_photo_from_slot, name="remove_slot"),
     path("session/<str:phone>/preview-frame/", views.preview_frame_live, name="preview_frame_live"),
+    path("session/<str:phone>/preview-image/", views.frame_preview_image, name="frame_preview_image"),
     path("session/<str:phone>/finalize-render/", views.finalize_render, name="finalize_render"),
+    path("session/<str:phone>/render-status/<int:job_id>/", views.render_job_status, name="render_job_status"),
     
     # Download Page
     path("d/<str:phone>/", views.download_session, name="download_session"),
+    
+    # Monitoring (Prometheus)
+    path("metrics/", views.metrics, name="metrics"),
 ]
@@ -1,94 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Session, Photo, Frame, RenderedPhoto, PhotoSlot
-from django.core.files.base import ContentFile
-from django.http import HttpResponse, JsonResponse
-from django.views.decorators.http import require_POST, require_http_methods
-from PIL import Image
-from io import BytesIO
-from pillow_heif import register_heif_opener
-from firebase_admin import storage
-import qrcode
-import zipfile
+from .models import Session, Photo, Frame, PhotoSlot, RenderJob, ChunkedUpload
+from .derivatives import create_photo
+from .chunked_uploads import ChunkError, start_upload, write_chunk
+from .qr import qr_svg
+from .uploads import publish_render
+from .downloads import session_zip_sources, stream_zip
+from .fingerprints import render_fingerprint
+from .previews import PREVIEW_FORMATS, get_preview, preview_key, quantize_scale, slot_photos_for
+from .metrics import render_metrics
+from .printing import prepare_print_job, request_print
+from .retention import delete_photo as delete_photo_files
+from .jobs import claim_job, enqueue_render, run_render_job, job_status_payload, save_render
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+from django.utils.cache import get_conditional_response, patch_cache_control
 import os
 import json
+import logging
 
-# Đăng ký hỗ trợ HEIC/HEIF
-register_heif_opener()
-
-# ====== FIREBASE UPLOAD FUNCTION ======
-def upload_to_firebase(file_bytes, file_name, session_phone):
-    """
-    Upload file to Firebase Storage organized by session folder
-    Path: renders/session_{phone}/{file_name}
-    """
-    try:
-        bucket = storage.bucket()
-        
-        # Organize by session folder
-        folder_path = f"renders/session_{session_phone}/{file_name}"
-        print(f"📁 Uploading to: {folder_path}")
-        
-        blob = bucket.blob(folder_path)
-        blob.upload_from_string(file_bytes, content_type='image/jpeg')
-        blob.make_public()
-        
-        print(f"✅ Upload successful: {blob.public_url}")
-        return blob.public_url
-    except Exception as e:
-        print(f"❌ Firebase upload error: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
-
-# ====== QR CODE GENERATION FUNCTION ======
-def generate_qr_code(url):
-    """Tạo mã QR từ URL và trả về BytesIO object"""
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(url)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    return buffer
-
-# ====== FIREBASE LIST FILES FUNCTION ======
-def list_firebase_files(session_phone):
-    """
-    Lấy danh sách tất cả file ảnh từ Firebase Storage theo session
-    Returns: list of dicts with 'name', 'url', 'created_at'
-    """
-    try:
-        bucket = storage.bucket()
-        prefix = f"renders/session_{session_phone}/"
-        
-        print(f"🔍 Listing files from Firebase: {prefix}")
-        blobs = bucket.list_blobs(prefix=prefix)
-        
-        files = []
-        for blob in blobs:
-            # Chỉ lấy file ảnh, bỏ qua folder
-            if blob.name.endswith(('.jpg', '.jpeg', '.png')):
-                blob.make_public()  # Đảm bảo public
-                files.append({
-                    'name': blob.name.split('/')[-1],  # Lấy tên file
-                    'url': blob.public_url,
-                    'created_at': blob.time_created,
-                })
-        
-        print(f"✅ Found {len(files)} files in Firebase")
-        return sorted(files, key=lambda x: x['created_at'], reverse=True)
-    except Exception as e:
-        print(f"❌ Firebase list error: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
+logger = logging.getLogger(__name__)
 
 # Create your views here.
 def home(request):
@@ -108,15 +41,11 @@ def session_photos(request, phone):
 
     if request.method == "POST" and request.FILES.getlist("photos"):
         for img in request.FILES.getlist("photos"):
-            Photo.objects.create(session=session, image=img)
+            create_photo(session, img)
         return redirect(f"/session/{phone}/photos/")
 
-    frames = Frame.objects.filter(active=True)
+    frames = Frame.objects.filter(active=True).only('id', 'name', 'image', 'slot_count')
     photos = session.photos.all()
-    
-    # Thêm thông tin số slot cho mỗi frame
-    for frame in frames:
-        frame.max_slots = len(frame.layout_json.get("slots", []))
 
     return render(request, "core/session_photos.html", {
         "session": session,
@@ -134,14 +63,12 @@ def render_frame_view(request, phone):
         frame = Frame.objects.get(id=frame_id)
         
         # Kiểm tra số lượng ảnh
-        max_slots = len(frame.layout_json.get("slots", []))
+        max_slots = frame.slot_count
         photos = list(session.photos.all())
         
         if len(photos) < max_slots:
             # Chưa đủ ảnh, quay lại với thông báo
-            frames = Frame.objects.filter(active=True)
-            for f in frames:
-                f.max_slots = len(f.layout_json.get("slots", []))
+            frames = Frame.objects.filter(active=True).only('id', 'name', 'image', 'slot_count')
             
             return render(request, "core/session_photos.html", {
                 "session": session,
@@ -153,165 +80,82 @@ def render_frame_view(request, phone):
         # Lấy ảnh session (chỉ lấy đúng số lượng slot)
         photos = photos[:max_slots]
 
-        print(f"🎨 Starting render for phone: {phone}, frame: {frame.id}")
-        final_image = render_frame(photos, frame)
-        
-        # Đọc buffer một lần và lưu vào biến
-        image_bytes = final_image.getvalue()
-        print(f"📦 Image bytes size: {len(image_bytes)}")
-
-        # Lưu thành RenderedPhoto
-        rendered = RenderedPhoto(session=session, frame=frame)
-        file_name = f"render_{phone}_{frame.id}.jpg"
-        rendered.image.save(file_name, ContentFile(image_bytes))
-        rendered.save()
-        print(f"💾 RenderedPhoto saved with ID: {rendered.id}")
+        logger.info("Starting render for phone: %s, frame: %s", phone, frame.id)
+        # Ghép + lưu thành RenderedPhoto (encode thẳng vào file)
+        rendered = save_render(session, frame, photos, render_fingerprint(frame, photos))
+        logger.info("RenderedPhoto saved with ID: %s", rendered.id)
 
+        # ==== UPLOAD (outbox, tự retry) + TẠO MÃ QR ====
         try:
-            # ==== UPLOAD TO FIREBASE ====
-            firebase_file = f"{phone}_{rendered.id}.jpg"
-            print(f"🔄 Uploading to Firebase: renders/session_{phone}/{firebase_file}")
-            firebase_url = upload_to_firebase(image_bytes, firebase_file, phone)
-            print(f"📡 Firebase URL: {firebase_url}")
-
-            # Nếu Firebase fail, dùng local URL
-            if not firebase_url:
-                print("⚠️  Firebase upload failed, using local URL instead")
-                # Tạo local URL (sẽ hoạt động trong local network)
-                firebase_url = f"http://127.0.0.1:8000{rendered.image.url}"
-                print(f"🔗 Using local URL: {firebase_url}")
-
-            # Lưu URL vào session
-            session.download_url = firebase_url
-            session.save()
-            print(f"✅ Session download_url saved: {firebase_url}")
-
-            # ==== TẠO MÃ QR ====
-            print(f"🔄 Generating QR code for: {firebase_url}")
-            qr_buffer = generate_qr_code(firebase_url)
-            qr_file_name = f"qr_{phone}_{rendered.id}.png"
-            
-            # Lưu QR code vào RenderedPhoto
-            print(f"💾 Saving QR code: {qr_file_name}")
-            rendered.qr_code.save(qr_file_name, ContentFile(qr_buffer.read()))
-            rendered.save()  # Save lại để lưu QR code
-            print(f"✅ QR code saved successfully!")
-            print(f"📂 QR path: {rendered.qr_code.name if rendered.qr_code else 'None'}")
-        except Exception as e:
-            print(f"❌ Error in Firebase/QR process: {e}")
-            import traceback
-            traceback.print_exc()
+            download_url = publish_render(rendered)
+            logger.info("Session download_url saved: %s", download_url)
+        except Exception:
+            logger.exception("Error in upload/QR process")
 
         return redirect(f"/session/{phone}/preview/")
 
     return redirect(f"/session/{phone}/photos/")
 
 
-# ====== FUNCTION GHÉP FRAME ======
-def render_frame(list_photos, frame_obj):
-    layout = frame_obj.layout_json
-    frame_path = frame_obj.image.path
-
-    # Canvas theo kích thước frame
-    canvas_w = layout.get("w", 1200)
-    canvas_h = layout.get("h", 1800)
-    
-    # Bước 1: Tạo canvas nền trắng
-    canvas = Image.new("RGBA", (canvas_w, canvas_h), (255, 255, 255, 255))
-    
-    # Bước 2: Mở frame PNG và paste TRƯỚC
-    frame_png = Image.open(frame_path).convert("RGBA")
-    if frame_png.size != (canvas_w, canvas_h):
-        frame_png = frame_png.resize((canvas_w, canvas_h), Image.Resampling.LANCZOS)
-    
-    # Paste frame lên canvas (frame là layer dưới)
-    canvas.paste(frame_png, (0, 0), frame_png)
-    
-    # Bước 3: Paste các ảnh vào slots với crop center đúng chuẩn
-    for idx, slot in enumerate(layout["slots"]):
-        if idx >= len(list_photos):
-            break
-
-        img_path = list_photos[idx].image.path
-        img = Image.open(img_path).convert("RGB")
-        
-        # Lấy kích thước slot
-        slot_w = slot["w"]
-        slot_h = slot["h"]
-        slot_ratio = slot_w / slot_h
-        
-        # Lấy kích thước ảnh gốc
-        img_w, img_h = img.size
-        img_ratio = img_w / img_h
-        
-        # B1: Crop center theo tỷ lệ slot
-        if img_ratio > slot_ratio:
-            # Ảnh rộng hơn → crop chiều rộng
-            new_w = int(img_h * slot_ratio)
-            new_h = img_h
-            left = (img_w - new_w) // 2
-            top = 0
-            right = left + new_w
-            bottom = img_h
-        else:
-            # Ảnh cao hơn → crop chiều cao
-            new_w = img_w
-            new_h = int(img_w / slot_ratio)
-            left = 0
-            top = (img_h - new_h) // 2
-            right = img_w
-            bottom = top + new_h
-        
-        cropped = img.crop((left, top, right, bottom))
-        
-        # B2: Resize đúng kích thước slot
-        resized = cropped.resize((slot_w, slot_h), Image.Resampling.LANCZOS)
-        
-        # B3: Paste vào đúng vị trí
-        canvas.paste(resized, (slot["x"], slot["y"]))
-
-    # Bước 4: Xuất file JPG
-    buffer = BytesIO()
-    canvas.convert("RGB").save(buffer, format="JPEG", quality=95, dpi=(300, 300))
-    buffer.seek(0)
-    return buffer
-
-
 def session_preview(request, phone):
     # Màn hình xem ảnh đã render
     session = Session.objects.get(phone=phone)
     renders = session.renders.all().order_by('-created_at')
+    # Job đang chạy (vừa bấm ghép ảnh) → trang sẽ polling rồi tải lại
+    pending_job = session.render_jobs.filter(status__in=RenderJob.ACTIVE_STATUSES).order_by('-created_at').first()
+    # Chỉ đọc: PrintJob tạo lúc render xong (jobs._finish_job) hoặc khi bấm in (POST print_photo),
+    # không tạo khi GET (prefetch / tải lại trang không được làm spooler rasterize)
     return render(request, "core/session_preview.html", {
         "phone": phone,
         "session": session,
         "renders": renders,
+        "pending_job": pending_job,
     })
 
 def print_photo(request, phone):
-    # Mock: mô phỏng in ảnh
-    session = Session.objects.get(phone=phone)
+    # POST: tạo/lấy PrintJob của render mới nhất rồi gửi lệnh in
+    # (raster thường đã chuẩn bị sẵn lúc render xong)
+    # GET: trang xác nhận + trạng thái lệnh in
+    session = get_object_or_404(Session, phone=phone)
     latest_render = session.renders.order_by('-created_at').first()
     
+    if request.method == "POST":
+        # Đang ghép ảnh mới → render mới nhất chưa phải ảnh khách vừa chọn, không in
+        if session.render_jobs.filter(status__in=RenderJob.ACTIVE_STATUSES).exists():
+            return redirect(f"/session/{phone}/preview/")
+        if latest_render:
+            request_print(prepare_print_job(latest_render))
+        return redirect(f"/session/{phone}/print/")
+    
+    print_job = None
+    if latest_render:
+        print_job = latest_render.print_jobs.exclude(requested_at=None).order_by('-requested_at').first()
+    
     return render(request, "core/print_confirm.html", {
         "phone": phone,
         "render": latest_render,
+        "print_job": print_job,
     })
 
 def delete_photo(request, phone, photo_id):
     # Xóa ảnh đã upload
     photo = Photo.objects.get(id=photo_id, session__phone=phone)
-    photo.image.delete()  # Xóa file trên disk
-    photo.delete()  # Xóa record trong DB
+    delete_photo_files(photo)  # Xóa record + file trên disk (trừ file Photo khác còn dùng)
     return redirect(f"/session/{phone}/photos/")
 
 def download_session(request, phone):
-    """Trang tải tất cả ảnh của session - lấy từ Firebase Storage"""
+    """Trang tải tất cả ảnh của session - đọc từ index trong DB (render đã upload)"""
     try:
         # Lấy session (hoặc tạo mới nếu chưa có)
         session, created = Session.objects.get_or_create(phone=phone)
         
-        # Lấy danh sách file từ Firebase
-        firebase_files = list_firebase_files(phone)
+        # Render đã upload (remote_path/remote_url ghi lúc upload, không list bucket)
+        uploaded_renders = list(session.renders.exclude(remote_url="").order_by('-created_at'))
+        firebase_files = [{
+            'name': os.path.basename(r.remote_path),
+            'url': r.remote_url,
+            'created_at': r.uploaded_at or r.created_at,
+        } for r in uploaded_renders]
         
         # Nếu request download ZIP
         if request.GET.get('download') == 'zip':
@@ -319,51 +163,32 @@ def download_session(request, phone):
             if not firebase_files:
                 return redirect(f"/d/{phone}/")
             
-            # Tạo ZIP file trong memory từ Firebase URLs
-            import requests
-            zip_buffer = BytesIO()
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for idx, file_info in enumerate(firebase_files, 1):
-                    try:
-                        # Download ảnh từ Firebase
-                        response = requests.get(file_info['url'], timeout=10)
-                        if response.status_code == 200:
-                            # Thêm vào ZIP với tên đẹp
-                            zip_file.writestr(f"photo_{idx}.jpg", response.content)
-                            print(f"✅ Added to ZIP: {file_info['name']}")
-                    except Exception as e:
-                        print(f"❌ Error downloading {file_info['name']}: {e}")
-            
-            # Trả về ZIP file
-            zip_buffer.seek(0)
-            response = HttpResponse(zip_buffer.read(), content_type='application/zip')
+            # Stream ZIP (không nén lại JPEG), ảnh có bản local thì đọc từ đĩa
+            sources = session_zip_sources(uploaded_renders)
+            response = StreamingHttpResponse(stream_zip(sources), content_type='application/zip')
             response['Content-Disposition'] = f'attachment; filename="session_{phone}_photos.zip"'
             return response
         
         # Generate QR code cho download page
         download_url = f"{request.scheme}://{request.get_host()}/d/{phone}/"
-        qr_code_url = None
+        qr_code_svg = None
         if firebase_files:
             try:
-                qr_buffer = generate_qr_code(download_url)
-                # Convert to base64 để hiển thị trực tiếp
-                import base64
-                qr_code_url = "data:image/png;base64," + base64.b64encode(qr_buffer.read()).decode()
+                # SVG nhúng thẳng vào trang, memoize theo URL (không encode lại mỗi lần xem)
+                qr_code_svg = mark_safe(qr_svg(download_url))
             except Exception as e:
-                print(f"❌ QR generation error: {e}")
+                logger.warning("QR generation error: %s", e)
         
         # Hiển thị trang download với Firebase files
         return render(request, "core/download_session.html", {
             "phone": phone,
             "session": session,
             "firebase_files": firebase_files,
-            "qr_code_url": qr_code_url,
+            "qr_code_svg": qr_code_svg,
             "download_url": download_url,
         })
-    except Exception as e:
-        print(f"❌ Download session error: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Download session error")
         return redirect('home')
 
 
@@ -388,9 +213,8 @@ def frame_selection(request, phone):
         
         return redirect(f"/session/{phone}/slot-manager/")
     
-    frames = Frame.objects.filter(active=True)
-    for frame in frames:
-        frame.slot_count = len(frame.layout_json.get("slots", []))
+    # Một query, không load layout_json (số slot đã denormalize vào slot_count)
+    frames = Frame.objects.filter(active=True).only('id', 'name', 'image', 'slot_count')
     
     return render(request, "core/frame_selection.html", {
         "session": session,
@@ -407,7 +231,6 @@ def slot_manager(request, phone):
         return redirect(f"/session/{phone}/frame-selection/")
     
     frame = session.selected_frame
-    slots_data = frame.layout_json.get("slots", [])
     
     # Lấy tất cả ảnh đã upload của session
     uploaded_photos = session.photos.all().order_by('-created_at')
@@ -420,18 +243,18 @@ def slot_manager(request, phone):
     
     # Tạo danh sách slots với thông tin gán ảnh
     slots_info = []
-    for idx, slot_data in enumerate(slots_data):
-        assigned_slot = assigned_slots.get(idx)
+    for slot in frame.layout.slots:
+        assigned_slot = assigned_slots.get(slot.index)
         slots_info.append({
-            'index': idx,
-            'position': slot_data,
+            'index': slot.index,
+            'position': slot,
             'assigned_photo': assigned_slot.photo if assigned_slot else None,
             'is_filled': assigned_slot is not None,
         })
     
     # Kiểm tra đủ ảnh chưa
     filled_count = sum(1 for s in slots_info if s['is_filled'])
-    all_filled = filled_count == len(slots_data)
+    all_filled = filled_count == frame.slot_count
     
     return render(request, "core/slot_manager.html", {
         "session": session,
@@ -441,7 +264,9 @@ def slot_manager(request, phone):
         "uploaded_photos": uploaded_photos,
         "all_filled": all_filled,
         "filled_count": filled_count,
-        "total_slots": len(slots_data),
+        "total_slots": frame.slot_count,
+        "preview_scale": settings.PREVIEW_SCALE,
+        "upload_parallel": settings.UPLOAD_PARALLEL_FILES,
     })
 
 
@@ -454,12 +279,8 @@ def upload_photo(request, phone):
     created_photos = []
     
     for img_file in uploaded_files:
-        photo = Photo.objects.create(session=session, image=img_file)
-        created_photos.append({
-            'id': photo.id,
-            'url': photo.image.url,
-            'created_at': photo.created_at.isoformat(),
-        })
+        photo = create_photo(session, img_file)
+        created_photos.append(_photo_payload(photo))
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True, 'photos': created_photos})
@@ -467,6 +288,59 @@ def upload_photo(request, phone):
     return redirect(f"/session/{phone}/slot-manager/")
 
 
+def _photo_payload(photo):
+    return {
+        'id': photo.id,
+        'url': photo.image.url,
+        'preview_url': photo.preview_url,
+        'thumbnail_url': photo.thumbnail_url,
+        'created_at': photo.created_at.isoformat(),
+    }
+
+
+def _chunked_upload_payload(upload):
+    payload = {
+        'success': True,
+        'upload_id': str(upload.id),
+        'offset': upload.offset,
+        'size': upload.size,
+        'status': upload.status,
+        'chunk_size': settings.UPLOAD_CHUNK_BYTES,
+    }
+    if upload.photo_id:
+        payload['photo'] = _photo_payload(upload.photo)
+    return payload
+
+
+@require_POST
+def chunked_upload_start(request, phone):
+    """Bắt đầu upload theo chunk: {filename, size} → upload_id"""
+    session = get_object_or_404(Session, phone=phone)
+    try:
+        data = json.loads(request.body)
+        upload = start_upload(session, data.get('filename'), data.get('size'))
+    except (ValueError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    except ChunkError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+    return JsonResponse(_chunked_upload_payload(upload), status=201)
+
+
+@require_http_methods(["GET", "PUT"])
+def chunked_upload(request, phone, upload_id):
+    """GET: offset hiện tại (để resume). PUT: nhận một chunk (Content-Range)"""
+    upload = get_object_or_404(
+        ChunkedUpload.objects.select_related('session', 'photo'), id=upload_id, session__phone=phone,
+    )
+    if request.method == "PUT":
+        try:
+            upload = write_chunk(upload, request.headers.get('Content-Range'), request)
+        except ChunkError as e:
+            upload.refresh_from_db()
+            return JsonResponse({**_chunked_upload_payload(upload), 'success': False, 'error': str(e)}, status=e.status)
+    return JsonResponse(_chunked_upload_payload(upload))
+
+
 @require_POST
 def assign_photo_to_slot(request, phone):
     """Gán ảnh vào slot cụ thể"""
@@ -484,8 +358,7 @@ def assign_photo_to_slot(request, phone):
         frame = session.selected_frame
         
         # Check slot index valid
-        slots = frame.layout_json.get("slots", [])
-        if slot_index >= len(slots):
+        if not isinstance(slot_index, int) or not 0 <= slot_index < frame.slot_count:
             return JsonResponse({'success': False, 'error': 'Invalid slot index'}, status=400)
         
         # Tạo hoặc update slot assignment
@@ -499,7 +372,7 @@ def assign_photo_to_slot(request, phone):
         return JsonResponse({
             'success': True,
             'slot_index': slot_index,
-            'photo_url': photo.image.url,
+            'photo_url': photo.preview_url,
             'photo_id': photo.id,
         })
     except Exception as e:
@@ -542,7 +415,7 @@ def preview_frame_live(request, phone):
     ).select_related('photo').order_by('slot_index')
     
     # Check đủ ảnh chưa
-    required_slots = len(frame.layout_json.get("slots", []))
+    required_slots = frame.slot_count
     has_all_photos = assigned_slots.count() == required_slots
     
     return render(request, "core/preview_frame.html", {
@@ -552,19 +425,53 @@ def preview_frame_live(request, phone):
         "assigned_slots": assigned_slots,
         "has_all_photos": has_all_photos,
         "required_slots": required_slots,
+        # Trang xem thử hiển thị lớn hơn slot manager
+        "preview_scale": min(1.0, settings.PREVIEW_SCALE * 2),
     })
 
 
+@require_GET
+def frame_preview_image(request, phone):
+    """Ảnh xem thử nhỏ do server ghép (cùng code với bản in), có ETag"""
+    session = get_object_or_404(Session.objects.select_related('selected_frame'), phone=phone)
+    frame = session.selected_frame
+    if not frame:
+        raise Http404("No frame selected")
+    
+    try:
+        # Chỉ vài scale cố định: mỗi scale khác nhau là một entry cache mới
+        scale = quantize_scale(request.GET.get('scale', settings.PREVIEW_SCALE))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid scale")
+    fmt = request.GET.get('format', 'jpeg').lower()
+    if fmt not in PREVIEW_FORMATS:
+        fmt = 'jpeg'
+    
+    slot_photos = slot_photos_for(session, frame)
+    key = preview_key(frame, slot_photos, scale, fmt)
+    etag = f'"{key}"'
+    
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    
+    data = get_preview(frame, slot_photos, scale, fmt, key=key)
+    response = HttpResponse(data, content_type=PREVIEW_FORMATS[fmt][1])
+    response['ETag'] = etag
+    # Cùng URL nhưng nội dung đổi theo slot → luôn hỏi lại server (304 nếu không đổi)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 @require_POST
 def finalize_render(request, phone):
-    """Bước 4: Ghép ảnh chính thức, tạo QR, upload Firebase"""
+    """Bước 4: Enqueue job ghép ảnh chính thức (worker render, upload Firebase, tạo QR)"""
     session = get_object_or_404(Session, phone=phone)
     
     if not session.selected_frame:
         return JsonResponse({'success': False, 'error': 'No frame selected'}, status=400)
     
     frame = session.selected_frame
-    slots_data = frame.layout_json.get("slots", [])
     
     # Lấy ảnh đã gán theo thứ tự slot
     assigned_slots = PhotoSlot.objects.filter(
@@ -572,59 +479,40 @@ def finalize_render(request, phone):
         frame=frame
     ).select_related('photo').order_by('slot_index')
     
-    if assigned_slots.count() < len(slots_data):
+    if assigned_slots.count() < frame.slot_count:
         return JsonResponse({
             'success': False,
-            'error': f'Chưa đủ ảnh. Cần {len(slots_data)} ảnh, hiện có {assigned_slots.count()}'
+            'error': f'Chưa đủ ảnh. Cần {frame.slot_count} ảnh, hiện có {assigned_slots.count()}'
         }, status=400)
     
     # Lấy danh sách Photo objects theo thứ tự slot
     photos_ordered = [slot.photo for slot in assigned_slots]
     
-    try:
-        # Render frame
-        print(f"🎨 Starting final render for {phone}")
-        final_image = render_frame(photos_ordered, frame)
-        image_bytes = final_image.getvalue()
-        
-        # Lưu RenderedPhoto
-        rendered = RenderedPhoto(session=session, frame=frame)
-        file_name = f"render_{phone}_{frame.id}_{len(session.renders.all()) + 1}.jpg"
-        rendered.image.save(file_name, ContentFile(image_bytes))
-        rendered.save()
-        
-        # Upload to Firebase
-        firebase_file = f"{phone}_{rendered.id}.jpg"
-        firebase_url = upload_to_firebase(image_bytes, firebase_file, phone)
-        
-        if not firebase_url:
-            firebase_url = f"http://127.0.0.1:8000{rendered.image.url}"
-        
-        # Lưu URL
-        session.download_url = firebase_url
-        session.save()
-        
-        # Tạo QR code
-        qr_buffer = generate_qr_code(firebase_url)
-        qr_file_name = f"qr_{phone}_{rendered.id}.png"
-        rendered.qr_code.save(qr_file_name, ContentFile(qr_buffer.read()))
-        rendered.save()
-        
-        print(f"✅ Final render completed: {rendered.id}")
-        
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return JsonResponse({
-                'success': True,
-                'render_id': rendered.id,
-                'image_url': rendered.image.url,
-                'qr_url': rendered.qr_code.url if rendered.qr_code else None,
-                'firebase_url': firebase_url,
-            })
-        
-        return redirect(f"/session/{phone}/preview/")
-        
-    except Exception as e:
-        print(f"❌ Render error: {e}")
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({'success': False, 'error': str(e)}, status=500)
\ No newline at end of file
+    # Enqueue job, worker sẽ render + upload + tạo QR ở nền
+    # (trùng fingerprint thì nhận lại job/render đã có, không render lại)
+    job = enqueue_render(session, frame, photos_ordered)
+    if settings.RENDER_JOBS_EAGER and claim_job(job):
+        run_render_job(job)
+    
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': reverse('render_job_status', args=[phone, job.id]),
+        }, status=202)
+    
+    return redirect(f"/session/{phone}/preview/?job={job.id}")
+
+
+@require_GET
+def render_job_status(request, phone, job_id):
+    """Polling trạng thái RenderJob: queued/rendering/uploading/done/failed"""
+    job = get_object_or_404(RenderJob.objects.select_related('session', 'rendered'), id=job_id, session__phone=phone)
+    return JsonResponse(job_status_payload(job))
+
+
+@require_GET
+def metrics(request):
+    """Metrics dạng text Prometheus (histogram từng stage, hàng đợi render/upload)"""
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
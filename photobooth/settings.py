@@ -12,8 +12,6 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-import firebase_admin
-from firebase_admin import credentials, storage
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -80,10 +78,24 @@ WSGI_APPLICATION = 'photobooth.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite ở chế độ WAL: người đọc không chặn người ghi, nhiều worker kiosk
+# (web + renderworker + uploadworker + printspooler) ghi cùng lúc; busy
+# timeout + transaction IMMEDIATE → chờ lock thay vì lỗi "database is locked"
+SQLITE_TIMEOUT = float(os.getenv("SQLITE_TIMEOUT", "20"))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': SQLITE_TIMEOUT,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                f'PRAGMA busy_timeout={int(SQLITE_TIMEOUT * 1000)};'
+            ),
+        },
     }
 }
 
@@ -129,25 +141,141 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Firebase configuration
-import os
-firebase_key_path = BASE_DIR / os.getenv('FIREBASE_CREDENTIALS_PATH', 'firebase_key.json')
-firebase_bucket = os.getenv('FIREBASE_STORAGE_BUCKET', 'photoboothtnx.firebasestorage.app')
-
-print(f"🔍 Looking for Firebase key at: {firebase_key_path}")
-print(f"🔍 File exists: {firebase_key_path.exists()}")
-
-if firebase_key_path.exists():
-    try:
-        cred = credentials.Certificate(str(firebase_key_path))
-        firebase_admin.initialize_app(cred, {
-            "storageBucket": firebase_bucket
-        })
-        print("✅ Firebase initialized successfully!")
-    except Exception as e:
-        print(f"❌ Firebase initialization error: {e}")
-else:
-    print("⚠️  Firebase key not found. Firebase features will be disabled.")
+# Firebase configuration (app khởi tạo lúc upload lần đầu, xem core/remote_storage.py)
+FIREBASE_CREDENTIALS_PATH = BASE_DIR / os.getenv('FIREBASE_CREDENTIALS_PATH', 'firebase_key.json')
+FIREBASE_STORAGE_BUCKET = os.getenv('FIREBASE_STORAGE_BUCKET', 'photoboothtnx.firebasestorage.app')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Phục vụ /media/ (core/media.py): cache immutable + ETag, Range, hoặc giao cho proxy
+# MEDIA_SERVE=False khi web server tự phục vụ thẳng MEDIA_ROOT
+MEDIA_SERVE = os.getenv('MEDIA_SERVE', 'True') == 'True'
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', str(365 * 24 * 3600)))
+# MEDIA_ACCEL: "" (Python gửi file), "x-accel" (nginx) hoặc "x-sendfile" (Apache/lighttpd)
+# nginx: location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+MEDIA_ACCEL = os.getenv('MEDIA_ACCEL', '').lower()
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# Render pipeline
+# Canvas frame đã decode + resize, giữ trong RAM (LRU theo byte) và trên đĩa
+FRAME_CACHE_MAX_BYTES = int(os.getenv('FRAME_CACHE_MAX_MB', '256')) * 1024 * 1024
+FRAME_CACHE_DIR = BASE_DIR / os.getenv('FRAME_CACHE_DIR', 'cache/frames')
+# Giới hạn bản trên đĩa: vượt thì xóa file ít dùng nhất (theo mtime)
+FRAME_CACHE_DISK_MAX_BYTES = int(os.getenv('FRAME_CACHE_DISK_MAX_MB', '1024')) * 1024 * 1024
+
+# Bản phái sinh của ảnh upload (cạnh dài, px)
+PHOTO_PREVIEW_SIZE = int(os.getenv('PHOTO_PREVIEW_SIZE', '1280'))
+PHOTO_THUMBNAIL_SIZE = int(os.getenv('PHOTO_THUMBNAIL_SIZE', '320'))
+
+# Ảnh xem thử do server ghép (slot manager / preview): scale mặc định, chất lượng, thời gian cache
+PREVIEW_SCALE = float(os.getenv('PREVIEW_SCALE', '0.25'))
+PREVIEW_QUALITY = int(os.getenv('PREVIEW_QUALITY', '80'))
+PREVIEW_CACHE_SECONDS = int(os.getenv('PREVIEW_CACHE_SECONDS', '3600'))
+
+# Số thread chuẩn bị slot (decode + crop + resize) song song trong một lần ghép; 1 = tuần tự
+RENDER_SLOT_THREADS = int(os.getenv('RENDER_SLOT_THREADS', str(min(8, os.cpu_count() or 1))))
+
+# Tổng RAM ước lượng cho các render chạy đồng thời trong một process (0 = không giới hạn);
+# render vượt ngân sách sẽ chờ (xem photobooth_render_memory_* ở /metrics)
+RENDER_MEMORY_BUDGET_BYTES = int(os.getenv('RENDER_MEMORY_BUDGET_MB', '512')) * 1024 * 1024
+
+# Bản web (khách tải qua QR / trang download) + thumbnail tạo cùng lúc với bản in
+# RENDER_WEB_FORMAT: "jpeg" hoặc "webp"
+RENDER_WEB_FORMAT = os.getenv('RENDER_WEB_FORMAT', 'jpeg').lower()
+RENDER_WEB_MAX_EDGE = int(os.getenv('RENDER_WEB_MAX_EDGE', '1600'))
+RENDER_WEB_QUALITY = int(os.getenv('RENDER_WEB_QUALITY', '82'))
+RENDER_THUMBNAIL_SIZE = int(os.getenv('RENDER_THUMBNAIL_SIZE', '320'))
+
+# Render job: finalize_render chỉ enqueue, worker chạy bằng `manage.py renderworker`
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', '2'))
+# True: chạy job ngay trong request (dev, không cần worker)
+RENDER_JOBS_EAGER = os.getenv('RENDER_JOBS_EAGER', 'False') == 'True'
+
+# Địa chỉ kiosk mà điện thoại khách truy cập được (LAN, vd. http://192.168.1.10:8000),
+# dùng cho QR khi chưa upload xong. Không có mặc định: 127.0.0.1 điện thoại không mở
+# được (system check trong core/checks.py báo lỗi / cảnh báo khi chưa đặt)
+PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', '')
+
+# Outbox upload ảnh render (worker: `manage.py uploadworker`, hoặc renderworker khi rảnh)
+# UPLOAD_BACKEND: "firebase", "local" (thư mục + URL tĩnh: dev, mất mạng, hoặc server LAN
+# ở venue khi đường internet nghẽn) hoặc "memory" (trong process, cho test / load test)
+UPLOAD_BACKEND = os.getenv('UPLOAD_BACKEND', 'firebase')
+UPLOAD_LOCAL_DIR = os.getenv('UPLOAD_LOCAL_DIR', os.path.join(MEDIA_ROOT, 'bucket'))
+UPLOAD_LOCAL_URL = os.getenv('UPLOAD_LOCAL_URL', PUBLIC_BASE_URL.rstrip('/') + MEDIA_URL + 'bucket/' if PUBLIC_BASE_URL else '')
+# Backend "memory": độ trễ giả lập mỗi lần upload (ms)
+UPLOAD_MEMORY_LATENCY_MS = float(os.getenv('UPLOAD_MEMORY_LATENCY_MS', '0'))
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '4'))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv('UPLOAD_MAX_ATTEMPTS', '12'))
+UPLOAD_RETRY_BASE_SECONDS = float(os.getenv('UPLOAD_RETRY_BASE_SECONDS', '5'))
+UPLOAD_RETRY_MAX_SECONDS = float(os.getenv('UPLOAD_RETRY_MAX_SECONDS', '600'))
+
+# Upload multipart: hash SHA-256 trong lúc nhận file (gộp ảnh trùng theo nội dung)
+FILE_UPLOAD_HANDLERS = [
+    'core.upload_handlers.HashingMemoryFileUploadHandler',
+    'core.upload_handlers.HashingTemporaryFileUploadHandler',
+]
+
+# Upload ảnh theo chunk (resume được khi rớt Wi-Fi): file tạm nằm ở CHUNKED_UPLOAD_DIR
+# (nên cùng ổ đĩa với MEDIA_ROOT để ghép xong chỉ cần rename)
+CHUNKED_UPLOAD_DIR = BASE_DIR / os.getenv('CHUNKED_UPLOAD_DIR', 'cache/uploads')
+UPLOAD_CHUNK_BYTES = int(os.getenv('UPLOAD_CHUNK_MB', '2')) * 1024 * 1024
+UPLOAD_MAX_FILE_BYTES = int(os.getenv('UPLOAD_MAX_FILE_MB', '100')) * 1024 * 1024
+UPLOAD_PARALLEL_FILES = int(os.getenv('UPLOAD_PARALLEL_FILES', '3'))
+# Upload dở dang quá thời gian này thì bị xóa
+CHUNKED_UPLOAD_EXPIRE_HOURS = int(os.getenv('CHUNKED_UPLOAD_EXPIRE_HOURS', '24'))
+
+# Retention (core/retention.py, `manage.py purge_media`)
+# Số ngày giữ session không hoạt động (Frame.retention_days ghi đè theo event; 0 = giữ mãi)
+RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', '30'))
+# Ổ chứa MEDIA_ROOT dùng quá HIGH_WATER % → xóa session cũ nhất tới khi còn LOW_WATER %.
+# Mặc định tắt (0): đo cả ổ, dữ liệu khác làm đầy ổ cũng kích hoạt. Không bao giờ xóa
+# session của frame retention_days = 0
+RETENTION_DISK_HIGH_WATER = float(os.getenv('RETENTION_DISK_HIGH_WATER', '0'))
+RETENTION_DISK_LOW_WATER = float(os.getenv('RETENTION_DISK_LOW_WATER', '80'))
+# Khi ổ đầy, không xóa session còn hoạt động trong số giờ này (khách đang chụp/tải)
+RETENTION_MIN_AGE_HOURS = float(os.getenv('RETENTION_MIN_AGE_HOURS', '2'))
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '100'))
+# File mồ côi mới hơn số giờ này thì chưa xóa (có thể đang được ghi)
+RETENTION_ORPHAN_GRACE_HOURS = float(os.getenv('RETENTION_ORPHAN_GRACE_HOURS', '1'))
+# Chạy retention trong thread nền của web process (thay cho cron `purge_media --once`)
+RETENTION_THREAD = os.getenv('RETENTION_THREAD', 'False') == 'True'
+RETENTION_INTERVAL_MINUTES = float(os.getenv('RETENTION_INTERVAL_MINUTES', '60'))
+
+# Số file tải song song khi stream ZIP ở trang download
+ZIP_FETCH_WORKERS = int(os.getenv('ZIP_FETCH_WORKERS', '4'))
+
+# In ảnh (spooler: `manage.py printspooler`)
+# PRINT_BACKEND: "directory" (thả file vào hot folder) hoặc "cups" (lệnh lp)
+PRINT_BACKEND = os.getenv('PRINT_BACKEND', 'directory')
+PRINT_DIRECTORY = os.getenv('PRINT_DIRECTORY', str(BASE_DIR / 'cache' / 'printer'))
+PRINT_CUPS_PRINTER = os.getenv('PRINT_CUPS_PRINTER', '')
+PRINT_CUPS_OPTIONS = [o for o in os.getenv('PRINT_CUPS_OPTIONS', '').split(',') if o]
+# Raster đúng khổ giấy của máy in (mặc định 4x6 inch @ 300 DPI)
+PRINT_WIDTH_PX = int(os.getenv('PRINT_WIDTH_PX', '1200'))
+PRINT_HEIGHT_PX = int(os.getenv('PRINT_HEIGHT_PX', '1800'))
+PRINT_DPI = int(os.getenv('PRINT_DPI', '300'))
+# Đường dẫn file ICC profile của máy in (trống = giữ sRGB)
+PRINT_ICC_PROFILE = os.getenv('PRINT_ICC_PROFILE', '')
+PRINT_JPEG_QUALITY = int(os.getenv('PRINT_JPEG_QUALITY', '95'))
+
+# Logging: LOG_LEVEL = DEBUG | INFO | WARNING | ERROR (DEBUG in thời gian từng stage)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'core': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+        'photobooth': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
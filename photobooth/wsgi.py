@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'photobooth.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.RETENTION_THREAD:
+    # Chỉ web process (gunicorn / runserver), không chạy trong các lệnh manage.py khác
+    from core.retention import start_retention_thread
+
+    start_retention_thread()